@@ -215,6 +215,7 @@ CORS_ALLOW_HEADERS = [
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
+    'idempotency-key',
 ]
 
 # CORS Methods
@@ -240,3 +241,147 @@ CHANNEL_LAYERS = {
 # File upload settings
 FILE_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
+
+# Background quiz generation
+QUIZ_GENERATION_WORKERS = int(os.getenv('QUIZ_GENERATION_WORKERS', '2'))
+# Unfinished jobs without a progress update for this many seconds are failed, e.g. after their
+# worker restarted; matches the client's 5 minute polling limit (0 disables)
+GENERATION_JOB_STALE_SECONDS = int(os.getenv('GENERATION_JOB_STALE_SECONDS', '300'))
+
+# Parsed document text cache (in-process LRU + ParsedDocument table)
+PARSED_TEXT_CACHE_MAX_CHARS = int(os.getenv('PARSED_TEXT_CACHE_MAX_CHARS', str(32 * 1024 * 1024)))
+PARSED_TEXT_CACHE_DB_MAX_ENTRIES = int(os.getenv('PARSED_TEXT_CACHE_DB_MAX_ENTRIES', '500'))
+
+# Stop PDF extraction once this many characters have been read (0 = whole document).
+# Leaves headroom over the 15k characters sent to the model since cleaning shrinks text.
+PDF_TEXT_CHAR_BUDGET = int(os.getenv('PDF_TEXT_CHAR_BUDGET', '60000'))
+
+# Multi-file uploads are parsed in a process pool with a per-file timeout (seconds)
+DOCUMENT_PARSE_PROCESSES = int(os.getenv('DOCUMENT_PARSE_PROCESSES', '2'))
+DOCUMENT_PARSE_TIMEOUT = int(os.getenv('DOCUMENT_PARSE_TIMEOUT', '60'))
+
+# Cache of validated quiz generations keyed by prompt text and parameters (0 TTL disables)
+QUIZ_RESPONSE_CACHE_TTL = int(os.getenv('QUIZ_RESPONSE_CACHE_TTL', str(7 * 24 * 3600)))
+QUIZ_RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('QUIZ_RESPONSE_CACHE_MAX_ENTRIES', '256'))
+QUIZ_RESPONSE_CACHE_DB_MAX_ENTRIES = int(os.getenv('QUIZ_RESPONSE_CACHE_DB_MAX_ENTRIES', '2000'))
+
+# Language model backend: 'gemini', 'openai' or 'stub' (offline, for load tests and benchmarks)
+LLM_PROVIDER = os.getenv('LLM_PROVIDER', 'gemini')
+# Backend used by the legacy core app's quiz generation
+CORE_LLM_PROVIDER = os.getenv('CORE_LLM_PROVIDER', 'openai')
+GEMINI_MODEL_NAME = os.getenv('GEMINI_MODEL_NAME', 'gemini-2.5-pro')
+OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
+OPENAI_MODEL_NAME = os.getenv('OPENAI_MODEL_NAME', 'gpt-4')
+# Stub provider tuning: fixed latency per call, fraction of calls that fail, failure RNG seed
+STUB_LLM_LATENCY_MS = int(os.getenv('STUB_LLM_LATENCY_MS', '0'))
+STUB_LLM_FAILURE_RATE = float(os.getenv('STUB_LLM_FAILURE_RATE', '0'))
+STUB_LLM_SEED = int(os.getenv('STUB_LLM_SEED', '0'))
+
+# Quizzes with at least this many questions are generated as concurrent smaller batches (0 disables)
+QUIZ_FANOUT_MIN_QUESTIONS = int(os.getenv('QUIZ_FANOUT_MIN_QUESTIONS', '20'))
+QUIZ_FANOUT_BATCH_SIZE = int(os.getenv('QUIZ_FANOUT_BATCH_SIZE', '10'))
+QUIZ_FANOUT_CONCURRENCY = int(os.getenv('QUIZ_FANOUT_CONCURRENCY', '4'))
+
+# Shared limits on LLM calls across all workers (0 disables each limit).
+# State lives in the database (a local SQLite file when the database is SQLite or LLM_RATE_LIMIT_STORE='file').
+LLM_RATE_LIMIT_RPM = int(os.getenv('LLM_RATE_LIMIT_RPM', '0'))
+LLM_RATE_LIMIT_TPM = int(os.getenv('LLM_RATE_LIMIT_TPM', '0'))
+LLM_MAX_IN_FLIGHT = int(os.getenv('LLM_MAX_IN_FLIGHT', '0'))
+# Seconds a call may wait for budget before failing (0 = fail fast)
+LLM_RATE_LIMIT_MAX_WAIT = int(os.getenv('LLM_RATE_LIMIT_MAX_WAIT', '30'))
+LLM_RATE_LIMIT_STORE = os.getenv('LLM_RATE_LIMIT_STORE', 'database')
+LLM_RATE_LIMIT_FILE = os.getenv('LLM_RATE_LIMIT_FILE', str(BASE_DIR / 'llm_rate_limit.sqlite3'))
+
+# Faster/cheaper model raced against the primary when it is slow or failing ('' disables hedging),
+# e.g. LLM_FALLBACK_PROVIDER=gemini with LLM_FALLBACK_MODEL_NAME=gemini-2.5-flash
+LLM_FALLBACK_PROVIDER = os.getenv('LLM_FALLBACK_PROVIDER', '')
+LLM_FALLBACK_MODEL_NAME = os.getenv('LLM_FALLBACK_MODEL_NAME', '')
+# Hedge once the primary call outlives its rolling p95 latency; this value until enough calls are recorded
+LLM_HEDGE_AFTER_SECONDS = float(os.getenv('LLM_HEDGE_AFTER_SECONDS', '20'))
+# Per-model circuit breaker: opens when ERROR_RATE of the last WINDOW calls (at least MIN_CALLS) fail,
+# then refuses calls for COOLDOWN seconds before probing again (ERROR_RATE 0 disables it)
+CIRCUIT_BREAKER_WINDOW = int(os.getenv('CIRCUIT_BREAKER_WINDOW', '20'))
+CIRCUIT_BREAKER_MIN_CALLS = int(os.getenv('CIRCUIT_BREAKER_MIN_CALLS', '5'))
+CIRCUIT_BREAKER_ERROR_RATE = float(os.getenv('CIRCUIT_BREAKER_ERROR_RATE', '0.5'))
+CIRCUIT_BREAKER_COOLDOWN = int(os.getenv('CIRCUIT_BREAKER_COOLDOWN', '30'))
+
+# Ask providers that support it for schema-constrained JSON instead of relying on the prompt alone
+LLM_STRUCTURED_OUTPUT = os.getenv('LLM_STRUCTURED_OUTPUT', 'True').lower() in ('true', '1', 'yes')
+
+# Documents whose selected prompt text is at least this long are condensed once into a cached
+# topic outline that later generations prompt from (0 disables digests). The outline costs an extra
+# model call, so it is only built when the same document is generated from again within SEEN_TTL seconds
+QUIZ_DIGEST_MIN_CHARS = int(os.getenv('QUIZ_DIGEST_MIN_CHARS', '4000'))
+QUIZ_DIGEST_MAX_ENTRIES = int(os.getenv('QUIZ_DIGEST_MAX_ENTRIES', '256'))
+QUIZ_DIGEST_DB_MAX_ENTRIES = int(os.getenv('QUIZ_DIGEST_DB_MAX_ENTRIES', '2000'))
+QUIZ_DIGEST_SEEN_TTL = int(os.getenv('QUIZ_DIGEST_SEEN_TTL', str(7 * 24 * 3600)))
+
+# Upload documents whose full text is at least this many characters once as a provider-side cached
+# context and reference it by handle in later generations (0 disables; providers need a minimum
+# context size, e.g. Gemini caches start at a few thousand tokens)
+LLM_CONTEXT_CACHE_MIN_CHARS = int(os.getenv('LLM_CONTEXT_CACHE_MIN_CHARS', '0'))
+LLM_CONTEXT_CACHE_TTL = int(os.getenv('LLM_CONTEXT_CACHE_TTL', '3600'))
+
+# Identical generation requests arriving while one is in flight (in any worker) wait up to
+# MAX_WAIT seconds for its result instead of calling the model again (0 disables coalescing).
+# The in-flight lease lapses after LEASE_TTL seconds if its worker dies.
+# A waiting job occupies one of the QUIZ_GENERATION_WORKERS threads and queued jobs behind it
+# do not start, so keep MAX_WAIT short (well under GENERATION_JOB_STALE_SECONDS): a follower
+# that gives up just generates on its own, which costs a model call but never stalls the pool.
+GENERATION_COALESCE_LEASE_TTL = int(os.getenv('GENERATION_COALESCE_LEASE_TTL', '300'))
+GENERATION_COALESCE_MAX_WAIT = int(os.getenv('GENERATION_COALESCE_MAX_WAIT', '30'))
+GENERATION_COALESCE_POLL_SECONDS = float(os.getenv('GENERATION_COALESCE_POLL_SECONDS', '0.5'))
+
+# Idempotency-Key support on generate, take and room answer submission: successful responses are
+# replayed for retries for KEY_TTL seconds; retries of a request still running wait up to WAIT_SECONDS,
+# and a request whose worker died stops holding its key after LOCK_SECONDS
+IDEMPOTENCY_KEY_TTL = int(os.getenv('IDEMPOTENCY_KEY_TTL', str(24 * 3600)))
+IDEMPOTENCY_WAIT_SECONDS = int(os.getenv('IDEMPOTENCY_WAIT_SECONDS', '10'))
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv('IDEMPOTENCY_LOCK_SECONDS', '120'))
+
+# Django cache shared by all workers and dynos (answer keys, analytics responses). Redis when
+# REDIS_URL is set (needs the redis package), otherwise a database table created by createcachetable
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': os.getenv('CACHE_TABLE', 'django_cache'),
+        }
+    }
+
+# Compiled per-quiz answer keys used for grading and result review: an in-process LRU of MAX_ENTRIES
+# quizzes backed by the shared default cache for TTL seconds
+ANSWER_KEY_CACHE_MAX_ENTRIES = int(os.getenv('ANSWER_KEY_CACHE_MAX_ENTRIES', '512'))
+ANSWER_KEY_CACHE_TTL = int(os.getenv('ANSWER_KEY_CACHE_TTL', str(24 * 3600)))
+
+# Fill-in-the-blank answers at least this similar to an accepted answer count as correct (1 requires
+# an exact match after case and whitespace folding)
+GRADING_FUZZY_THRESHOLD = float(os.getenv('GRADING_FUZZY_THRESHOLD', '0.85'))
+
+# Compiled matchers of room and core questions kept per process, keyed by question and answer fields
+GRADING_MATCHER_CACHE_MAX_ENTRIES = int(os.getenv('GRADING_MATCHER_CACHE_MAX_ENTRIES', '2048'))
+
+# QuizAnalyticsView responses are cached per user in the shared default cache until the user completes
+# another attempt, for at most this many seconds (0 disables)
+QUIZ_ANALYTICS_CACHE_TTL = int(os.getenv('QUIZ_ANALYTICS_CACHE_TTL', '3600'))
+
+# Log output of the quizzes app (job, cache, rate limit and provider events); set to DEBUG for
+# per-request cache hits and timings
+QUIZZES_LOG_LEVEL = os.getenv('QUIZZES_LOG_LEVEL', 'INFO')
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'quizzes': {'handlers': ['console'], 'level': QUIZZES_LOG_LEVEL},
+    },
+}
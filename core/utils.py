@@ -1,27 +1,17 @@
 from PyPDF2 import PdfReader
 import docx
 import json
-import os
 import re
 from django.conf import settings
+from quizzes.llm import get_provider
 
 # Optional imports
-try:
-    import openai
-    OPENAI_AVAILABLE = True
-except ImportError:
-    OPENAI_AVAILABLE = False
-
 try:
     from pptx import Presentation
     PPTX_AVAILABLE = True
 except ImportError:
     PPTX_AVAILABLE = False
 
-# Configure OpenAI if available
-if OPENAI_AVAILABLE:
-    openai.api_key = os.getenv("OPENAI_API_KEY", "")
-
 def parse_document(file):
     """
     Extracts and returns text from the uploaded file (PDF, DOCX, PPTX).
@@ -61,7 +51,7 @@ def parse_document(file):
 
 def generate_quiz_from_text(text, num_questions=5, difficulty='medium', quiz_type='multiple_choice'):
     """
-    Generates a quiz from the given text using OpenAI. 
+    Generates a quiz from the given text using the CORE_LLM_PROVIDER backend (OpenAI by default).
     Supports multiple question types including descriptive and fill-in-the-blank.
     Returns a list of question dicts as specified.
     """
@@ -77,26 +67,15 @@ def generate_quiz_from_text(text, num_questions=5, difficulty='medium', quiz_typ
         # Create the prompt based on question type
         prompt = create_enhanced_quiz_prompt(cleaned_text, num_questions, difficulty, quiz_type)
         
-        # Call OpenAI API
-        response = openai.ChatCompletion.create(
-            model="gpt-4",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are an expert quiz generator. Generate educational quiz questions based on the provided text. Always return valid JSON format."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
+        # Call the shared provider client
+        provider = get_provider(getattr(settings, 'CORE_LLM_PROVIDER', 'openai'))
+        content = provider.generate(
+            prompt,
             temperature=0.7,
-            max_tokens=3000
+            max_output_tokens=3000,
+            system_prompt="You are an expert quiz generator. Generate educational quiz questions based on the provided text. Always return valid JSON format."
         )
         
-        # Parse the response
-        content = response.choices[0].message.content
-        
         # Extract JSON from response
         quiz_data = extract_json_from_response(content)
         
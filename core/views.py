@@ -5,6 +5,8 @@ from rest_framework.views import APIView
 from django.shortcuts import get_object_or_404
 from django.db.models import Q, Count, Avg
 from django.utils import timezone
+from quizzes.grading import question_matchers
+from quizzes.persistence import create_quiz_with_questions
 from django.http import HttpResponse
 from django.core.cache import cache
 import json
@@ -58,8 +60,11 @@ class QuizGenerateView(APIView):
             # Generate quiz using OpenAI
             quiz_data = generate_quiz_from_text(text, num_questions, difficulty, quiz_type)
             
-            # Create quiz in database
-            quiz = Quiz.objects.create(
+            # Create the quiz and its questions together, in one transaction
+            quiz, _ = create_quiz_with_questions(
+                quiz_data['quiz'],
+                quiz_model=Quiz,
+                question_model=Question,
                 user=request.user,
                 title=title or file.name,
                 description=f"Generated from {file.name}",
@@ -67,24 +72,9 @@ class QuizGenerateView(APIView):
                 quiz_type=quiz_type,
                 time_limit=int(time_limit) if time_limit else None,
                 questions_per_attempt=num_questions,
-                total_questions=len(quiz_data['quiz']),
                 source_document=file.name
             )
             
-            # Create questions
-            for i, question_data in enumerate(quiz_data['quiz']):
-                Question.objects.create(
-                    quiz=quiz,
-                    question_text=question_data['question_text'],
-                    question_type=question_data['question_type'],
-                    options=question_data['options'],
-                    correct_answer=question_data['correct_answer'],
-                    explanation=question_data.get('explanation', ''),
-                    difficulty=question_data.get('difficulty', difficulty),
-                    topic=question_data.get('topic', 'General'),
-                    order=i
-                )
-            
             return Response(
                 {'quiz_id': quiz.id, 'message': 'Quiz generated successfully'},
                 status=status.HTTP_201_CREATED
@@ -199,7 +189,7 @@ class QuizSubmitView(APIView):
             
             for question in attempt.quiz.questions.all():
                 user_answer = user_answers.get(str(question.id), '')
-                is_correct = user_answer == question.correct_answer
+                is_correct = bool(user_answer) and question_matchers.get(question, question.correct_answer).matches(user_answer)
                 
                 if is_correct:
                     score += 1
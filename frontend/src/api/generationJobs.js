@@ -0,0 +1,32 @@
+import { api } from './axiosConfig';
+
+const POLL_INTERVAL_MS = 1500;
+const DEFAULT_TIMEOUT_MS = 5 * 60 * 1000;
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+// Poll a background generation job until it has succeeded or failed.
+// Resolves with the final status payload; `onProgress` receives every poll.
+// With `onQuestion`, each poll also asks for the questions saved since the
+// previous one (`?after=N`), so a quiz's questions can be shown as they are
+// generated.
+export const waitForGenerationJob = async (statusPath, onProgress, { timeoutMs = DEFAULT_TIMEOUT_MS, onQuestion } = {}) => {
+    const deadline = Date.now() + timeoutMs;
+    let after = 0;
+    while (Date.now() < deadline) {
+        const response = await api.get(statusPath, onQuestion ? { params: { after } } : undefined);
+        const job = response.data;
+        if (onQuestion && Array.isArray(job.questions)) {
+            job.questions.forEach(onQuestion);
+            after = job.next_after ?? after;
+        }
+        if (onProgress) {
+            onProgress(job);
+        }
+        if (job.status === 'succeeded' || job.status === 'failed') {
+            return job;
+        }
+        await sleep(POLL_INTERVAL_MS);
+    }
+    throw new Error('Quiz generation timed out');
+};
@@ -2,6 +2,7 @@ import React, { useState, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { api } from '../api/axiosConfig';
 import { createRoom } from '../api/rooms';
+import { waitForGenerationJob } from '../api/generationJobs';
 import ManualQuestionBuilder from '../components/quiz/ManualQuestionBuilder';
 import AnimatedCheckbox from '../components/ui/AnimatedCheckbox';
 import HandTapLoader from '../components/ui/HandTapLoader';
@@ -735,8 +736,11 @@ const CreateRoom = () => {
                 },
             });
 
-            if (response.data.quiz) {
-                setQuestions(response.data.quiz);
+            const job = await waitForGenerationJob(`/rooms/generate-quiz/${response.data.job_id}/`);
+            if (job.status === 'failed') {
+                setError(job.error || 'Failed to generate quiz. Please try again.');
+            } else if (job.quiz) {
+                setQuestions(job.quiz);
                 setAiGenerationStep('generated'); // Move to review step
             } else {
                 setError('Failed to generate quiz. Please try again.');
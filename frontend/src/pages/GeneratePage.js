@@ -9,6 +9,7 @@ import AnimatedCheckbox from '../components/ui/AnimatedCheckbox';
 import BrutalistDocumentUpload from '../components/ui/BrutalistDocumentUpload';
 import { DocumentArrowUpIcon, SparklesIcon } from '@heroicons/react/24/outline';
 import api from '../api/axiosConfig'; // Add this import
+import { waitForGenerationJob } from '../api/generationJobs';
 import { toast } from 'react-toastify'; // Add this import
 
 const GeneratePage = () => {
@@ -18,7 +19,8 @@ const GeneratePage = () => {
     difficulty: 'medium',
     quiz_type: 'multiple_choice',
     time_limit: '',
-    enable_timer: false
+    enable_timer: false,
+    fresh: false
   });
   const [files, setFiles] = useState([]);
   // keep single 'file' for backward compatibility
@@ -26,6 +28,7 @@ const GeneratePage = () => {
   const [errors, setErrors] = useState({});
   const [uploadProgress, setUploadProgress] = useState(0);
   const [isGenerating, setIsGenerating] = useState(false);
+  const [streamedQuestions, setStreamedQuestions] = useState([]);
   const fileInputRef = useRef(null);
 
   const navigate = useNavigate();
@@ -160,6 +163,7 @@ const handleSubmit = async (e) => {
 
   setIsGenerating(true);
   setUploadProgress(0);
+  setStreamedQuestions([]);
   setErrors({}); // Clear previous errors
 
   try {
@@ -174,36 +178,40 @@ const handleSubmit = async (e) => {
     formDataToSend.append('num_questions', formData.num_questions);
     formDataToSend.append('difficulty', formData.difficulty);
     formDataToSend.append('quiz_type', formData.quiz_type);
+    if (formData.fresh) {
+      formDataToSend.append('fresh', 'true');
+    }
     
     // Only send time_limit if timer is enabled
     if (formData.enable_timer && formData.time_limit) {
       formDataToSend.append('time_limit', formData.time_limit);
     }
     
-    // Simulate progress for AI generation
-    const progressInterval = setInterval(() => {
-      setUploadProgress(prev => {
-        if (prev >= 90) {
-          clearInterval(progressInterval);
-          return prev;
-        }
-        return prev + 10;
-      });
-    }, 500);
-    
     console.log('Sending quiz generation request...');
-    const response = await api.post('quiz/generate/', formDataToSend, {
+    const submitResponse = await api.post('quiz/generate/', formDataToSend, {
       headers: { 'Content-Type': 'multipart/form-data' },
       timeout: 60000, // 60 second timeout
       onUploadProgress: (progressEvent) => {
         const percentCompleted = Math.round(
           (progressEvent.loaded * 100) / progressEvent.total
         );
-        setUploadProgress(Math.min(percentCompleted, 90));
+        // Upload accounts for the first 10%, the generation job for the rest
+        setUploadProgress(Math.min(Math.round(percentCompleted / 10), 10));
       }
     });
-    
-    clearInterval(progressInterval);
+
+    const jobId = submitResponse.data.job_id;
+    console.log('Generation job queued:', jobId);
+    const onJobProgress = (job) => {
+      setUploadProgress(Math.max(10, Math.min(job.progress, 99)));
+    };
+    // Questions are shown as they are generated
+    await waitForGenerationJob(`quiz/generate/jobs/${jobId}/`, onJobProgress, {
+      onQuestion: (question) => setStreamedQuestions((prev) => [...prev, question]),
+    });
+
+    // The result endpoint replays the generation outcome (or its error status)
+    const response = await api.get(`quiz/generate/jobs/${jobId}/result/`);
     setUploadProgress(100);
     
     console.log('Quiz generated successfully:', response.data);
@@ -237,7 +245,7 @@ const handleSubmit = async (e) => {
       navigate('/login');
     } else if (error.response?.status === 400) {
       setErrors({ general: error.response.data.error || 'Invalid request' });
-    } else if (error.response?.status === 500) {
+    } else if (error.response?.status === 500 || error.response?.status === 503) {
       // Check if it's a specific error from our backend
       const errorMessage = error.response?.data?.error || '';
       if (errorMessage.includes('Content blocked')) {
@@ -414,6 +422,19 @@ const handleSubmit = async (e) => {
               )}
             </div>
 
+            {/* Skip previously generated questions for the same document */}
+            <div>
+              <label className="flex items-center space-x-2 text-sm font-medium text-slate-700">
+                <AnimatedCheckbox
+                  name="fresh"
+                  checked={formData.fresh}
+                  onChange={handleChange}
+                  className="w-8 h-8"
+                />
+                <span>Always generate new questions</span>
+              </label>
+            </div>
+
             <Button
               type="submit"
               variant="primary"
@@ -433,7 +454,9 @@ const handleSubmit = async (e) => {
       {/* Hand Tap Loader - Full Screen */}
       <HandTapLoader 
         isVisible={isGenerating} 
-        /*message="Generating your quiz from the document..." */
+        message={streamedQuestions.length > 0
+          ? `${streamedQuestions.length} of ${formData.num_questions} questions ready`
+          : undefined}
       />
       </div>
     </div>
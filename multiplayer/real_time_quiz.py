@@ -366,6 +366,7 @@ from datetime import datetime
 from typing import Dict, List, Optional, Union
 import logging
 from asgiref.sync import sync_to_async
+from quizzes.grading import compile_matcher
 
 logger = logging.getLogger(__name__)
 
@@ -411,6 +412,7 @@ class Problem:
         self.description = description
         self.options = options  # [{"id": 0, "title": "Option A"}, ...]
         self.correct_answer = correct_answer
+        self.matcher = compile_matcher('multiple_choice', correct_answer, options)
         self.timer_duration = timer_duration
         self.start_time = 0
         self.submissions: List[Submission] = []
@@ -425,7 +427,7 @@ class Problem:
             if submission.user_id == user_id:
                 return False
         
-        is_correct = self.correct_answer == option_selected
+        is_correct = self.matcher.matches(option_selected)
         submission = Submission(
             problem_id=self.id,
             user_id=user_id,
@@ -44,6 +44,14 @@ else:
 echo "Running database migrations..."
 python manage.py migrate --noinput
 
+# Table behind the shared Django cache (no-op when it exists or Redis is used)
+echo "Creating cache table..."
+python manage.py createcachetable
+
+# Jobs run inside web workers; fail any a previous deploy or restart left unfinished
+echo "Failing stale generation jobs..."
+python manage.py fail_stale_generation_jobs || echo "Could not sweep stale generation jobs"
+
 # Create superuser if needed (optional)
 echo "Checking for superuser..."
 python manage.py shell -c "
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Quiz, Question, QuizAttempt
+from .models import Quiz, Question, QuizAttempt, GenerationJob, ParsedDocument, CachedQuizResponse, DocumentDigest, ProviderContextHandle, GenerationLease, IdempotencyRecord, AttemptAnswer
 
 @admin.register(Quiz)
 class QuizAdmin(admin.ModelAdmin):
@@ -20,3 +20,58 @@ class QuizAttemptAdmin(admin.ModelAdmin):
     list_filter = ('is_completed', 'created_at')
     search_fields = ('user__email', 'quiz__title')
     readonly_fields = ('created_at',)
+
+@admin.register(GenerationJob)
+class GenerationJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'kind', 'status', 'progress', 'created_at', 'finished_at')
+    list_filter = ('kind', 'status', 'created_at')
+    search_fields = ('user__email',)
+    readonly_fields = ('id', 'created_at', 'updated_at')
+
+@admin.register(ParsedDocument)
+class ParsedDocumentAdmin(admin.ModelAdmin):
+    list_display = ('content_hash', 'file_type', 'byte_size', 'hit_count', 'last_used_at')
+    list_filter = ('file_type',)
+    search_fields = ('content_hash',)
+    readonly_fields = ('created_at',)
+
+@admin.register(CachedQuizResponse)
+class CachedQuizResponseAdmin(admin.ModelAdmin):
+    list_display = ('cache_key', 'model_name', 'prompt_version', 'hit_count', 'expires_at', 'last_used_at')
+    list_filter = ('model_name', 'prompt_version')
+    search_fields = ('cache_key',)
+    readonly_fields = ('created_at',)
+
+@admin.register(DocumentDigest)
+class DocumentDigestAdmin(admin.ModelAdmin):
+    list_display = ('cache_key', 'model_name', 'prompt_version', 'source_chars', 'digest_chars', 'hit_count', 'last_used_at')
+    list_filter = ('model_name', 'prompt_version')
+    search_fields = ('cache_key',)
+    readonly_fields = ('created_at',)
+
+@admin.register(ProviderContextHandle)
+class ProviderContextHandleAdmin(admin.ModelAdmin):
+    list_display = ('handle', 'model_name', 'source_chars', 'hit_count', 'expires_at', 'last_used_at')
+    list_filter = ('model_name',)
+    search_fields = ('handle', 'content_hash')
+    readonly_fields = ('created_at',)
+
+@admin.register(GenerationLease)
+class GenerationLeaseAdmin(admin.ModelAdmin):
+    list_display = ('key', 'owner', 'expires_at', 'created_at')
+    search_fields = ('key',)
+    readonly_fields = ('created_at',)
+
+@admin.register(IdempotencyRecord)
+class IdempotencyRecordAdmin(admin.ModelAdmin):
+    list_display = ('key', 'user', 'status_code', 'created_at', 'expires_at')
+    list_filter = ('status_code',)
+    search_fields = ('key', 'user__email')
+    readonly_fields = ('created_at',)
+
+@admin.register(AttemptAnswer)
+class AttemptAnswerAdmin(admin.ModelAdmin):
+    list_display = ('attempt', 'question', 'user', 'topic', 'difficulty', 'question_type', 'is_correct', 'time_ms', 'answered_at')
+    list_filter = ('is_correct', 'difficulty', 'question_type')
+    search_fields = ('topic', 'user__email')
+    raw_id_fields = ('attempt', 'question', 'user')
@@ -0,0 +1,124 @@
+import logging
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+# Cached QuizAnalyticsView responses. Each user has a version token in the
+# shared Django cache (see CACHES) that is replaced when one of their
+# attempts is recorded; the cached response carries the version it was built
+# at, and both are read with a single get_many, so a dashboard refresh is one
+# cache round trip in whichever worker serves it.
+
+
+class AnalyticsResponseCache:
+    """Per-user analytics responses in the shared Django cache, kept for ``ttl`` seconds (0 disables)"""
+
+    def __init__(self, ttl, cache_alias='default'):
+        self.ttl = ttl
+        self.cache_alias = cache_alias
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    @staticmethod
+    def version_key(user_id):
+        return f"quizzes:analytics-version:{user_id}"
+
+    @staticmethod
+    def response_key(user_id):
+        return f"quizzes:analytics:{user_id}"
+
+    def get(self, user_id):
+        """Return ``(response, version)``; ``response`` is None unless cached at the current version.
+
+        On a miss, ``version`` is the token to pass to ``set`` for a response
+        built from data read after this call (None if the cache is unusable).
+        """
+        if not self.enabled:
+            return None, None
+        version_key = self.version_key(user_id)
+        try:
+            cached = caches[self.cache_alias].get_many([version_key, self.response_key(user_id)])
+        except Exception as e:
+            # The cache is an optimization; build the response from the database
+            logger.warning("Analytics cache lookup failed: %s", e)
+            return None, None
+        version = cached.get(version_key)
+        entry = cached.get(self.response_key(user_id))
+        if version is not None and entry is not None and entry['version'] == version:
+            with self._lock:
+                self.hits += 1
+            return entry['response'], version
+        with self._lock:
+            self.misses += 1
+        if version is None:
+            version = self._create_version(user_id)
+        return None, version
+
+    def _create_version(self, user_id):
+        """Token for a user without one (first response, or the token was evicted)"""
+        cache = caches[self.cache_alias]
+        try:
+            # add() keeps a token a concurrent request or bump set first
+            cache.add(self.version_key(user_id), uuid.uuid4().hex, None)
+            return cache.get(self.version_key(user_id))
+        except Exception as e:
+            logger.warning("Analytics cache version setup failed: %s", e)
+            return None
+
+    def set(self, user_id, response, version):
+        """Store ``response`` as built at ``version``, the token ``get`` returned before the build.
+
+        The version is never read here: a bump between ``get`` and ``set``
+        must leave the response stale rather than tag it as current.
+        """
+        if not self.enabled or version is None:
+            return
+        try:
+            caches[self.cache_alias].set(self.response_key(user_id), {'version': version, 'response': response}, self.ttl)
+        except Exception as e:
+            logger.warning("Analytics cache store failed: %s", e)
+
+    def bump(self, user_id):
+        """Invalidate the user's cached response; call once their new attempt is committed"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.invalidations += 1
+        cache = caches[self.cache_alias]
+        try:
+            # A fresh token rather than incr(): incr is read-then-write on the
+            # database cache, so concurrent bumps could store the same value
+            cache.set(self.version_key(user_id), uuid.uuid4().hex, None)
+        except Exception as e:
+            logger.warning("Analytics cache invalidation failed: %s", e)
+            try:
+                cache.delete(self.response_key(user_id))
+            except Exception:
+                pass
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups * 100, 1) if lookups else 0.0,
+                'invalidations': self.invalidations,
+            }
+
+
+analytics_responses = AnalyticsResponseCache(
+    ttl=getattr(settings, 'QUIZ_ANALYTICS_CACHE_TTL', 3600),
+)
@@ -0,0 +1,80 @@
+from django.db.models import Count, Q
+
+from .models import AttemptAnswer
+
+# Per-answer facts behind history-wide analytics. Every graded answer of a
+# completed attempt is one ``AttemptAnswer`` row carrying the question's
+# topic, difficulty and type, so breakdowns over a user's whole history are
+# single grouped queries instead of walks over attempt JSON.
+
+
+def build_answers(attempt, answer_key, graded, answer_times=None):
+    """Unsaved ``AttemptAnswer`` rows for ``graded`` ``(question_id, is_correct)`` pairs"""
+    answer_times = answer_times or {}
+    answers = []
+    for question_id, is_correct in graded:
+        entry = answer_key.entries.get(question_id)
+        if entry is None:
+            continue
+        time_ms = answer_times.get(question_id)
+        answers.append(AttemptAnswer(
+            attempt=attempt,
+            question_id=int(question_id),
+            user_id=attempt.user_id,
+            topic=entry.topic or 'General',
+            difficulty=entry.difficulty,
+            question_type=entry.question_type,
+            is_correct=is_correct,
+            time_ms=int(time_ms) if isinstance(time_ms, (int, float)) and time_ms >= 0 else None,
+            answered_at=attempt.completed_at or attempt.created_at,
+        ))
+    return answers
+
+
+def _grouped(user_id, field):
+    rows = (
+        AttemptAnswer.objects.filter(user_id=user_id)
+        .values(field)
+        .annotate(total=Count('id'), correct=Count('id', filter=Q(is_correct=True)))
+        .order_by(field)
+    )
+    return {
+        row[field]: {
+            'correct': row['correct'],
+            'total': row['total'],
+            'accuracy': (row['correct'] / row['total']) * 100,
+        }
+        for row in rows
+    }
+
+
+def topic_breakdown(user_id):
+    """``{topic: {correct, total, accuracy}}`` over all of the user's answers"""
+    return _grouped(user_id, 'topic')
+
+
+def difficulty_breakdown(user_id):
+    """``{difficulty: {correct, total, accuracy}}`` by question difficulty"""
+    return _grouped(user_id, 'difficulty')
+
+
+def weak_topics(user_id, max_accuracy=80.0, min_answers=3, limit=5):
+    """Topics answered at least ``min_answers`` times below ``max_accuracy`` percent, weakest first"""
+    rows = (
+        AttemptAnswer.objects.filter(user_id=user_id)
+        .values('topic')
+        .annotate(total=Count('id'), correct=Count('id', filter=Q(is_correct=True)))
+        .filter(total__gte=min_answers)
+    )
+    weak = [
+        {
+            'topic': row['topic'],
+            'correct': row['correct'],
+            'total': row['total'],
+            'accuracy': round((row['correct'] / row['total']) * 100, 1),
+        }
+        for row in rows
+        if (row['correct'] / row['total']) * 100 < max_accuracy
+    ]
+    weak.sort(key=lambda row: (row['accuracy'], -row['total']))
+    return weak[:limit]
@@ -0,0 +1,165 @@
+import logging
+import threading
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .grading import compile_matcher, grade_sheet
+from .models import Question
+
+logger = logging.getLogger(__name__)
+
+# Compiled answer keys: everything grading and result review need about a
+# quiz's questions, built with one query and cached per quiz version. The
+# version stamp is bumped whenever the quiz's questions change, so a cached
+# key is never stale; old versions simply age out.
+
+AnswerKeyEntry = namedtuple('AnswerKeyEntry', [
+    'question_id', 'order', 'question_text', 'question_type', 'options',
+    'correct_answer', 'matcher', 'explanation', 'topic', 'difficulty',
+])
+
+# Bump when AnswerKey or the matchers change shape so shared entries are rebuilt
+KEY_FORMAT = 2
+
+
+class AnswerKey:
+    """Immutable answer key of one quiz version, keyed by question id string in question order"""
+
+    def __init__(self, quiz_id, version, entries):
+        self.quiz_id = quiz_id
+        self.version = version
+        self.entries = OrderedDict((entry.question_id, entry) for entry in entries)
+        self.matchers = OrderedDict((entry.question_id, entry.matcher) for entry in self.entries.values())
+
+    @classmethod
+    def compile(cls, quiz):
+        questions = Question.objects.filter(quiz_id=quiz.pk).order_by('order').values_list(
+            'id', 'order', 'question_text', 'question_type', 'options',
+            'correct_answer', 'explanation', 'topic', 'difficulty',
+        )
+        return cls(str(quiz.pk), quiz.version, [
+            AnswerKeyEntry(
+                question_id=str(question_id),
+                order=order,
+                question_text=question_text,
+                question_type=question_type,
+                options=tuple(options or ()),
+                correct_answer=correct_answer,
+                matcher=compile_matcher(question_type, correct_answer, options),
+                explanation=explanation,
+                topic=topic,
+                difficulty=difficulty,
+            )
+            for question_id, order, question_text, question_type, options, correct_answer, explanation, topic, difficulty in questions
+        ])
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries.values())
+
+    def is_correct(self, question_id, user_answer):
+        entry = self.entries.get(str(question_id))
+        if entry is None or user_answer is None:
+            return False
+        return entry.matcher.matches(user_answer)
+
+    def grade(self, user_answers):
+        """Grade a whole answer sheet; see ``grading.grade_sheet``"""
+        return grade_sheet(self.matchers, user_answers)
+
+
+class AnswerKeyCache:
+    """Compiled answer keys in an in-process LRU of ``max_entries`` backed by the shared Django cache.
+
+    Keys include the quiz version, so entries need no explicit
+    invalidation. Shared entries expire after ``ttl`` seconds; a
+    ``max_entries`` of 0 disables the in-process tier.
+    """
+
+    def __init__(self, max_entries, ttl, cache_alias='default'):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.cache_alias = cache_alias
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.shared_hits = 0
+        self.compiled = 0
+
+    @staticmethod
+    def make_key(quiz_id, version):
+        return f"quizzes:answer-key:{KEY_FORMAT}:{quiz_id}:{version}"
+
+    def get(self, quiz):
+        """Return the answer key of ``quiz`` at its current version"""
+        key = self.make_key(quiz.pk, quiz.version)
+        answer_key = self._memory_get(key)
+        if answer_key is not None:
+            with self._lock:
+                self.memory_hits += 1
+            return answer_key
+
+        try:
+            answer_key = caches[self.cache_alias].get(key)
+        except Exception as e:
+            # The shared cache is an optimization; compile from the database
+            logger.warning("Answer key cache lookup failed: %s", e)
+            answer_key = None
+        if answer_key is not None:
+            with self._lock:
+                self.shared_hits += 1
+            self._memory_set(key, answer_key)
+            return answer_key
+
+        answer_key = AnswerKey.compile(quiz)
+        with self._lock:
+            self.compiled += 1
+        logger.debug("Compiled answer key for quiz %s v%s (%s questions)", quiz.pk, quiz.version, len(answer_key))
+        try:
+            caches[self.cache_alias].set(key, answer_key, self.ttl)
+        except Exception as e:
+            logger.warning("Answer key cache store failed: %s", e)
+        self._memory_set(key, answer_key)
+        return answer_key
+
+    def stats(self):
+        with self._lock:
+            lookups = self.memory_hits + self.shared_hits + self.compiled
+            return {
+                'memory_hits': self.memory_hits,
+                'shared_hits': self.shared_hits,
+                'compiled': self.compiled,
+                'hit_rate': round((self.memory_hits + self.shared_hits) / lookups * 100, 1) if lookups else 0.0,
+                'memory_entries': len(self._entries),
+                'memory_max_entries': self.max_entries,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _memory_get(self, key):
+        with self._lock:
+            answer_key = self._entries.get(key)
+            if answer_key is not None:
+                self._entries.move_to_end(key)
+            return answer_key
+
+    def _memory_set(self, key, answer_key):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = answer_key
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+answer_keys = AnswerKeyCache(
+    max_entries=getattr(settings, 'ANSWER_KEY_CACHE_MAX_ENTRIES', 512),
+    ttl=getattr(settings, 'ANSWER_KEY_CACHE_TTL', 24 * 3600),
+)
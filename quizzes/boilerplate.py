@@ -0,0 +1,46 @@
+import math
+import re
+
+# Removal of running headers, footers, page numbers and copyright lines that
+# PDFs and slide decks repeat on every page. Parsers separate pages with
+# PAGE_BREAK; a line counts as boilerplate when its normalized form (case,
+# whitespace and digits folded, so "Page 3 of 20" matches on every page)
+# occurs on enough pages. Pure Python so it can run in parser processes.
+
+PAGE_BREAK = '\f'
+MIN_PAGES = 3
+MIN_PAGE_FRACTION = 0.5
+
+_DIGITS_RE = re.compile(r'\d+')
+
+
+def normalize_line(line):
+    return ' '.join(_DIGITS_RE.sub('#', line.lower()).split())
+
+
+def strip_boilerplate(text, min_pages=MIN_PAGES, min_fraction=MIN_PAGE_FRACTION):
+    """Drop lines repeated across the PAGE_BREAK-separated pages of ``text``.
+
+    A line is removed when its normalized form appears on at least
+    ``min_fraction`` of the pages and on no fewer than ``min_pages``.
+    Returns ``(text, removed_chars)`` with pages joined by newlines.
+    """
+    pages = text.split(PAGE_BREAK)
+    joined = '\n'.join(pages)
+    if len(pages) < min_pages:
+        return joined, 0
+
+    page_lines = [page.splitlines() for page in pages]
+    counts = {}
+    for lines in page_lines:
+        for key in {normalize_line(line) for line in lines}:
+            if key:
+                counts[key] = counts.get(key, 0) + 1
+    threshold = max(min_pages, math.ceil(len(pages) * min_fraction))
+    repeated = {key for key, count in counts.items() if count >= threshold}
+    if not repeated:
+        return joined, 0
+
+    kept = [line for lines in page_lines for line in lines if normalize_line(line) not in repeated]
+    stripped = '\n'.join(kept)
+    return stripped, len(joined) - len(stripped)
@@ -0,0 +1,152 @@
+import math
+import re
+from collections import Counter
+
+# Lexical relevance ranking used to fit long documents into the prompt budget.
+# Everything here is offline and linear in the input size.
+
+SECTION_CHARS = 1200
+QUERY_TERMS = 60
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r"[a-z][a-z0-9]{2,}")
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?])\s+")
+
+STOPWORDS = frozenset("""
+about above after again against all also and any are because been before being below between both
+but can could did does doing down during each few for from further had has have having her here
+hers herself him himself his how into its itself just more most other our ours ourselves out over
+own same she should some such than that the their theirs them themselves then there these they
+this those through too under until very was were what when where which while who whom why will
+with would you your yours yourself yourselves not only one two may might must shall use used
+using page chapter figure table see also etc
+""".split())
+
+
+def _iter_pieces(text, target_chars):
+    """Yield non-empty lines, splitting overlong ones at sentence boundaries"""
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if len(line) <= target_chars:
+            yield line
+            continue
+        for sentence in _SENTENCE_SPLIT_RE.split(line):
+            # Hard-split run-on text that has no sentence punctuation at all
+            for start in range(0, len(sentence), target_chars):
+                piece = sentence[start:start + target_chars].strip()
+                if piece:
+                    yield piece
+
+
+def split_sections(text, target_chars=SECTION_CHARS):
+    """Group a document's lines into sections of roughly ``target_chars``"""
+    sections = []
+    current = []
+    size = 0
+    for piece in _iter_pieces(text, target_chars):
+        current.append(piece)
+        size += len(piece) + 1
+        if size >= target_chars:
+            sections.append("\n".join(current))
+            current = []
+            size = 0
+    if current:
+        sections.append("\n".join(current))
+    return sections
+
+
+def tokenize(text):
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+def score_sections(section_terms):
+    """BM25-score each section against the collection's most salient terms.
+
+    There is no user query, so the query is built from the terms with the
+    highest collection-wide TF-IDF: sections that concentrate the document's
+    characteristic vocabulary rank highest, boilerplate and filler lowest.
+    """
+    n = len(section_terms)
+    if n == 0:
+        return []
+    df = Counter()
+    collection_tf = Counter()
+    for terms in section_terms:
+        collection_tf.update(terms)
+        df.update(terms.keys())
+
+    idf = {t: math.log((n - d + 0.5) / (d + 0.5) + 1.0) for t, d in df.items()}
+    salience = {t: (1.0 + math.log(tf)) * idf[t] for t, tf in collection_tf.items()}
+    query = sorted(salience, key=salience.get, reverse=True)[:QUERY_TERMS]
+
+    lengths = [sum(terms.values()) for terms in section_terms]
+    avg_len = (sum(lengths) / n) or 1.0
+    scores = []
+    for terms, length in zip(section_terms, lengths):
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * length / avg_len)
+        score = 0.0
+        for t in query:
+            tf = terms.get(t)
+            if tf:
+                score += idf[t] * tf * (BM25_K1 + 1) / (tf + norm)
+        scores.append(score)
+    return scores
+
+
+def select_relevant_text(documents, budget, normalize=None, separator="\n\n"):
+    """Fit the most informative sections of ``documents`` into ``budget`` chars.
+
+    Each document is split into sections (optionally passed through
+    ``normalize``), sections are ranked with ``score_sections`` and documents
+    take turns contributing their best remaining section so that one long file
+    cannot crowd out the others. Selected sections are returned in their
+    original order.
+    """
+    sections = []  # (doc_index, position, text)
+    for doc_index, document in enumerate(documents):
+        for position, section in enumerate(split_sections(document or "")):
+            if normalize is not None:
+                section = normalize(section)
+            if section:
+                sections.append((doc_index, position, section))
+
+    total = sum(len(text) for _, _, text in sections) + len(separator) * max(len(sections) - 1, 0)
+    if total <= budget:
+        return separator.join(text for _, _, text in sections)
+
+    scores = score_sections([Counter(tokenize(text)) for _, _, text in sections])
+    ranked = {}
+    for (doc_index, position, text), score in zip(sections, scores):
+        ranked.setdefault(doc_index, []).append((score, position, text))
+    for candidates in ranked.values():
+        # Prefer information density so short, keyword-heavy sections aren't
+        # beaten by long ones on raw score alone
+        candidates.sort(key=lambda c: (c[0] / math.sqrt(len(c[2])), -c[1]))
+
+    selected = []
+    remaining = budget
+    active = sorted(ranked)
+    while active:
+        still_active = []
+        for doc_index in active:
+            candidates = ranked[doc_index]
+            while candidates:
+                score, position, text = candidates.pop()
+                cost = len(text) + len(separator)
+                if cost <= remaining:
+                    selected.append((doc_index, position, text))
+                    remaining -= cost
+                    break
+            if candidates:
+                still_active.append(doc_index)
+        active = still_active
+
+    if not selected:
+        # Every section is larger than the budget; fall back to a plain cut
+        return sections[0][2][:budget]
+
+    selected.sort()
+    return separator.join(text for _, _, text in selected)
@@ -0,0 +1,245 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.db import connection
+
+from .rate_limit import RateLimitExceeded
+
+logger = logging.getLogger(__name__)
+
+# Per-model health tracking for LLM calls. Each model gets a circuit breaker
+# over a rolling window of recent calls: when too many fail it opens and
+# calls fail fast for a cooldown instead of burning retries, then a single
+# probe decides whether to close it again. The same window's latencies drive
+# hedging, where a slow primary call races a request to a faster fallback
+# model and the first acceptable result wins. State is per process.
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a model whose circuit is open"""
+
+
+class CircuitBreaker:
+    """Rolling error rate and latency of one model's calls.
+
+    Opens once at least ``min_calls`` of the last ``window`` calls are
+    recorded and ``error_rate`` of them failed (0 never opens); after ``cooldown`` seconds
+    one probe call is let through (half-open) and its outcome closes or
+    re-opens the circuit.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, model_name, window, min_calls, error_rate, cooldown):
+        self.model_name = model_name
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self._outcomes = deque(maxlen=window)  # (ok, latency seconds)
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def allow(self):
+        """Whether a call may be made now; claims the probe when half-open"""
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.cooldown:
+                    self.rejected += 1
+                    return False
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.HALF_OPEN:
+                if self._probing:
+                    self.rejected += 1
+                    return False
+                self._probing = True
+            return True
+
+    def is_open(self):
+        """Whether calls are currently being refused (the cooldown has not passed)"""
+        with self._lock:
+            return self.state == self.OPEN and time.monotonic() - self._opened_at < self.cooldown
+
+    def cancel(self):
+        """Give back a probe claimed by ``allow`` for a call that never reached the model"""
+        with self._lock:
+            self._probing = False
+
+    def record(self, ok, latency):
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probing = False
+                if ok:
+                    logger.debug("Circuit for %s closed after successful probe", self.model_name)
+                    self.state = self.CLOSED
+                    self._outcomes.clear()
+                else:
+                    self._open()
+            self._outcomes.append((ok, latency))
+            if self.error_rate and self.state == self.CLOSED and len(self._outcomes) >= self.min_calls:
+                failures = sum(1 for outcome, _ in self._outcomes if not outcome)
+                if failures / len(self._outcomes) >= self.error_rate:
+                    self._open()
+
+    def _open(self):
+        logger.warning("Circuit for %s opened for %ss", self.model_name, self.cooldown)
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+
+    def p95_latency(self):
+        """95th percentile latency of recent successful calls, or None with too few samples"""
+        with self._lock:
+            latencies = sorted(latency for ok, latency in self._outcomes if ok)
+        if len(latencies) < self.min_calls:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+
+    def stats(self):
+        p95 = self.p95_latency()
+        with self._lock:
+            calls = len(self._outcomes)
+            failures = sum(1 for ok, _ in self._outcomes if not ok)
+            return {
+                'state': self.state,
+                'window_calls': calls,
+                'error_rate': round(failures / calls, 3) if calls else 0.0,
+                'p95_latency_seconds': round(p95, 3) if p95 is not None else None,
+                'rejected': self.rejected,
+            }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(model_name):
+    with _breakers_lock:
+        breaker = _breakers.get(model_name)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                model_name,
+                window=getattr(settings, 'CIRCUIT_BREAKER_WINDOW', 20),
+                min_calls=getattr(settings, 'CIRCUIT_BREAKER_MIN_CALLS', 5),
+                error_rate=getattr(settings, 'CIRCUIT_BREAKER_ERROR_RATE', 0.5),
+                cooldown=getattr(settings, 'CIRCUIT_BREAKER_COOLDOWN', 30),
+            )
+            _breakers[model_name] = breaker
+        return breaker
+
+
+def breaker_stats():
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.model_name: breaker.stats() for breaker in breakers}
+
+
+def reset_breakers():
+    with _breakers_lock:
+        _breakers.clear()
+
+
+def _admit(provider):
+    breaker = get_breaker(provider.model_name)
+    if not breaker.allow():
+        raise CircuitOpenError(f"{provider.model_name} is failing; circuit open [SERVICE_UNAVAILABLE]")
+    return breaker
+
+
+def _timed_call(breaker, provider, call):
+    start = time.monotonic()
+    try:
+        result = call(provider)
+    except RateLimitExceeded:
+        # Our own admission control, not a sign the model is unhealthy
+        breaker.cancel()
+        raise
+    except Exception:
+        breaker.record(False, time.monotonic() - start)
+        raise
+    breaker.record(True, time.monotonic() - start)
+    return result
+
+
+def call_with_breaker(provider, call):
+    """Run ``call(provider)`` through ``provider``'s breaker, recording outcome and latency"""
+    return _timed_call(_admit(provider), provider, call)
+
+
+def select_provider(primary, fallback):
+    """The provider to use for a call that cannot be hedged (e.g. streaming)"""
+    if fallback is None or not get_breaker(primary.model_name).is_open():
+        return primary
+    logger.warning("Circuit for %s open, using %s", primary.model_name, fallback.model_name)
+    return fallback
+
+
+def _hedge_task(breaker, provider, call):
+    try:
+        if breaker is None:
+            breaker = _admit(provider)
+        return _timed_call(breaker, provider, call)
+    finally:
+        # Runs on a hedging thread; the rate limiter may have opened a connection
+        connection.close()
+
+
+def hedged_call(primary, fallback, call, accept):
+    """Return ``accept(call(provider))`` from the primary or, if it is slow or failing, the fallback.
+
+    The fallback is started when the primary's circuit is open or once the
+    primary call has run past its rolling p95 latency (LLM_HEDGE_AFTER_SECONDS
+    until enough calls are recorded). Whichever result passes ``accept``
+    first is returned; the other call is left to finish in the background.
+    Without a fallback this is a plain call through the primary's breaker.
+    """
+    if fallback is None or fallback.model_name == primary.model_name:
+        return accept(call_with_breaker(primary, call))
+
+    hedge_after = get_breaker(primary.model_name).p95_latency()
+    if hedge_after is None:
+        hedge_after = getattr(settings, 'LLM_HEDGE_AFTER_SECONDS', 20)
+
+    pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='llm-hedge')
+    pending = {}
+    errors = {}
+    try:
+        try:
+            breaker = _admit(primary)
+        except CircuitOpenError as e:
+            logger.warning("Circuit for %s open, using %s", primary.model_name, fallback.model_name)
+            errors[primary] = e
+            done = set()
+        else:
+            pending[pool.submit(_hedge_task, breaker, primary, call)] = primary
+            done, _ = wait(pending, timeout=hedge_after)
+        hedged = False
+        while True:
+            for future in done:
+                provider = pending.pop(future)
+                try:
+                    return accept(future.result())
+                except RateLimitExceeded:
+                    raise
+                except Exception as e:
+                    logger.warning("%s result rejected: %s", provider.model_name, e)
+                    errors[provider] = e
+            if not hedged:
+                hedged = True
+                if pending:
+                    logger.warning("%s slower than %.1fs, hedging with %s", primary.model_name, hedge_after, fallback.model_name)
+                pending[pool.submit(_hedge_task, None, fallback, call)] = fallback
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+    finally:
+        pool.shutdown(wait=False)
+    # Prefer the primary's error so callers react to the usual failure modes
+    raise errors.get(primary) or errors[fallback]
@@ -0,0 +1,142 @@
+import hashlib
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ProviderContextHandle
+
+logger = logging.getLogger(__name__)
+
+# Provider-side context caching for documents far larger than the prompt
+# budget: the full text is uploaded once as a cached context and later
+# generations reference it by handle instead of resending it. Handles are
+# tracked per document hash and model in ``ProviderContextHandle`` so every
+# worker reuses them until they expire.
+
+# A handle must outlive a whole generation to be handed out
+REUSE_MARGIN_SECONDS = 120
+
+
+class ContextHandleCache:
+    """Handles of cached provider contexts, keyed by document hash and model.
+
+    Documents of at least ``min_chars`` characters are uploaded to providers
+    that support context caching and kept for ``ttl`` seconds; ``min_chars``
+    of 0 disables context caching.
+    """
+
+    def __init__(self, min_chars, ttl):
+        self.min_chars = min_chars
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.created = 0
+        self.failures = 0
+        self.invalidated = 0
+
+    def applies_to(self, provider, text_length):
+        return bool(self.min_chars) and provider.supports_context_cache and text_length >= self.min_chars
+
+    @staticmethod
+    def content_hash(text):
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def get_or_create(self, provider, text):
+        """Return a live handle for ``text`` on ``provider``'s model, uploading it if needed.
+
+        Returns None when the upload fails, in which case the caller sends
+        the text inline as usual.
+        """
+        content_hash = self.content_hash(text)
+        try:
+            handle = self._db_get(content_hash, provider.model_name)
+        except DatabaseError as e:
+            logger.warning("Context handle lookup failed: %s", e)
+            handle = None
+        if handle is not None:
+            with self._lock:
+                self.hits += 1
+            logger.debug("Reusing cached context %s for %s chars", handle, len(text))
+            return handle
+
+        try:
+            handle = provider.create_context_cache(text, self.ttl)
+        except Exception as e:
+            with self._lock:
+                self.failures += 1
+            logger.warning("Context cache upload failed, sending text inline: %s", e)
+            return None
+        with self._lock:
+            self.created += 1
+        logger.debug("Uploaded %s chars as cached context %s", len(text), handle)
+        try:
+            self._db_set(content_hash, provider.model_name, handle, len(text))
+        except DatabaseError as e:
+            # Still usable for this generation; the next one uploads again
+            logger.warning("Context handle store failed: %s", e)
+        return handle
+
+    def invalidate(self, handle):
+        """Forget a handle the provider no longer recognizes"""
+        with self._lock:
+            self.invalidated += 1
+        try:
+            ProviderContextHandle.objects.filter(handle=handle).delete()
+        except DatabaseError as e:
+            logger.warning("Context handle delete failed: %s", e)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': bool(self.min_chars),
+                'min_chars': self.min_chars,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'created': self.created,
+                'failures': self.failures,
+                'invalidated': self.invalidated,
+            }
+
+    def _db_get(self, content_hash, model_name):
+        now = timezone.now()
+        entry = ProviderContextHandle.objects.filter(
+            content_hash=content_hash,
+            model_name=model_name,
+            expires_at__gt=now + timedelta(seconds=REUSE_MARGIN_SECONDS),
+        ).first()
+        if entry is None:
+            return None
+        ProviderContextHandle.objects.filter(pk=entry.pk).update(
+            hit_count=F('hit_count') + 1,
+            last_used_at=now,
+        )
+        return entry.handle
+
+    def _db_set(self, content_hash, model_name, handle, source_chars):
+        now = timezone.now()
+        ProviderContextHandle.objects.filter(expires_at__lte=now).delete()
+        try:
+            ProviderContextHandle.objects.update_or_create(
+                content_hash=content_hash,
+                model_name=model_name,
+                defaults={
+                    'handle': handle,
+                    'source_chars': source_chars,
+                    'expires_at': now + timedelta(seconds=self.ttl),
+                    'last_used_at': now,
+                },
+            )
+        except IntegrityError:
+            # Another worker uploaded the same document concurrently
+            return
+
+
+context_handles = ContextHandleCache(
+    min_chars=getattr(settings, 'LLM_CONTEXT_CACHE_MIN_CHARS', 0),
+    ttl=getattr(settings, 'LLM_CONTEXT_CACHE_TTL', 3600),
+)
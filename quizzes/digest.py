@@ -0,0 +1,245 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DatabaseError, IntegrityError, close_old_connections
+from django.db.models import F
+from django.utils import timezone
+
+from .circuit_breaker import call_with_breaker
+from .models import DocumentDigest
+
+logger = logging.getLogger(__name__)
+
+# Summarize-once, generate-many: a document's selected prompt text is
+# condensed by the model into a topic-tagged outline, cached by content hash,
+# and every later generation from the same document prompts from the outline
+# instead of the full text. Building a digest costs a model call of its own,
+# so it is only worth it for documents that come back: the first generation
+# from a document just records its hash, the second schedules the digest in
+# the background without waiting for it, and later ones use it.
+
+# Bump whenever DIGEST_PROMPT changes so stored digests are rebuilt
+DIGEST_VERSION = 1
+
+DIGEST_PROMPT = """
+Condense the educational material below into a compact study outline that quiz questions will be written from.
+- Group the content under topic headings written as "## Topic: <name>", with a blank line between topics.
+- Under each heading list the key facts as "- " bullets: definitions, processes, causes and effects, names, dates and numbers.
+- Keep every fact a question could test; drop examples, repetition and filler.
+- Use at most {target_chars} characters. Return only the outline.
+
+Educational material:
+{text}
+"""
+
+
+def create_digest_prompt(text):
+    return DIGEST_PROMPT.format(target_chars=max(1500, len(text) // 4), text=text)
+
+
+def is_usable_digest(digest, source_chars):
+    """A digest must be an outline and meaningfully shorter than its source"""
+    return bool(digest) and '\n- ' in f"\n{digest}" and len(digest) < source_chars * 0.75
+
+
+class DocumentDigestCache:
+    """Two-tier cache of document digests keyed by content hash, model and digest version.
+
+    The first tier is an in-process LRU of ``max_entries`` digests; the second
+    is the ``DocumentDigest`` table shared by all workers and pruned to
+    ``db_max_entries`` least recently used rows. Texts shorter than
+    ``min_chars`` are sent as they are; ``min_chars`` of 0 disables digests.
+    A digest is only built once a document has been seen before within
+    ``seen_ttl`` seconds, tracked in the shared Django cache.
+    """
+
+    def __init__(self, min_chars, max_entries, db_max_entries, seen_ttl, cache_alias='default'):
+        self.min_chars = min_chars
+        self.max_entries = max_entries
+        self.db_max_entries = db_max_entries
+        self.seen_ttl = seen_ttl
+        self.cache_alias = cache_alias
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._building = set()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='quiz-digest')
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.first_sightings = 0
+        self.built = 0
+        self.chars_saved = 0
+
+    def applies_to(self, text):
+        return bool(self.min_chars) and len(text) >= self.min_chars
+
+    @staticmethod
+    def make_key(text, model_name):
+        digest = hashlib.sha256(text.encode('utf-8'))
+        digest.update(f"\0{model_name}\0{DIGEST_VERSION}".encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, text, model_name):
+        """Return the cached digest of ``text``, or None on a miss"""
+        key = self.make_key(text, model_name)
+        digest = self._memory_get(key)
+        tier = 'memory'
+        if digest is None:
+            tier = 'db'
+            try:
+                digest = self._db_get(key)
+            except DatabaseError as e:
+                # The digest is an optimization; fall back to the full text
+                logger.warning("Document digest lookup failed: %s", e)
+            if digest is not None:
+                self._memory_set(key, digest)
+        with self._lock:
+            if digest is None:
+                self.misses += 1
+                return None
+            if tier == 'memory':
+                self.memory_hits += 1
+            else:
+                self.db_hits += 1
+            self.chars_saved += len(text) - len(digest)
+        logger.debug("Document digest hit (%s) for %s", tier, key[:12])
+        return digest
+
+    def get_or_schedule(self, provider, text):
+        """Return the cached digest, or None after queueing it to be built for a repeated document"""
+        digest = self.get(text, provider.model_name)
+        if digest is None and not self._first_sighting(self.make_key(text, provider.model_name)):
+            self.schedule(provider, text)
+        return digest
+
+    def _first_sighting(self, key):
+        """Record that ``key`` was requested; True unless it already was within ``seen_ttl``"""
+        try:
+            first = caches[self.cache_alias].add(f"quizzes:digest-seen:{key}", True, self.seen_ttl)
+        except Exception as e:
+            # Without the marker a digest could cost every one-off document a call
+            logger.warning("Document sighting check failed: %s", e)
+            first = True
+        if first:
+            with self._lock:
+                self.first_sightings += 1
+        return first
+
+    def schedule(self, provider, text):
+        key = self.make_key(text, provider.model_name)
+        with self._lock:
+            if key in self._building:
+                return
+            self._building.add(key)
+        self._executor.submit(self._build_in_background, key, provider, text)
+
+    def build(self, provider, text):
+        """Condense ``text`` with ``provider`` and store it; returns None if unusable"""
+        logger.debug("Building document digest of %s chars with %s", len(text), provider.model_name)
+        digest = call_with_breaker(
+            provider,
+            lambda p: p.generate(create_digest_prompt(text), temperature=0.2, max_output_tokens=2048),
+        ).strip()
+        if not is_usable_digest(digest, len(text)):
+            logger.warning("Discarding unusable document digest (%s chars)", len(digest))
+            return None
+        key = self.make_key(text, provider.model_name)
+        try:
+            self._db_set(key, digest, provider.model_name, len(text))
+        except DatabaseError as e:
+            logger.warning("Document digest store failed: %s", e)
+        self._memory_set(key, digest)
+        with self._lock:
+            self.built += 1
+        logger.debug("Document digest built: %s -> %s chars", len(text), len(digest))
+        return digest
+
+    def _build_in_background(self, key, provider, text):
+        close_old_connections()
+        try:
+            self.build(provider, text)
+        except Exception as e:
+            # The next generation simply tries again
+            logger.warning("Document digest failed: %s", e)
+        finally:
+            with self._lock:
+                self._building.discard(key)
+            close_old_connections()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.memory_hits + self.db_hits + self.misses
+            return {
+                'enabled': bool(self.min_chars),
+                'min_chars': self.min_chars,
+                'memory_hits': self.memory_hits,
+                'db_hits': self.db_hits,
+                'misses': self.misses,
+                'hit_rate': round((self.memory_hits + self.db_hits) / lookups * 100, 1) if lookups else 0.0,
+                'first_sightings': self.first_sightings,
+                'built': self.built,
+                'building': len(self._building),
+                'prompt_chars_saved': self.chars_saved,
+                'memory_entries': len(self._entries),
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _memory_get(self, key):
+        with self._lock:
+            digest = self._entries.get(key)
+            if digest is not None:
+                self._entries.move_to_end(key)
+            return digest
+
+    def _memory_set(self, key, digest):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = digest
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _db_get(self, key):
+        entry = DocumentDigest.objects.filter(cache_key=key).first()
+        if entry is None:
+            return None
+        DocumentDigest.objects.filter(pk=entry.pk).update(
+            hit_count=F('hit_count') + 1,
+            last_used_at=timezone.now(),
+        )
+        return entry.digest
+
+    def _db_set(self, key, digest, model_name, source_chars):
+        try:
+            DocumentDigest.objects.create(
+                cache_key=key,
+                model_name=model_name,
+                prompt_version=DIGEST_VERSION,
+                digest=digest,
+                source_chars=source_chars,
+                digest_chars=len(digest),
+            )
+        except IntegrityError:
+            # Another worker built the same digest concurrently
+            return
+        stale = DocumentDigest.objects.order_by('-last_used_at').values_list('pk', flat=True)[self.db_max_entries:]
+        stale_ids = list(stale)
+        if stale_ids:
+            DocumentDigest.objects.filter(pk__in=stale_ids).delete()
+
+
+document_digests = DocumentDigestCache(
+    min_chars=getattr(settings, 'QUIZ_DIGEST_MIN_CHARS', 4000),
+    max_entries=getattr(settings, 'QUIZ_DIGEST_MAX_ENTRIES', 256),
+    db_max_entries=getattr(settings, 'QUIZ_DIGEST_DB_MAX_ENTRIES', 2000),
+    seen_ttl=getattr(settings, 'QUIZ_DIGEST_SEEN_TTL', 7 * 24 * 3600),
+)
@@ -0,0 +1,254 @@
+import hashlib
+import logging
+import multiprocessing
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ParsedDocument
+from .parsing import parse_file_bytes
+
+logger = logging.getLogger(__name__)
+
+
+class ParsedTextCache:
+    """Two-tier cache of extracted document text keyed by SHA-256 of the upload.
+
+    The first tier is an in-process LRU bounded by the total number of cached
+    characters; the second is the ``ParsedDocument`` table, shared by every
+    gunicorn worker and pruned to ``db_max_entries`` least recently used rows.
+    """
+
+    def __init__(self, max_chars, db_max_entries):
+        self.max_chars = max_chars
+        self.db_max_entries = db_max_entries
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.boilerplate_chars = 0
+
+    @staticmethod
+    def make_key(file_bytes, name):
+        ext = name.lower().split('.')[-1]
+        return hashlib.sha256(file_bytes).hexdigest(), ext
+
+    def get_or_parse(self, name, file_bytes):
+        """Return the text for ``file_bytes``, parsing only on a full miss"""
+        key, text = self.lookup(name, file_bytes)
+        if text is None:
+            text, boilerplate_chars = parse_file_bytes(name, file_bytes, _pdf_char_budget())
+            self.store(key, text, len(file_bytes), boilerplate_chars)
+        return text
+
+    def lookup(self, name, file_bytes):
+        """Return ``(key, text)``; ``text`` is None on a miss"""
+        key = self.make_key(file_bytes, name)
+
+        text = self._memory_get(key)
+        if text is not None:
+            with self._lock:
+                self.memory_hits += 1
+            logger.debug("Parsed text cache hit (memory) for %s", name)
+            return key, text
+
+        text = self._db_get(key)
+        if text is not None:
+            with self._lock:
+                self.db_hits += 1
+            logger.debug("Parsed text cache hit (db) for %s", name)
+            self._memory_set(key, text)
+            return key, text
+
+        with self._lock:
+            self.misses += 1
+        logger.debug("Parsed text cache miss for %s", name)
+        return key, None
+
+    def store(self, key, text, byte_size, boilerplate_chars=0):
+        with self._lock:
+            self.boilerplate_chars += boilerplate_chars
+        self._db_set(key, text, byte_size, boilerplate_chars)
+        self._memory_set(key, text)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.memory_hits + self.db_hits + self.misses
+            return {
+                'memory_hits': self.memory_hits,
+                'db_hits': self.db_hits,
+                'misses': self.misses,
+                'hit_rate': round((self.memory_hits + self.db_hits) / lookups * 100, 1) if lookups else 0.0,
+                'boilerplate_chars_removed': self.boilerplate_chars,
+                'memory_entries': len(self._entries),
+                'memory_chars': self._size,
+                'memory_max_chars': self.max_chars,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _memory_get(self, key):
+        with self._lock:
+            text = self._entries.get(key)
+            if text is not None:
+                self._entries.move_to_end(key)
+            return text
+
+    def _memory_set(self, key, text):
+        if len(text) > self.max_chars:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._entries[key] = text
+            self._size += len(text)
+            while self._size > self.max_chars:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def _db_get(self, key):
+        content_hash, file_type = key
+        doc = ParsedDocument.objects.filter(content_hash=content_hash, file_type=file_type).first()
+        if doc is None:
+            return None
+        ParsedDocument.objects.filter(pk=doc.pk).update(
+            hit_count=F('hit_count') + 1,
+            last_used_at=timezone.now(),
+        )
+        return doc.text
+
+    def _db_set(self, key, text, byte_size, boilerplate_chars):
+        content_hash, file_type = key
+        try:
+            ParsedDocument.objects.create(
+                content_hash=content_hash,
+                file_type=file_type,
+                text=text,
+                byte_size=byte_size,
+                boilerplate_chars=boilerplate_chars,
+            )
+        except IntegrityError:
+            # Another worker parsed the same document concurrently
+            return
+        stale = ParsedDocument.objects.order_by('-last_used_at').values_list('pk', flat=True)[self.db_max_entries:]
+        stale_ids = list(stale)
+        if stale_ids:
+            ParsedDocument.objects.filter(pk__in=stale_ids).delete()
+
+
+parsed_text_cache = ParsedTextCache(
+    max_chars=getattr(settings, 'PARSED_TEXT_CACHE_MAX_CHARS', 32 * 1024 * 1024),
+    db_max_entries=getattr(settings, 'PARSED_TEXT_CACHE_DB_MAX_ENTRIES', 500),
+)
+
+
+def parse_document_bytes(name, file_bytes):
+    """Cached equivalent of ``parse_document`` for an upload read into memory"""
+    return parsed_text_cache.get_or_parse(name, file_bytes)
+
+
+def _pdf_char_budget():
+    return getattr(settings, 'PDF_TEXT_CHAR_BUDGET', 0)
+
+
+# Parsing is CPU-bound, so multi-file uploads are spread over worker
+# processes. "spawn" avoids forking a gunicorn worker that has live threads.
+_parse_pool = None
+_parse_pool_lock = threading.Lock()
+
+
+def _get_parse_pool():
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            _parse_pool = ProcessPoolExecutor(
+                max_workers=getattr(settings, 'DOCUMENT_PARSE_PROCESSES', 2),
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _parse_pool
+
+
+def _discard_parse_pool(pool, terminate=False):
+    """Stop handing work to a pool whose worker hung or died; the next caller gets a fresh pool.
+
+    With ``terminate`` its worker processes are killed, so a parser stuck on
+    a hostile file does not keep running (other files still queued there
+    fail as crashed).
+    """
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is pool:
+            _parse_pool = None
+    if terminate:
+        for process in list((pool._processes or {}).values()):
+            process.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def parse_documents(uploads):
+    """Parse several uploads concurrently, isolating failures per file.
+
+    ``uploads`` is a list of ``(file_name, file_bytes)`` pairs. Returns a list
+    of ``(file_name, text, error)`` in the same order, where exactly one of
+    ``text``/``error`` is None. Cached documents never reach the pool.
+    """
+    timeout = getattr(settings, 'DOCUMENT_PARSE_TIMEOUT', 60)
+    budget = _pdf_char_budget()
+    results = [None] * len(uploads)
+    pending = []
+    for index, (name, file_bytes) in enumerate(uploads):
+        key, text = parsed_text_cache.lookup(name, file_bytes)
+        if text is not None:
+            results[index] = (name, text, None)
+        else:
+            pending.append((index, key, name, file_bytes))
+
+    if len(pending) == 1:
+        # Nothing to overlap with; skip the inter-process copy
+        index, key, name, file_bytes = pending[0]
+        try:
+            text, boilerplate_chars = parse_file_bytes(name, file_bytes, budget)
+            parsed_text_cache.store(key, text, len(file_bytes), boilerplate_chars)
+            results[index] = (name, text, None)
+        except Exception as e:
+            results[index] = (name, None, str(e))
+        return results
+
+    pool = _get_parse_pool() if pending else None
+    futures = [
+        (index, key, name, file_bytes, pool.submit(parse_file_bytes, name, file_bytes, budget))
+        for index, key, name, file_bytes in pending
+    ]
+    # One deadline for the whole upload rather than one timeout per file
+    _, not_done = wait([future for *_, future in futures], timeout=timeout)
+    if not_done:
+        _discard_parse_pool(pool, terminate=True)
+    for index, key, name, file_bytes, future in futures:
+        if future in not_done:
+            logger.warning("Parsing %s timed out after %ss", name, timeout)
+            results[index] = (name, None, f"Timed out parsing {name}")
+            continue
+        try:
+            text, boilerplate_chars = future.result()
+        except BrokenProcessPool:
+            _discard_parse_pool(pool)
+            results[index] = (name, None, f"Parser crashed on {name}")
+            continue
+        except Exception as e:
+            results[index] = (name, None, str(e))
+            continue
+        parsed_text_cache.store(key, text, len(file_bytes), boilerplate_chars)
+        results[index] = (name, text, None)
+    return results
@@ -0,0 +1,227 @@
+import json
+import threading
+from collections import OrderedDict
+from difflib import SequenceMatcher
+
+from django.conf import settings
+
+# One grading engine for solo quizzes, rooms and realtime games. Each
+# question is compiled once into a matcher for its answer format: an option
+# index, normalized text, a set of options that must all be selected, or
+# accepted variants with a fuzzy threshold for fill-in-the-blank answers.
+# Matchers are plain picklable objects so compiled keys can be cached.
+# Quiz questions are compiled per quiz version (see answer_key); room and
+# legacy core questions, graded one submission at a time, go through the
+# per-question ``question_matchers`` cache below.
+
+# Shorter answers must match a variant exactly; one typo changes a short word
+FUZZY_MIN_CHARS = 5
+
+
+def normalize_text(value):
+    """Case- and whitespace-insensitive form of a text answer"""
+    return ' '.join(str(value).casefold().split()).rstrip('.')
+
+
+def option_text(option):
+    """Text of an option given as a string or as a ``{"id", "title"}`` dict"""
+    if isinstance(option, dict):
+        return str(option.get('title', option.get('text', '')))
+    return str(option)
+
+
+def _single(answer):
+    # Room clients submit single answers as one-element lists
+    if isinstance(answer, (list, tuple)) and len(answer) == 1:
+        return answer[0]
+    return answer
+
+
+def _is_index(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+class IndexMatcher:
+    """Choice question: the correct option, given by index or by its text"""
+    __slots__ = ('index', 'text')
+
+    def __init__(self, index, text=None):
+        self.index = index
+        self.text = text
+
+    def matches(self, answer):
+        answer = _single(answer)
+        if _is_index(answer):
+            return answer == self.index
+        if answer is None:
+            return False
+        if self.text is None:
+            # Options unknown: the answer can only be an index in string form
+            return str(answer).strip() == str(self.index)
+        return normalize_text(answer) == self.text
+
+
+class TextMatcher:
+    """Free-text answer equal to one of the accepted variants after normalization"""
+    __slots__ = ('variants',)
+
+    def __init__(self, variants):
+        self.variants = frozenset(variants)
+
+    def matches(self, answer):
+        answer = _single(answer)
+        return answer is not None and normalize_text(answer) in self.variants
+
+
+class FuzzyMatcher(TextMatcher):
+    """Text variants that also accept near misses at ``threshold`` similarity (1 disables)"""
+    __slots__ = ('threshold',)
+
+    def __init__(self, variants, threshold):
+        super().__init__(variants)
+        self.threshold = threshold
+
+    def matches(self, answer):
+        answer = _single(answer)
+        if answer is None:
+            return False
+        text = normalize_text(answer)
+        if text in self.variants:
+            return True
+        if self.threshold >= 1 or len(text) < FUZZY_MIN_CHARS:
+            return False
+        for variant in self.variants:
+            if len(variant) < FUZZY_MIN_CHARS:
+                continue
+            matcher = SequenceMatcher(None, text, variant, autojunk=False)
+            # The cheap upper bounds reject most wrong answers before ratio()
+            if (matcher.real_quick_ratio() >= self.threshold
+                    and matcher.quick_ratio() >= self.threshold
+                    and matcher.ratio() >= self.threshold):
+                return True
+        return False
+
+
+class SetMatcher:
+    """Multi-select: exactly the correct options, by index or text, in any order"""
+    __slots__ = ('expected', 'options')
+
+    def __init__(self, correct_answers, options=()):
+        self.options = tuple(normalize_text(option) for option in options)
+        self.expected = self._normalize(correct_answers)
+
+    def _normalize(self, answers):
+        normalized = set()
+        for answer in answers:
+            if _is_index(answer) and 0 <= answer < len(self.options):
+                normalized.add(self.options[answer])
+            else:
+                normalized.add(normalize_text(answer))
+        return frozenset(normalized)
+
+    def matches(self, answer):
+        if answer is None:
+            return False
+        if not isinstance(answer, (list, tuple, set, frozenset)):
+            answer = [answer]
+        return self._normalize(answer) == self.expected
+
+
+def compile_matcher(question_type, correct_answer, options=(), fuzzy_threshold=None):
+    """Compile one question's correct answer (a value or a list of them) into a matcher"""
+    options = [option_text(option) for option in options or ()]
+    if fuzzy_threshold is None:
+        fuzzy_threshold = getattr(settings, 'GRADING_FUZZY_THRESHOLD', 0.85)
+
+    answers = list(correct_answer) if isinstance(correct_answer, (list, tuple)) else [correct_answer]
+    if question_type in ('fill_in_blank', 'fill_blank'):
+        # Several correct answers to a blank are accepted alternatives
+        return FuzzyMatcher({normalize_text(answer) for answer in answers}, fuzzy_threshold)
+    if len(answers) > 1:
+        return SetMatcher(answers, options)
+
+    answer = answers[0] if answers else ''
+    if _is_index(answer):
+        text = normalize_text(options[answer]) if 0 <= answer < len(options) else None
+        return IndexMatcher(answer, text)
+    text = normalize_text(answer)
+    normalized_options = [normalize_text(option) for option in options]
+    if question_type == 'multiple_choice' and text in normalized_options:
+        return IndexMatcher(normalized_options.index(text), text)
+    return TextMatcher({text})
+
+
+def grade_sheet(matchers, answers):
+    """Grade a whole answer sheet.
+
+    ``matchers`` maps question ids (strings) to compiled matchers in question
+    order; ``answers`` maps question ids to submitted answers. Returns
+    ``(correct_count, [(question_id, is_correct), ...])``.
+    """
+    correct = 0
+    results = []
+    for question_id, matcher in matchers.items():
+        answer = answers.get(question_id)
+        is_correct = answer is not None and answer != '' and matcher.matches(answer)
+        if is_correct:
+            correct += 1
+        results.append((question_id, is_correct))
+    return correct, results
+
+
+class MatcherCache:
+    """Compiled matchers of single questions in an in-process LRU of ``max_entries`` (0 disables).
+
+    Entries are keyed by the question's model, id and answer fields, so an
+    edited question compiles afresh and no invalidation is needed.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.compiled = 0
+
+    @staticmethod
+    def make_key(question, correct_answer):
+        answer_fields = json.dumps([question.question_type, correct_answer, question.options], sort_keys=True, default=str)
+        return (question._meta.label, question.pk, answer_fields)
+
+    def get(self, question, correct_answer):
+        """Return the matcher of ``question`` (any model with ``question_type`` and ``options``)"""
+        key = self.make_key(question, correct_answer)
+        with self._lock:
+            matcher = self._entries.get(key)
+            if matcher is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return matcher
+        matcher = compile_matcher(question.question_type, correct_answer, question.options)
+        with self._lock:
+            self.compiled += 1
+            if self.max_entries > 0:
+                self._entries[key] = matcher
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return matcher
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.compiled
+            return {
+                'hits': self.hits,
+                'compiled': self.compiled,
+                'hit_rate': round(self.hits / lookups * 100, 1) if lookups else 0.0,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+question_matchers = MatcherCache(
+    max_entries=getattr(settings, 'GRADING_MATCHER_CACHE_MAX_ENTRIES', 2048),
+)
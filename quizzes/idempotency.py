@@ -0,0 +1,190 @@
+import functools
+import hashlib
+import json
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyRecord
+
+logger = logging.getLogger(__name__)
+
+# Idempotency-Key support for POST endpoints that spend LLM calls or record
+# results. The first request with a key claims an ``IdempotencyRecord``; its
+# successful response is stored and replayed for retries with the same key,
+# and retries arriving while it is still running wait for it. Records are
+# shared by all workers and expire after IDEMPOTENCY_KEY_TTL seconds.
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+POLL_SECONDS = 0.2
+
+
+class IdempotencyConflict(Exception):
+    """The key is held by an earlier request that has not finished"""
+
+
+def _request_fingerprint(request):
+    """Hash of the request data; uploads are represented by name and size"""
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = {field: values for field, values in data.lists()}
+
+    def describe(value):
+        if hasattr(value, 'size') and hasattr(value, 'name'):
+            return f"{value.name}:{value.size}"
+        return str(value)
+
+    payload = json.dumps(data, sort_keys=True, default=describe)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _record_key(request, client_key):
+    user_id = request.user.pk if request.user.is_authenticated else ''
+    scope = f"{user_id}\0{request.method}\0{request.path}\0{client_key}"
+    return hashlib.sha256(scope.encode('utf-8')).hexdigest()
+
+
+def _claim(key, user, fingerprint):
+    """Create the in-progress record for ``key``; returns None if we own it, else the existing record"""
+    now = timezone.now()
+    lock_seconds = getattr(settings, 'IDEMPOTENCY_LOCK_SECONDS', 120)
+    try:
+        with transaction.atomic():
+            IdempotencyRecord.objects.create(
+                key=key,
+                user=user,
+                fingerprint=fingerprint,
+                expires_at=now + timedelta(seconds=lock_seconds),
+            )
+        return None
+    except IntegrityError:
+        pass
+    record = IdempotencyRecord.objects.filter(key=key).first()
+    if record is not None and record.expires_at <= now:
+        # A finished record past its TTL, or a request whose worker died
+        taken = IdempotencyRecord.objects.filter(pk=record.pk, expires_at__lte=now).update(
+            fingerprint=fingerprint,
+            status_code=None,
+            response_data=None,
+            expires_at=now + timedelta(seconds=lock_seconds),
+        )
+        if taken:
+            return None
+        record = IdempotencyRecord.objects.filter(key=key).first()
+    if record is None:
+        # Released between our insert and lookup; try once more
+        return _claim(key, user, fingerprint)
+    return record
+
+
+def _wait_for_completion(record):
+    deadline = time.monotonic() + getattr(settings, 'IDEMPOTENCY_WAIT_SECONDS', 10)
+    while time.monotonic() < deadline:
+        time.sleep(POLL_SECONDS)
+        record = IdempotencyRecord.objects.filter(pk=record.pk).first()
+        if record is None:
+            return None
+        if record.status_code is not None:
+            return record
+    raise IdempotencyConflict()
+
+
+def _replay(record):
+    logger.debug("Replaying idempotent response %s", record.key[:12])
+    response = Response(record.response_data, status=record.status_code)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _store(key, response):
+    now = timezone.now()
+    ttl = getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 3600)
+    IdempotencyRecord.objects.filter(key=key).update(
+        status_code=response.status_code,
+        response_data=response.data,
+        expires_at=now + timedelta(seconds=ttl),
+    )
+    IdempotencyRecord.objects.filter(expires_at__lte=now).exclude(key=key).delete()
+
+
+def _release(key):
+    try:
+        IdempotencyRecord.objects.filter(key=key, status_code__isnull=True).delete()
+    except DatabaseError as e:
+        # The lock lapses on its own after IDEMPOTENCY_LOCK_SECONDS
+        logger.warning("Failed to release idempotency key: %s", e)
+
+
+def idempotent(view):
+    """Honour an ``Idempotency-Key`` header on a DRF view or view method.
+
+    Successful (2xx) responses are stored and replayed for later requests
+    with the same key, user and endpoint. Other responses and exceptions
+    release the key so the client can retry. Reusing a key with different
+    request data is rejected with 422; a retry that outwaits the first
+    request gets 409.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        request = args[0] if hasattr(args[0], 'META') else args[1]
+        client_key = request.headers.get(HEADER, '').strip()
+        if not client_key:
+            return view(*args, **kwargs)
+        if len(client_key) > MAX_KEY_LENGTH:
+            return Response(
+                {'error': f'{HEADER} must be at most {MAX_KEY_LENGTH} characters.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        key = _record_key(request, client_key)
+        fingerprint = _request_fingerprint(request)
+        user = request.user if request.user.is_authenticated else None
+        try:
+            record = _claim(key, user, fingerprint)
+            while record is not None:
+                if record.fingerprint != fingerprint:
+                    return Response(
+                        {'error': f'{HEADER} was already used for a different request.'},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    )
+                if record.status_code is None:
+                    logger.debug("Request %s already in progress, waiting for it", key[:12])
+                    record = _wait_for_completion(record)
+                    if record is None:
+                        # The first request failed and released the key
+                        record = _claim(key, user, fingerprint)
+                        continue
+                return _replay(record)
+        except IdempotencyConflict:
+            return Response(
+                {'error': 'A request with this Idempotency-Key is still being processed. Retry shortly.'},
+                status=status.HTTP_409_CONFLICT,
+            )
+        except DatabaseError as e:
+            # Idempotency must not take the endpoint down with it
+            logger.warning("Idempotency record unavailable, processing request directly: %s", e)
+            return view(*args, **kwargs)
+
+        try:
+            response = view(*args, **kwargs)
+        except Exception:
+            _release(key)
+            raise
+        if 200 <= response.status_code < 300 and hasattr(response, 'data'):
+            try:
+                _store(key, response)
+            except DatabaseError as e:
+                logger.warning("Failed to store idempotent response: %s", e)
+                _release(key)
+        else:
+            _release(key)
+        return response
+
+    return wrapper
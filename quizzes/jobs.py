@@ -0,0 +1,240 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+from rest_framework import status
+
+from .models import GenerationJob, Quiz
+from .utils import generate_quiz_with_gemini
+from .document_cache import parse_documents
+from .persistence import QuestionWriter
+
+logger = logging.getLogger(__name__)
+
+# Generation runs on a small pool of background threads so gunicorn workers
+# are released as soon as the upload has been accepted.
+_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'QUIZ_GENERATION_WORKERS', 2),
+    thread_name_prefix='quiz-generation',
+)
+
+
+class GenerationError(Exception):
+    """User-facing generation failure carrying the HTTP status to report"""
+
+    def __init__(self, message, status_code=status.HTTP_400_BAD_REQUEST):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def describe_generation_error(e):
+    """Map a generation exception to a (message, http_status) pair"""
+    if isinstance(e, GenerationError):
+        return str(e), e.status_code
+    error_message = 'Failed to generate quiz. '
+    if 'Content blocked' in str(e):
+        error_message += 'The content was flagged by safety filters.'
+    elif 'SERVICE_UNAVAILABLE' in str(e) or 'No content in Gemini response' in str(e):
+        error_message += 'AI service temporarily unavailable.'
+        return error_message, status.HTTP_503_SERVICE_UNAVAILABLE
+    elif 'No text content' in str(e):
+        error_message += 'AI service returned empty response.'
+    else:
+        error_message += 'Please try again later.'
+    return error_message, status.HTTP_500_INTERNAL_SERVER_ERROR
+
+
+def create_job(user, kind, params):
+    return GenerationJob.objects.create(
+        user=user,
+        kind=kind,
+        params=params,
+        message='Queued',
+    )
+
+
+# Reported for jobs whose worker went away (restart, deploy) before they finished
+INTERRUPTED_MESSAGE = 'Quiz generation was interrupted. Please try again.'
+
+
+def fail_stale_jobs(jobs=None):
+    """Fail unfinished jobs that have not reported progress for ``GENERATION_JOB_STALE_SECONDS``.
+
+    Jobs run on threads of the worker that accepted them, so a job left
+    ``pending`` or ``running`` when that worker restarted never finishes.
+    Its partially generated quiz is deleted. Returns the number of jobs
+    marked failed.
+    """
+    stale_seconds = getattr(settings, 'GENERATION_JOB_STALE_SECONDS', 300)
+    if stale_seconds <= 0:
+        return 0
+    now = timezone.now()
+    if jobs is None:
+        jobs = GenerationJob.objects.all()
+    stale = jobs.filter(status__in=('pending', 'running'), updated_at__lt=now - timedelta(seconds=stale_seconds))
+    failed = 0
+    for job_id, quiz_id in stale.values_list('id', 'quiz_id'):
+        # Conditional on the status so a job finishing concurrently is left alone
+        updated = GenerationJob.objects.filter(id=job_id, status__in=('pending', 'running')).update(
+            status='failed',
+            error=INTERRUPTED_MESSAGE,
+            error_status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            message='Failed',
+            quiz=None,
+            finished_at=now,
+            updated_at=now,
+        )
+        if not updated:
+            continue
+        failed += 1
+        if quiz_id:
+            Quiz.objects.filter(id=quiz_id).delete()
+    return failed
+
+
+def refresh_job_status(job):
+    """Fail ``job`` if it went stale, so pollers see an outcome instead of waiting forever"""
+    if job.is_finished or not fail_stale_jobs(GenerationJob.objects.filter(id=job.id)):
+        return job
+    job.refresh_from_db()
+    return job
+
+
+def submit_job(job, runner, *args, describe_error=describe_generation_error):
+    """Queue ``runner(job, *args)`` on the background pool.
+
+    The runner returns the JSON-serialisable result payload; any exception it
+    raises marks the job as failed using ``describe_error``.
+    """
+    _executor.submit(_run_job, job.id, runner, args, describe_error)
+
+
+def _run_job(job_id, runner, args, describe_error):
+    close_old_connections()
+    job = None
+    try:
+        now = timezone.now()
+        # A job failed as stale while it sat in the queue must not start anyway
+        claimed = GenerationJob.objects.filter(id=job_id, status='pending').update(
+            status='running', started_at=now, message='Starting', updated_at=now,
+        )
+        if not claimed:
+            return
+        job = GenerationJob.objects.get(id=job_id)
+
+        result = runner(job, *args)
+
+        job.status = 'succeeded'
+        job.result = result
+        job.progress = 100
+        job.message = 'Completed'
+        job.finished_at = timezone.now()
+        job.save()
+    except Exception as e:
+        logger.exception("Generation job %s failed", job_id)
+        if job is not None:
+            message, error_status = describe_error(e)
+            job.status = 'failed'
+            job.error = message
+            job.error_status = error_status
+            job.message = 'Failed'
+            job.finished_at = timezone.now()
+            job.save()
+    finally:
+        # Threads outside the request cycle must release their own connection
+        close_old_connections()
+
+
+def run_quiz_generation(job, uploads):
+    """Parse the uploaded documents, generate questions and persist the quiz.
+
+    ``uploads`` is a list of ``(file_name, file_bytes)`` pairs read while the
+    request was still open.
+    """
+    params = job.params
+    difficulty = params['difficulty']
+    quiz_type = params['quiz_type']
+
+    job.set_progress(10, 'Parsing documents')
+    combined_text_parts = []
+    parse_errors = []
+    for name, parsed, error in parse_documents(uploads):
+        if error:
+            logger.warning("Failed to parse %s: %s", name, error)
+            parse_errors.append({'file': name, 'error': error})
+            continue
+        logger.debug("Parsed text length for %s: %s", name, len(parsed))
+        if parsed:
+            combined_text_parts.append(parsed)
+    if parse_errors and not combined_text_parts:
+        raise GenerationError('; '.join(e['error'] for e in parse_errors))
+    text = "\n\n".join(combined_text_parts)
+    logger.debug("Combined parsed text length: %s from %s file(s)", len(text), len(uploads))
+    if len(text.strip()) < 100:
+        raise GenerationError('Document content too short')
+
+    job.set_progress(30, 'Generating questions')
+    names = [name for name, _ in uploads]
+    num_questions = params['num_questions']
+    # The quiz exists from the start so questions can be saved (and shown to
+    # polling clients) as soon as each one is generated
+    quiz = Quiz.objects.create(
+        user=job.user,
+        title=params['title'],
+        difficulty=difficulty,
+        quiz_type=quiz_type,
+        time_limit=params.get('time_limit'),
+        total_questions=0,
+        source_document=names[0] if len(names) == 1 else ', '.join(names[:3]) + ("..." if len(names) > 3 else "")
+    )
+    logger.debug("Quiz created with ID: %s", quiz.id)
+    job.quiz = quiz
+    job.save(update_fields=['quiz', 'updated_at'])
+
+    def report_progress(saved):
+        job.set_progress(30 + 65 * min(saved, num_questions) // max(num_questions, 1), f'Generated {saved} of {num_questions} questions')
+
+    # Questions are written once per stream chunk (or cached/fan-out batch)
+    writer = QuestionWriter(quiz, difficulty, on_flush=report_progress)
+
+    try:
+        quiz_data = generate_quiz_with_gemini(
+            combined_text_parts, num_questions, difficulty, quiz_type,
+            use_cache=not params.get('fresh', False),
+            on_question=writer.add,
+            on_batch=writer.flush,
+        )
+        if not quiz_data or not isinstance(quiz_data, dict) or 'quiz' not in quiz_data or not writer.count:
+            logger.warning("Invalid quiz_data returned: %s", quiz_data)
+            raise GenerationError(
+                'AI service returned no usable content. Please try again later.',
+                status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+        created_questions = writer.finish()
+    except Exception:
+        quiz.delete()
+        # Detach the deleted quiz so the job can still be saved as failed
+        job.quiz = None
+        raise
+    logger.debug("Created %s questions", len(created_questions))
+
+    return {
+        "quiz_id": str(quiz.id),
+        "title": quiz.title,
+        "questions": [
+            {
+                "question_id": str(q.id),
+                "question_text": q.question_text,
+                "question_type": q.question_type,
+                "options": q.options,
+                "topic": q.topic,
+                "difficulty": q.difficulty
+            }
+            for q in created_questions
+        ],
+        "documents": params.get('documents', []),
+        "parse_errors": parse_errors,
+    }
@@ -0,0 +1,554 @@
+import hashlib
+import json
+import logging
+import random
+import re
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+
+from .rate_limit import estimate_tokens, llm_rate_limiter, rate_limit_penalty
+
+logger = logging.getLogger(__name__)
+
+# Language model backends used for quiz generation. Providers are built once
+# per process and reused, so client setup is not repeated on every request
+# or retry. Select one with the LLM_PROVIDER setting.
+
+# Stands in for the material in prompts whose document lives in a
+# provider-side cached context
+CONTEXT_PLACEHOLDER = '[The full educational material is provided in the cached context.]'
+
+
+class ContextCacheMissing(Exception):
+    """The provider no longer holds the referenced cached context"""
+
+
+class LLMProvider:
+    """Interface every backend implements.
+
+    ``response_schema`` asks for JSON output constrained to that schema;
+    backends without ``supports_response_schema`` ignore it and rely on the
+    prompt alone. ``cached_context`` is a handle from
+    ``create_context_cache`` whose text the prompt refers to; backends raise
+    ``ContextCacheMissing`` once it is gone.
+    """
+    name = ''
+    model_name = ''
+    supports_response_schema = False
+    supports_context_cache = False
+
+    def generate(self, prompt, temperature=0.5, max_output_tokens=4096, system_prompt=None, response_schema=None, cached_context=None):
+        """Return the raw text completion for ``prompt``"""
+        raise NotImplementedError
+
+    def generate_stream(self, prompt, temperature=0.5, max_output_tokens=4096, system_prompt=None, response_schema=None, cached_context=None):
+        """Yield the completion in chunks as the backend produces it"""
+        yield self.generate(prompt, temperature, max_output_tokens, system_prompt, response_schema, cached_context)
+
+    def create_context_cache(self, text, ttl_seconds):
+        """Upload ``text`` as a cached context and return its handle"""
+        raise NotImplementedError
+
+
+class GeminiProvider(LLMProvider):
+    name = 'gemini'
+    supports_response_schema = True
+    supports_context_cache = True
+
+    def __init__(self, api_key, model_name='gemini-2.5-pro'):
+        if not api_key:
+            raise ValueError("Google Gemini API key not configured in environment")
+        import google.generativeai as genai
+        self._genai = genai
+        # configure() sets module-wide state, so it only needs to happen once
+        genai.configure(api_key=api_key)
+        self.model_name = model_name
+        self._models = {}
+        self._cached_models = {}
+        self._lock = threading.Lock()
+
+    def _get_model(self, system_prompt, cached_context=None):
+        if cached_context:
+            return self._get_cached_model(cached_context)
+        with self._lock:
+            model = self._models.get(system_prompt)
+            if model is None:
+                if system_prompt:
+                    model = self._genai.GenerativeModel(self.model_name, system_instruction=system_prompt)
+                else:
+                    model = self._genai.GenerativeModel(self.model_name)
+                self._models[system_prompt] = model
+            return model
+
+    def _get_cached_model(self, cached_context):
+        # System instructions would have to be part of the cached content
+        from google.api_core.exceptions import NotFound
+        with self._lock:
+            model = self._cached_models.get(cached_context)
+        if model is None:
+            try:
+                model = self._genai.GenerativeModel.from_cached_content(cached_content=cached_context)
+            except NotFound as e:
+                raise ContextCacheMissing(str(e))
+            with self._lock:
+                self._cached_models[cached_context] = model
+        return model
+
+    def create_context_cache(self, text, ttl_seconds):
+        cache = self._genai.caching.CachedContent.create(
+            model=self.model_name,
+            display_name='questify-document',
+            contents=[text],
+            ttl=timedelta(seconds=ttl_seconds),
+        )
+        return cache.name
+
+    def _generation_config(self, temperature, max_output_tokens, response_schema):
+        config = {'temperature': temperature, 'max_output_tokens': max_output_tokens}
+        if response_schema is not None and self.supports_response_schema:
+            config['response_mime_type'] = 'application/json'
+            config['response_schema'] = response_schema
+        return self._genai.types.GenerationConfig(**config)
+
+    def _generate_content(self, prompt, temperature, max_output_tokens, system_prompt, response_schema, cached_context=None, stream=False):
+        from google.api_core.exceptions import InvalidArgument, NotFound
+        model = self._get_model(system_prompt, cached_context)
+        try:
+            return model.generate_content(
+                prompt,
+                generation_config=self._generation_config(temperature, max_output_tokens, response_schema),
+                stream=stream,
+            )
+        except NotFound as e:
+            if not cached_context:
+                raise
+            # The cached content expired or was deleted
+            with self._lock:
+                self._cached_models.pop(cached_context, None)
+            raise ContextCacheMissing(str(e))
+        except InvalidArgument as e:
+            message = str(e).lower()
+            if response_schema is None or not self.supports_response_schema or (
+                'schema' not in message and 'mime' not in message
+            ):
+                raise
+            # Models without controlled generation reject the schema; stop
+            # sending it and fall back to prompt-only output
+            logger.warning("%s rejected response schema, using prompt-only output: %s", self.model_name, e)
+            self.supports_response_schema = False
+            return model.generate_content(
+                prompt,
+                generation_config=self._generation_config(temperature, max_output_tokens, None),
+                stream=stream,
+            )
+
+    def generate(self, prompt, temperature=0.5, max_output_tokens=4096, system_prompt=None, response_schema=None, cached_context=None):
+        response = self._generate_content(
+            prompt, temperature, max_output_tokens, system_prompt, response_schema, cached_context
+        )
+        return response.text
+
+    def generate_stream(self, prompt, temperature=0.5, max_output_tokens=4096, system_prompt=None, response_schema=None, cached_context=None):
+        response = self._generate_content(
+            prompt, temperature, max_output_tokens, system_prompt, response_schema, cached_context, stream=True
+        )
+        for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunks without text parts (e.g. only a finish reason)
+                continue
+            if text:
+                yield text
+
+
+class OpenAIProvider(LLMProvider):
+    # The legacy ChatCompletion API used here has no schema-constrained mode
+    name = 'openai'
+
+    def __init__(self, api_key, model_name='gpt-4'):
+        try:
+            import openai
+        except ImportError:
+            raise ValueError("OpenAI support not available. Please install openai.")
+        if not api_key:
+            raise ValueError("OpenAI API key not configured in environment")
+        openai.api_key = api_key
+        self._openai = openai
+        self.model_name = model_name
+
+    def generate(self, prompt, temperature=0.5, max_output_tokens=4096, system_prompt=None, response_schema=None, cached_context=None):
+        messages = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        messages.append({"role": "user", "content": prompt})
+        response = self._openai.ChatCompletion.create(
+            model=self.model_name,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_output_tokens,
+        )
+        return response.choices[0].message.content
+
+    def generate_stream(self, prompt, temperature=0.5, max_output_tokens=4096, system_prompt=None, response_schema=None, cached_context=None):
+        messages = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        messages.append({"role": "user", "content": prompt})
+        response = self._openai.ChatCompletion.create(
+            model=self.model_name,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_output_tokens,
+            stream=True,
+        )
+        for chunk in response:
+            text = chunk.choices[0].delta.get('content')
+            if text:
+                yield text
+
+
+class StubProvider(LLMProvider):
+    """Offline backend returning schema-valid quizzes built from the prompt.
+
+    Output depends only on the prompt, so repeated runs are reproducible.
+    Without a ``response_schema`` the JSON comes wrapped in a markdown fence
+    the way chat models tend to answer. ``latency_ms`` is slept before every
+    response (spread over the chunks when streaming) and ``failure_rate`` of calls raise a SERVICE_UNAVAILABLE
+    error drawn from a ``seed``-ed sequence, which makes load tests and
+    benchmarks repeatable without a live API.
+    """
+    name = 'stub'
+    model_name = 'stub-quiz-1'
+    supports_response_schema = True
+    supports_context_cache = True
+
+    TYPE_MARKERS = [
+        ('multiple choice questions with exactly 4 options', 'multiple_choice'),
+        ('true/false questions', 'true_false'),
+        ('fill-in-the-blank questions using ___', 'fill_in_blank'),
+        ('short answer questions', 'descriptive'),
+    ]
+    MATERIAL_MARKERS = ['Educational material to base questions on:', 'Base the questions on this content:']
+    EXCLUDE_MARKER = 'These questions already exist; do not repeat them:'
+    DIGEST_MARKER = 'Condense the educational material below into a compact study outline'
+    _DIGEST_BUDGET_RE = re.compile(r'at most (\d+) characters')
+    _OUTLINE_MARKUP_RE = re.compile(r'^(## Topic: .*|- )', re.MULTILINE)
+    _PART_RE = re.compile(r'about part (\d+) of (\d+) of the material')
+    _COUNT_RE = re.compile(r'exactly (\d+)|generate (\d+)')
+    _DIFFICULTY_RE = re.compile(r'"difficulty": "(easy|medium|hard)"')
+    _SENTENCE_RE = re.compile(r'[^.!?]{20,}[.!?]')
+    _WORD_RE = re.compile(r'[A-Za-z]{5,}')
+
+    def __init__(self, latency_ms=0, failure_rate=0.0, seed=0, model_name=None):
+        if model_name:
+            self.model_name = model_name
+        self.latency_ms = latency_ms
+        self.failure_rate = failure_rate
+        self._failures = random.Random(seed)
+        self._lock = threading.Lock()
+        # Simulated provider-side caches: handle -> (text, expires_at monotonic)
+        self._contexts = {}
+
+    STREAM_CHUNK_CHARS = 120
+
+    def generate(self, prompt, temperature=0.5, max_output_tokens=4096, system_prompt=None, response_schema=None, cached_context=None):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        self._maybe_fail()
+        prompt = self._with_context(prompt, cached_context)
+        if self.DIGEST_MARKER in prompt:
+            return self.build_digest(prompt)
+        return self._render(self.build_quiz(prompt, response_schema), response_schema)
+
+    def generate_stream(self, prompt, temperature=0.5, max_output_tokens=4096, system_prompt=None, response_schema=None, cached_context=None):
+        # The simulated latency is spread over the chunks like token output
+        self._maybe_fail()
+        prompt = self._with_context(prompt, cached_context)
+        payload = self._render(self.build_quiz(prompt, response_schema), response_schema, indent=2)
+        chunks = [payload[i:i + self.STREAM_CHUNK_CHARS] for i in range(0, len(payload), self.STREAM_CHUNK_CHARS)]
+        delay = self.latency_ms / 1000 / len(chunks)
+        for chunk in chunks:
+            if delay:
+                time.sleep(delay)
+            yield chunk
+
+    def create_context_cache(self, text, ttl_seconds):
+        handle = f"cachedContents/stub-{hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]}-{time.monotonic_ns()}"
+        with self._lock:
+            self._contexts[handle] = (text, time.monotonic() + ttl_seconds)
+        return handle
+
+    def drop_context_cache(self, handle):
+        """Forget a simulated cache, as the provider does when it expires early"""
+        with self._lock:
+            self._contexts.pop(handle, None)
+
+    def _with_context(self, prompt, cached_context):
+        if not cached_context:
+            return prompt
+        with self._lock:
+            text, expires_at = self._contexts.get(cached_context, (None, 0))
+        if text is None or expires_at <= time.monotonic():
+            raise ContextCacheMissing(f"404 CachedContent not found: {cached_context}")
+        return prompt.replace(CONTEXT_PLACEHOLDER, text)
+
+    @staticmethod
+    def _render(quiz, response_schema, indent=None):
+        payload = json.dumps(quiz, indent=indent)
+        return payload if response_schema is not None else f"```json\n{payload}\n```"
+
+    def _maybe_fail(self):
+        if not self.failure_rate:
+            return
+        with self._lock:
+            fail = self._failures.random() < self.failure_rate
+        if fail:
+            raise RuntimeError("Stub provider injected failure [SERVICE_UNAVAILABLE]")
+
+    def build_digest(self, prompt):
+        """Outline of every n-th sentence of the material, within the requested size"""
+        material = prompt.split('Educational material:', 1)[-1]
+        budget_match = self._DIGEST_BUDGET_RE.search(prompt)
+        budget = int(budget_match.group(1)) if budget_match else 1500
+        sentences = [s.strip() for s in self._SENTENCE_RE.findall(material)]
+        step = max(1, -(-sum(len(s) + 3 for s in sentences) // budget))
+        kept = sentences[::step]
+        topics = []
+        for start in range(0, len(kept), 4):
+            group = kept[start:start + 4]
+            words = self._WORD_RE.findall(' '.join(group))
+            topic = max(sorted(set(words)), key=words.count).title() if words else 'General'
+            topics.append(f"## Topic: {topic}\n" + '\n'.join(f"- {s}" for s in group))
+        return '\n\n'.join(topics)
+
+    def build_quiz(self, prompt, response_schema=None):
+        match = self._COUNT_RE.search(prompt)
+        count = int(next(g for g in match.groups() if g)) if match else 5
+        difficulty_match = self._DIFFICULTY_RE.search(prompt)
+        difficulty = difficulty_match.group(1) if difficulty_match else 'medium'
+        if response_schema is not None:
+            item = response_schema['properties']['quiz']['items']['properties']
+            difficulty = item['difficulty'].get('enum', [difficulty])[0]
+        types = [t for marker, t in self.TYPE_MARKERS if marker in prompt] or ['multiple_choice']
+
+        material = prompt
+        for marker in self.MATERIAL_MARKERS:
+            if marker in prompt:
+                material = prompt.split(marker, 1)[1]
+                break
+        material = self._OUTLINE_MARKUP_RE.sub('', material.split('\nRemember:', 1)[0])
+        part_match = self._PART_RE.search(prompt)
+        if part_match:
+            part, parts = int(part_match.group(1)), int(part_match.group(2))
+            size = -(-len(material) // parts)
+            material = material[(part - 1) * size:part * size]
+        # Continue after the questions a top-up request asks to skip
+        offset = prompt.split(self.EXCLUDE_MARKER, 1)[1].count('\n- ') if self.EXCLUDE_MARKER in prompt else 0
+        sentences = [s.strip() for s in self._SENTENCE_RE.findall(material)] or ['The material covers a single topic.']
+        words = sorted(set(self._WORD_RE.findall(material))) or ['concept', 'process', 'structure', 'function']
+
+        rng = random.Random(hashlib.sha256(prompt.encode('utf-8')).hexdigest())
+        questions = []
+        for i in range(count):
+            sentence = sentences[(i + offset) % len(sentences)]
+            question_type = types[(i + offset) % len(types)]
+            answer = rng.choice(words)
+            question = {
+                'question_text': f"Question {i + offset + 1}: according to the material, what does this describe? {sentence}",
+                'question_type': question_type,
+                'options': [],
+                'correct_answer': answer,
+                'explanation': sentence,
+                'topic': rng.choice(words).title(),
+                'difficulty': difficulty,
+            }
+            if question_type == 'multiple_choice':
+                distractors = [w for w in words if w != answer]
+                rng.shuffle(distractors)
+                options = [answer] + distractors[:3]
+                while len(options) < 4:
+                    options.append(f"Option {len(options) + 1}")
+                rng.shuffle(options)
+                question['options'] = options
+            elif question_type == 'true_false':
+                question['question_text'] = f"True or false: {sentence}"
+                question['options'] = ['True', 'False']
+                question['correct_answer'] = 'True'
+            elif question_type == 'fill_in_blank':
+                blank_word = self._WORD_RE.search(sentence)
+                if blank_word:
+                    question['question_text'] = sentence.replace(blank_word.group(0), '___', 1)
+                    question['correct_answer'] = blank_word.group(0)
+                else:
+                    question['question_text'] = f"{sentence} ___"
+            questions.append(question)
+        return {'quiz': questions}
+
+
+class RateLimitedProvider(LLMProvider):
+    """Routes another provider's calls through the shared rate limiter"""
+
+    def __init__(self, inner, limiter):
+        self.inner = inner
+        self.limiter = limiter
+        self.name = inner.name
+        self.model_name = inner.model_name
+
+    @property
+    def supports_response_schema(self):
+        return self.inner.supports_response_schema
+
+    @property
+    def supports_context_cache(self):
+        return self.inner.supports_context_cache
+
+    def create_context_cache(self, text, ttl_seconds):
+        return self.inner.create_context_cache(text, ttl_seconds)
+
+    def generate(self, prompt, temperature=0.5, max_output_tokens=4096, system_prompt=None, response_schema=None, cached_context=None):
+        with self.limiter.limit(self.model_name, estimate_tokens(prompt, max_output_tokens)):
+            try:
+                return self.inner.generate(
+                    prompt, temperature, max_output_tokens, system_prompt, response_schema, cached_context
+                )
+            except Exception as e:
+                self._back_off(e)
+                raise
+
+    def generate_stream(self, prompt, temperature=0.5, max_output_tokens=4096, system_prompt=None, response_schema=None, cached_context=None):
+        # The lease is held until the stream is exhausted or abandoned
+        with self.limiter.limit(self.model_name, estimate_tokens(prompt, max_output_tokens)):
+            try:
+                yield from self.inner.generate_stream(
+                    prompt, temperature, max_output_tokens, system_prompt, response_schema, cached_context
+                )
+            except Exception as e:
+                self._back_off(e)
+                raise
+
+    def _back_off(self, error):
+        seconds = rate_limit_penalty(error)
+        if seconds:
+            logger.warning("%s rate limited by provider, pausing all workers for %ss", self.model_name, seconds)
+            self.limiter.block(self.model_name, seconds)
+
+
+class ContextCachedProvider(LLMProvider):
+    """Runs prompts against a provider-side cached copy of the document.
+
+    Prompts carry ``CONTEXT_PLACEHOLDER`` where the material would go. Once
+    the provider reports the cache gone (or with no ``handle``, e.g. for a
+    different model), the placeholder is replaced by ``inline_text`` and
+    ``on_missing(handle)`` is called so the handle is not handed out again.
+    """
+
+    def __init__(self, inner, handle, inline_text, on_missing=None):
+        self.inner = inner
+        self.handle = handle
+        self.inline_text = inline_text
+        self.on_missing = on_missing
+        self.name = inner.name
+        self.model_name = inner.model_name
+
+    @property
+    def supports_response_schema(self):
+        return self.inner.supports_response_schema
+
+    def _inline(self, prompt):
+        return prompt.replace(CONTEXT_PLACEHOLDER, self.inline_text)
+
+    def _drop_handle(self, error):
+        handle, self.handle = self.handle, None
+        if handle is None:
+            return
+        logger.warning("Cached context %s gone, sending text inline: %s", handle, error)
+        if self.on_missing:
+            self.on_missing(handle)
+
+    def generate(self, prompt, temperature=0.5, max_output_tokens=4096, system_prompt=None, response_schema=None, cached_context=None):
+        if self.handle:
+            try:
+                return self.inner.generate(
+                    prompt, temperature, max_output_tokens, system_prompt, response_schema, self.handle
+                )
+            except ContextCacheMissing as e:
+                self._drop_handle(e)
+        return self.inner.generate(self._inline(prompt), temperature, max_output_tokens, system_prompt, response_schema)
+
+    def generate_stream(self, prompt, temperature=0.5, max_output_tokens=4096, system_prompt=None, response_schema=None, cached_context=None):
+        if self.handle:
+            stream = self.inner.generate_stream(
+                prompt, temperature, max_output_tokens, system_prompt, response_schema, self.handle
+            )
+            try:
+                # A missing cache fails before the first chunk
+                first = next(stream, None)
+            except ContextCacheMissing as e:
+                self._drop_handle(e)
+            else:
+                if first is not None:
+                    yield first
+                yield from stream
+                return
+        yield from self.inner.generate_stream(
+            self._inline(prompt), temperature, max_output_tokens, system_prompt, response_schema
+        )
+
+
+_providers = {}
+_providers_lock = threading.Lock()
+
+
+def _build_provider(name, model_name=None):
+    if name == 'gemini':
+        return GeminiProvider(
+            settings.GOOGLE_GEMINI_API_KEY,
+            model_name or getattr(settings, 'GEMINI_MODEL_NAME', 'gemini-2.5-pro'),
+        )
+    if name == 'openai':
+        return OpenAIProvider(
+            getattr(settings, 'OPENAI_API_KEY', ''),
+            model_name or getattr(settings, 'OPENAI_MODEL_NAME', 'gpt-4'),
+        )
+    if name == 'stub':
+        return StubProvider(
+            latency_ms=getattr(settings, 'STUB_LLM_LATENCY_MS', 0),
+            failure_rate=getattr(settings, 'STUB_LLM_FAILURE_RATE', 0.0),
+            seed=getattr(settings, 'STUB_LLM_SEED', 0),
+            model_name=model_name,
+        )
+    raise ValueError(f"Unknown LLM provider: {name}")
+
+
+def get_provider(name=None, model_name=None):
+    """Return the process-wide provider instance for ``name`` (default LLM_PROVIDER).
+
+    ``model_name`` overrides the provider's configured model.
+    """
+    name = (name or getattr(settings, 'LLM_PROVIDER', 'gemini')).lower()
+    with _providers_lock:
+        provider = _providers.get((name, model_name))
+        if provider is None:
+            provider = _build_provider(name, model_name)
+            if llm_rate_limiter.enabled:
+                provider = RateLimitedProvider(provider, llm_rate_limiter)
+            _providers[(name, model_name)] = provider
+        return provider
+
+
+def get_fallback_provider():
+    """The faster model hedged against the primary, or None if LLM_FALLBACK_PROVIDER is unset"""
+    name = getattr(settings, 'LLM_FALLBACK_PROVIDER', '')
+    if not name:
+        return None
+    return get_provider(name, getattr(settings, 'LLM_FALLBACK_MODEL_NAME', '') or None)
+
+
+def reset_providers():
+    """Drop cached providers so changed settings take effect"""
+    with _providers_lock:
+        _providers.clear()
@@ -0,0 +1,80 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from quizzes.answer_facts import build_answers
+from quizzes.answer_key import AnswerKey
+from quizzes.models import AttemptAnswer, QuizAttempt
+
+
+def legacy_answers(attempt, graded):
+    """Fact rows for answers whose question is gone, from the attempt's stored ``detailed_results``"""
+    details = {str(result.get('question_id')): result for result in attempt.detailed_results or []}
+    answers = []
+    for question_id, is_correct in graded:
+        result = details.get(question_id)
+        if result is None:
+            continue
+        answers.append(AttemptAnswer(
+            attempt=attempt,
+            question=None,
+            user_id=attempt.user_id,
+            topic=result.get('topic') or 'General',
+            difficulty=result.get('difficulty') or 'medium',
+            question_type=result.get('question_type') or 'multiple_choice',
+            is_correct=is_correct,
+            answered_at=attempt.completed_at or attempt.created_at,
+        ))
+    return answers
+
+
+class Command(BaseCommand):
+    help = (
+        "Create AttemptAnswer rows for completed attempts that have none. Migration 0016 backfills "
+        "existing attempts on deploy; this repairs any missed since, e.g. before rebuild_quiz_analytics."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Attempts per batch')
+        parser.add_argument('--rebuild-analytics', action='store_true', help='Rebuild analytics of the users whose attempts were backfilled')
+
+    def handle(self, *args, **options):
+        # Collect ids up front; the filter changes as rows are written
+        pending = list(
+            QuizAttempt.objects.filter(is_completed=True, answers__isnull=True)
+            .order_by('completed_at').values_list('pk', flat=True)
+        )
+        batch_size = max(options['batch_size'], 1)
+        backfilled = 0
+        created = 0
+        users = set()
+        # Compiled from the database so rows never point at a deleted question
+        keys = {}
+        start = time.perf_counter()
+        for offset in range(0, len(pending), batch_size):
+            attempts = QuizAttempt.objects.filter(pk__in=pending[offset:offset + batch_size]).select_related('quiz')
+            rows = []
+            for attempt in attempts:
+                graded = [
+                    (str(result.get('question_id')), bool(result.get('is_correct', False)))
+                    for result in attempt.question_results or []
+                ]
+                answer_key = keys.get(attempt.quiz_id)
+                if answer_key is None:
+                    answer_key = keys[attempt.quiz_id] = AnswerKey.compile(attempt.quiz)
+                known = [(question_id, is_correct) for question_id, is_correct in graded if question_id in answer_key.entries]
+                deleted = [(question_id, is_correct) for question_id, is_correct in graded if question_id not in answer_key.entries]
+                answers = build_answers(attempt, answer_key, known) + legacy_answers(attempt, deleted)
+                if answers:
+                    rows.extend(answers)
+                    backfilled += 1
+                    users.add(attempt.user_id)
+            created += len(AttemptAnswer.objects.bulk_create(rows, ignore_conflicts=True))
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f"Backfilled {created} answer(s) for {backfilled} attempt(s) in {elapsed:.2f}s")
+
+        if options['rebuild_analytics'] and users:
+            emails = get_user_model().objects.filter(pk__in=users).values_list('email', flat=True)
+            call_command('rebuild_quiz_analytics', *[f'--user={email}' for email in emails], stdout=self.stdout)
@@ -0,0 +1,72 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from quizzes.utils import clean_text
+
+SIZES = [10 * 1024, 100 * 1024, 1024 * 1024, 10 * 1024 * 1024]
+
+WORDS = (
+    "cell membrane protein energy photosynthesis chlorophyll mitochondria respiration "
+    "glucose enzyme reaction substrate molecule diffusion osmosis gradient transport "
+    "nucleus chromosome replication transcription translation ribosome amino acid"
+).split()
+
+NOISE_LINES = ["12", "Page 3 of 40", "•", "Lecture 4", "© 2024 University", "Slide 7"]
+
+
+def make_document(size, seed=0):
+    """Synthetic PDF-style text: wrapped lines, noise lines and odd characters"""
+    rng = random.Random(seed)
+    lines = []
+    total = 0
+    while total < size:
+        if rng.random() < 0.1:
+            line = rng.choice(NOISE_LINES)
+        else:
+            words = [rng.choice(WORDS) for _ in range(rng.randint(6, 14))]
+            line = " ".join(words)
+            if rng.random() < 0.3:
+                line = f"“{line}” — {rng.choice(WORDS)}!!"
+            else:
+                line += "."
+            if rng.random() < 0.2:
+                line = "\t" + line.replace(" ", "  ", 2) + " → #tag"
+        lines.append(line)
+        total += len(line) + 1
+    return "\n".join(lines)[:size]
+
+
+class Command(BaseCommand):
+    help = "Benchmark clean_text on synthetic documents from 10 KB to 10 MB"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per size; the fastest is reported')
+        parser.add_argument('--max-size', type=int, default=SIZES[-1], help='Largest input size in bytes')
+        parser.add_argument(
+            '--min-throughput', type=float, default=0.0,
+            help='Fail if any size is slower than this many MB/s',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'size':>10} {'best ms':>10} {'MB/s':>8} {'out chars':>10}")
+        slowest = None
+        for size in SIZES:
+            if size > options['max_size']:
+                break
+            text = make_document(size)
+            best = None
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                cleaned = clean_text(text, max_chars=None)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            throughput = size / (1024 * 1024) / best
+            slowest = throughput if slowest is None else min(slowest, throughput)
+            self.stdout.write(f"{size:>10} {best * 1000:>10.2f} {throughput:>8.1f} {len(cleaned):>10}")
+
+        if options['min_throughput'] and slowest is not None and slowest < options['min_throughput']:
+            raise CommandError(
+                f"clean_text throughput {slowest:.1f} MB/s is below {options['min_throughput']} MB/s"
+            )
@@ -0,0 +1,66 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from quizzes.llm import reset_providers
+from quizzes.management.commands.bench_clean_text import make_document
+from quizzes.utils import generate_quiz_with_gemini
+
+
+class Command(BaseCommand):
+    help = "Measure generate_quiz_with_gemini overhead end to end against the offline stub provider"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20)
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--questions', type=int, default=10)
+        parser.add_argument('--doc-size', type=int, default=200 * 1024, help='Document size in bytes')
+        parser.add_argument('--latency-ms', type=int, default=0, help='Simulated model latency per call')
+        parser.add_argument('--failure-rate', type=float, default=0.0, help='Fraction of calls that fail')
+        parser.add_argument('--use-cache', action='store_true', help='Allow response cache hits')
+        parser.add_argument('--same-document', action='store_true',
+                            help='Send every request the same document, as follow-up generations do')
+
+    def handle(self, *args, **options):
+        settings.LLM_PROVIDER = 'stub'
+        settings.STUB_LLM_LATENCY_MS = options['latency_ms']
+        settings.STUB_LLM_FAILURE_RATE = options['failure_rate']
+        reset_providers()
+
+        # One distinct document per request so the response cache is not hit
+        # unless --use-cache is given
+        if options['same_document']:
+            documents = [make_document(options['doc_size'], seed=0)] * options['requests']
+        else:
+            documents = [make_document(options['doc_size'], seed=i) for i in range(options['requests'])]
+
+        def run(document):
+            start = time.perf_counter()
+            try:
+                generate_quiz_with_gemini(
+                    document, options['questions'], 'medium', ['multiple_choice'],
+                    use_cache=options['use_cache'],
+                )
+                ok = True
+            except Exception:
+                ok = False
+            return time.perf_counter() - start, ok
+
+        wall_start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            results = list(pool.map(run, documents))
+        wall = time.perf_counter() - wall_start
+
+        latencies = sorted(elapsed for elapsed, _ in results)
+        failures = sum(1 for _, ok in results if not ok)
+        p50 = statistics.median(latencies)
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        overhead = statistics.mean(latencies) - options['latency_ms'] / 1000
+
+        self.stdout.write(f"requests: {len(results)}  failures: {failures}  wall: {wall:.2f}s")
+        self.stdout.write(f"p50: {p50 * 1000:.1f} ms  p95: {p95 * 1000:.1f} ms")
+        self.stdout.write(f"mean overhead beyond simulated latency: {overhead * 1000:.1f} ms")
+        self.stdout.write(f"throughput: {len(results) / wall:.1f} req/s")
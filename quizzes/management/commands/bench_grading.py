@@ -0,0 +1,88 @@
+import random
+import time
+from collections import OrderedDict
+
+from django.core.management.base import BaseCommand, CommandError
+
+from quizzes.grading import compile_matcher, grade_sheet
+
+ANSWERS = [
+    "mitochondria", "photosynthesis", "chlorophyll", "ribosome", "osmosis",
+    "diffusion", "enzyme", "glucose", "nucleus", "respiration",
+]
+
+
+def make_quiz(num_questions, rng):
+    """Mixed question types with their correct answers, as stored on ``Question``"""
+    questions = []
+    for i in range(num_questions):
+        kind = ('multiple_choice', 'true_false', 'fill_in_blank')[i % 3]
+        if kind == 'multiple_choice':
+            options = rng.sample(ANSWERS, 4)
+            questions.append((str(i), kind, rng.choice(options), options))
+        elif kind == 'true_false':
+            questions.append((str(i), kind, rng.choice(['True', 'False']), ['True', 'False']))
+        else:
+            questions.append((str(i), kind, rng.choice(ANSWERS), []))
+    return questions
+
+
+def make_sheet(questions, rng):
+    """Answers a student might give: right, wrong, case and spacing noise, typos and blanks"""
+    sheet = {}
+    for question_id, kind, correct, options in questions:
+        roll = rng.random()
+        if roll < 0.1:
+            continue
+        if roll < 0.5:
+            answer = correct
+        elif roll < 0.7:
+            answer = f"  {correct.upper()} "
+        elif roll < 0.8 and kind == 'fill_in_blank':
+            answer = correct[:-1] + 'x'
+        else:
+            answer = rng.choice(options or ANSWERS)
+        sheet[question_id] = answer
+    return sheet
+
+
+class Command(BaseCommand):
+    help = "Benchmark grading whole answer sheets with compiled matchers"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questions', type=int, default=20, help='Questions per quiz')
+        parser.add_argument('--sheets', type=int, default=20000, help='Answer sheets to grade')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--min-sheets-per-second', type=float, default=0.0,
+            help='Fail if grading is slower than this many sheets per second',
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        questions = make_quiz(options['questions'], rng)
+        sheets = [make_sheet(questions, rng) for _ in range(min(options['sheets'], 1000))]
+
+        start = time.perf_counter()
+        matchers = OrderedDict(
+            (question_id, compile_matcher(kind, correct, choices))
+            for question_id, kind, correct, choices in questions
+        )
+        compile_ms = (time.perf_counter() - start) * 1000
+
+        correct = 0
+        start = time.perf_counter()
+        for i in range(options['sheets']):
+            score, _ = grade_sheet(matchers, sheets[i % len(sheets)])
+            correct += score
+        elapsed = time.perf_counter() - start
+
+        rate = options['sheets'] / elapsed if elapsed else float('inf')
+        answered = options['sheets'] * options['questions']
+        self.stdout.write(f"Compiled {len(matchers)} matchers in {compile_ms:.2f} ms")
+        self.stdout.write(
+            f"Graded {options['sheets']} sheets of {options['questions']} questions in {elapsed * 1000:.1f} ms: "
+            f"{rate:,.0f} sheets/s, {correct / answered * 100:.1f}% correct"
+        )
+        if options['min_sheets_per_second'] and rate < options['min_sheets_per_second']:
+            raise CommandError(f"Grading ran at {rate:,.0f} sheets/s, below {options['min_sheets_per_second']:,.0f}")
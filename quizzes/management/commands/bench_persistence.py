@@ -0,0 +1,78 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from quizzes.models import Question, Quiz
+from quizzes.persistence import QuestionWriter, create_quiz_with_questions
+
+SIZES = [5, 20, 100]
+
+
+def make_questions(count):
+    return [
+        {
+            'question_text': f"Which organelle performs step {i} of cellular respiration?",
+            'question_type': 'multiple_choice',
+            'options': ['Mitochondria', 'Nucleus', 'Ribosome', 'Golgi apparatus'],
+            'correct_answer': 'Mitochondria',
+            'explanation': 'Respiration happens in the mitochondria.',
+            'topic': 'Cells',
+            'difficulty': 'medium',
+        }
+        for i in range(count)
+    ]
+
+
+def per_row(user, questions_data):
+    """The previous write path: the quiz, then one INSERT per question"""
+    quiz = Quiz.objects.create(user=user, title='Benchmark', total_questions=len(questions_data))
+    for i, data in enumerate(questions_data):
+        Question.objects.create(quiz=quiz, order=i, **data)
+
+
+def bulk(user, questions_data):
+    create_quiz_with_questions(questions_data, user=user, title='Benchmark')
+
+
+def job_writer(user, questions_data):
+    """A generation job receiving every question at once (cache hit or fan-out)"""
+    quiz = Quiz.objects.create(user=user, title='Benchmark', total_questions=0)
+    writer = QuestionWriter(quiz)
+    for i, data in enumerate(questions_data):
+        writer.add(data, i)
+    writer.finish()
+
+
+STRATEGIES = [('per-row', per_row), ('bulk', bulk), ('job writer', job_writer)]
+
+
+class Command(BaseCommand):
+    help = "Count database round trips and time for saving 5, 20 and 100-question quizzes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per size; the fastest is reported')
+        parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help='Question counts to benchmark')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Database: {connection.vendor}")
+        self.stdout.write(f"{'questions':>9} {'strategy':>12} {'queries':>8} {'best ms':>8}")
+        # Everything is rolled back so the benchmark leaves no rows behind
+        with transaction.atomic():
+            user = get_user_model().objects.create_user(email='bench-persistence@example.com', password=None)
+            for size in options['sizes']:
+                questions_data = make_questions(size)
+                for name, strategy in STRATEGIES:
+                    best = None
+                    queries = 0
+                    for _ in range(options['repeat']):
+                        with CaptureQueriesContext(connection) as captured:
+                            start = time.perf_counter()
+                            strategy(user, questions_data)
+                            elapsed = time.perf_counter() - start
+                        queries = len(captured)
+                        best = elapsed if best is None else min(best, elapsed)
+                    self.stdout.write(f"{size:>9} {name:>12} {queries:>8} {best * 1000:>8.1f}")
+            transaction.set_rollback(True)
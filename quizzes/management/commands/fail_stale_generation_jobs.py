@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from quizzes.jobs import fail_stale_jobs
+
+
+class Command(BaseCommand):
+    help = "Fail generation jobs left unfinished by a restarted worker and delete their partial quizzes"
+
+    def handle(self, *args, **options):
+        failed = fail_stale_jobs()
+        self.stdout.write(f"Failed {failed} stale generation job(s)")
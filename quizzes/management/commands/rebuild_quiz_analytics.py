@@ -0,0 +1,36 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from quizzes.models import UserQuizAnalytics
+
+
+class Command(BaseCommand):
+    help = "Rebuild UserQuizAnalytics from completed attempts, repairing drifted running totals"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', default=[], help='Email of a user to rebuild (repeatable); default is every user with attempts')
+        parser.add_argument('--stale-only', action='store_true', help='Only rebuild rows without current running totals')
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.all()
+        if options['user']:
+            users = users.filter(email__in=options['user'])
+            missing = set(options['user']) - set(users.values_list('email', flat=True))
+            if missing:
+                raise CommandError(f"Unknown user(s): {', '.join(sorted(missing))}")
+        else:
+            users = users.filter(quiz_attempts__is_completed=True).distinct()
+
+        rebuilt = 0
+        skipped = 0
+        start = time.perf_counter()
+        for user in users.iterator():
+            _, done = UserQuizAnalytics.rebuild(user.pk, stale_only=options['stale_only'])
+            if done:
+                rebuilt += 1
+            else:
+                skipped += 1
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f"Rebuilt analytics for {rebuilt} user(s) in {elapsed:.2f}s ({skipped} already current)")
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-17 07:21
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0004_generationjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ParsedDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64)),
+                ('file_type', models.CharField(max_length=10)),
+                ('text', models.TextField(blank=True)),
+                ('byte_size', models.PositiveIntegerField(default=0)),
+                ('hit_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['last_used_at'], name='quizzes_par_last_us_d86008_idx')],
+                'unique_together': {('content_hash', 'file_type')},
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-17 07:27
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0005_parseddocument'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CachedQuizResponse',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cache_key', models.CharField(max_length=64, unique=True)),
+                ('model_name', models.CharField(max_length=100)),
+                ('prompt_version', models.PositiveIntegerField()),
+                ('quiz_data', models.JSONField()),
+                ('hit_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField()),
+                ('last_used_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['expires_at'], name='quizzes_cac_expires_f5a663_idx'), models.Index(fields=['last_used_at'], name='quizzes_cac_last_us_dd2d16_idx')],
+            },
+        ),
+    ]
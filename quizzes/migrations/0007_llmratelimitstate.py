@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-17 07:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0006_cachedquizresponse'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LLMRateLimitState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_name', models.CharField(max_length=100, unique=True)),
+                ('request_allowance', models.FloatField(default=0)),
+                ('token_allowance', models.FloatField(default=0)),
+                ('refilled_at', models.FloatField(default=0)),
+                ('blocked_until', models.FloatField(default=0)),
+                ('leases', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
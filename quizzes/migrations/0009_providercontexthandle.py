@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-17 08:01
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0008_documentdigest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProviderContextHandle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64)),
+                ('model_name', models.CharField(max_length=100)),
+                ('handle', models.CharField(max_length=255, unique=True)),
+                ('source_chars', models.PositiveIntegerField()),
+                ('hit_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('last_used_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'unique_together': {('content_hash', 'model_name')},
+            },
+        ),
+    ]
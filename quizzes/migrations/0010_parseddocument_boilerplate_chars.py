@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 08:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0009_providercontexthandle'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parseddocument',
+            name='boilerplate_chars',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
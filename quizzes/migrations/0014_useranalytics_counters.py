@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 08:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0013_quiz_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userquizanalytics',
+            name='counters',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
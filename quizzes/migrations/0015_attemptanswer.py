@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-17 08:16
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('quizzes', '0014_useranalytics_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttemptAnswer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('topic', models.CharField(blank=True, max_length=100)),
+                ('difficulty', models.CharField(choices=[('easy', 'Easy'), ('medium', 'Medium'), ('hard', 'Hard')], default='medium', max_length=20)),
+                ('question_type', models.CharField(choices=[('multiple_choice', 'Multiple Choice'), ('true_false', 'True/False'), ('fill_in_blank', 'Fill in the Blank'), ('descriptive', 'Descriptive')], default='multiple_choice', max_length=20)),
+                ('is_correct', models.BooleanField(default=False)),
+                ('time_ms', models.PositiveIntegerField(blank=True, null=True)),
+                ('answered_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('attempt', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='answers', to='quizzes.quizattempt')),
+                ('question', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='answers', to='quizzes.question')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attempt_answers', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'topic'], name='quizzes_att_user_id_cb2d5b_idx'), models.Index(fields=['user', 'difficulty'], name='quizzes_att_user_id_15b96e_idx'), models.Index(fields=['user', 'question_type'], name='quizzes_att_user_id_f11c52_idx'), models.Index(fields=['user', 'answered_at'], name='quizzes_att_user_id_1225fa_idx')],
+                'unique_together': {('attempt', 'question')},
+            },
+        ),
+    ]
@@ -0,0 +1,72 @@
+from django.db import migrations
+
+BATCH_SIZE = 500
+
+
+def backfill_attempt_answers(apps, schema_editor):
+    """Create AttemptAnswer rows for attempts completed before the table existed.
+
+    Analytics rebuilds read topic totals from these rows, so without them the
+    first rebuild after deploy would drop every earlier attempt's topics.
+    Answers to since-deleted questions take their topic, difficulty and type
+    from the attempt's stored detailed_results.
+    """
+    QuizAttempt = apps.get_model('quizzes', 'QuizAttempt')
+    Question = apps.get_model('quizzes', 'Question')
+    AttemptAnswer = apps.get_model('quizzes', 'AttemptAnswer')
+
+    pending = list(
+        QuizAttempt.objects.filter(is_completed=True, answers__isnull=True)
+        .order_by('completed_at').values_list('pk', flat=True)
+    )
+    questions = {}
+    for offset in range(0, len(pending), BATCH_SIZE):
+        attempts = list(QuizAttempt.objects.filter(pk__in=pending[offset:offset + BATCH_SIZE]))
+        missing = {attempt.quiz_id for attempt in attempts} - questions.keys()
+        for quiz_id in missing:
+            questions[quiz_id] = {}
+        for question_id, quiz_id, topic, difficulty, question_type in Question.objects.filter(
+            quiz_id__in=missing
+        ).values_list('id', 'quiz_id', 'topic', 'difficulty', 'question_type'):
+            questions[quiz_id][str(question_id)] = (int(question_id), topic, difficulty, question_type)
+
+        rows = []
+        for attempt in attempts:
+            details = {str(result.get('question_id')): result for result in attempt.detailed_results or []}
+            answered_at = attempt.completed_at or attempt.created_at
+            for result in attempt.question_results or []:
+                question_id = str(result.get('question_id'))
+                is_correct = bool(result.get('is_correct', False))
+                known = questions[attempt.quiz_id].get(question_id)
+                if known is not None:
+                    pk, topic, difficulty, question_type = known
+                else:
+                    detail = details.get(question_id)
+                    if detail is None:
+                        continue
+                    pk = None
+                    topic = detail.get('topic')
+                    difficulty = detail.get('difficulty') or 'medium'
+                    question_type = detail.get('question_type') or 'multiple_choice'
+                rows.append(AttemptAnswer(
+                    attempt_id=attempt.pk,
+                    question_id=pk,
+                    user_id=attempt.user_id,
+                    topic=topic or 'General',
+                    difficulty=difficulty,
+                    question_type=question_type,
+                    is_correct=is_correct,
+                    answered_at=answered_at,
+                ))
+        AttemptAnswer.objects.bulk_create(rows, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0015_attemptanswer'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_attempt_answers, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,12 @@
-from django.db import models
+from django.db import models, transaction
+from django.core.serializers.json import DjangoJSONEncoder
 from django.contrib.auth import get_user_model
 from django.utils import timezone
+from datetime import timedelta
 import uuid
 
+from .analytics_cache import analytics_responses
+
 User = get_user_model()
 
 class Quiz(models.Model):
@@ -42,6 +46,9 @@ class Quiz(models.Model):
     source_document = models.CharField(max_length=255, blank=True)
     generation_prompt = models.TextField(blank=True)
     
+    # Bumped whenever questions change so compiled answer keys are rebuilt
+    version = models.PositiveIntegerField(default=0)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -64,6 +71,39 @@ class Quiz(models.Model):
             self.average_score = 0.0
         self.save()
 
+class QuestionQuerySet(models.QuerySet):
+    """Bulk updates and deletes also bump the version of the quizzes they touch.
+
+    Model ``save``/``delete`` bump it per question; these paths (admin
+    "delete selected", ``bulk_update``, ad hoc ``update``) bypass them, and
+    cached answer keys are keyed by the version.
+    """
+
+    def _quiz_ids(self):
+        return set(self.order_by().values_list('quiz_id', flat=True).distinct())
+
+    def update(self, **kwargs):
+        quiz_ids = self._quiz_ids()
+        rows = super().update(**kwargs)
+        quiz = kwargs.get('quiz', kwargs.get('quiz_id'))
+        if quiz is not None:
+            quiz_ids.add(getattr(quiz, 'pk', quiz))
+        bump_quiz_versions(quiz_ids)
+        return rows
+
+    def delete(self):
+        quiz_ids = self._quiz_ids()
+        result = super().delete()
+        bump_quiz_versions(quiz_ids)
+        return result
+
+
+def bump_quiz_versions(quiz_ids):
+    """Invalidate cached answer keys of ``quiz_ids`` after their questions changed"""
+    if quiz_ids:
+        Quiz.objects.filter(pk__in=quiz_ids).update(version=models.F('version') + 1)
+
+
 class Question(models.Model):
     QUESTION_TYPE_CHOICES = [
         ('multiple_choice', 'Multiple Choice'),
@@ -89,6 +129,8 @@ class Question(models.Model):
     
     order = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = QuestionQuerySet.as_manager()
     
     class Meta:
         ordering = ['order', 'created_at']
@@ -99,6 +141,16 @@ class Question(models.Model):
     def __str__(self):
         return f"Q{self.order}: {self.question_text[:50]}..."
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        bump_quiz_versions([self.quiz_id])
+
+    def delete(self, *args, **kwargs):
+        quiz_id = self.quiz_id
+        result = super().delete(*args, **kwargs)
+        bump_quiz_versions([quiz_id])
+        return result
+
 class QuizAttempt(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='quiz_attempts')
@@ -156,10 +208,13 @@ class QuizAttempt(models.Model):
         if not self.question_results:
             return []
         
+        from .answer_key import answer_keys
+
+        answer_key = answer_keys.get(self.quiz)
         detailed = []
         for result in self.question_results:
             question_id = result.get('question_id')
-            question = self.quiz.questions.filter(id=question_id).first()
+            question = answer_key.entries.get(str(question_id))
             
             if question:
                 detailed_result = {
@@ -168,7 +223,7 @@ class QuizAttempt(models.Model):
                     'question_type': question.question_type,
                     'user_answer': self.user_answers.get(str(question_id), ''),
                     'correct_answer': question.correct_answer,
-                    'options': question.options if question.question_type == 'multiple_choice' else [],
+                    'options': list(question.options) if question.question_type == 'multiple_choice' else [],
                     'explanation': question.explanation,
                     'topic': question.topic,
                     'difficulty': question.difficulty,
@@ -189,13 +244,36 @@ class QuizAttempt(models.Model):
         # Check if passed
         self.check_if_passed()
         
-        # Generate detailed results if not already present
-        if not self.detailed_results and self.question_results:
-            self.generate_detailed_results()
-            
         super().save(*args, **kwargs)
 
 
+class AttemptAnswer(models.Model):
+    """One graded answer of a completed attempt, for SQL aggregation over a user's history"""
+    attempt = models.ForeignKey(QuizAttempt, on_delete=models.CASCADE, related_name='answers')
+    # Kept when the question is deleted; its topic and type are copied below
+    question = models.ForeignKey(Question, on_delete=models.SET_NULL, null=True, blank=True, related_name='answers')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='attempt_answers')
+    topic = models.CharField(max_length=100, blank=True)
+    difficulty = models.CharField(max_length=20, choices=Quiz.DIFFICULTY_CHOICES, default='medium')
+    question_type = models.CharField(max_length=20, choices=Question.QUESTION_TYPE_CHOICES, default='multiple_choice')
+    is_correct = models.BooleanField(default=False)
+    # Time spent on the question, when the client reports it
+    time_ms = models.PositiveIntegerField(null=True, blank=True)
+    answered_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ['attempt', 'question']
+        indexes = [
+            models.Index(fields=['user', 'topic']),
+            models.Index(fields=['user', 'difficulty']),
+            models.Index(fields=['user', 'question_type']),
+            models.Index(fields=['user', 'answered_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.attempt_id} Q{self.question_id}: {'correct' if self.is_correct else 'wrong'}"
+
+
 class UserQuizAnalytics(models.Model):
     """Comprehensive analytics for user quiz performance"""
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='quiz_analytics')
@@ -238,133 +316,357 @@ class UserQuizAnalytics(models.Model):
     recent_accuracy = models.FloatField(default=0.0)
     recent_quizzes_count = models.PositiveIntegerField(default=0)
     
+    # Running totals the fields above are derived from, so each attempt is
+    # applied as a delta; see record_attempt
+    counters = models.JSONField(default=dict, blank=True)
+    
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Bump when the shape of ``counters`` changes; stale rows are rebuilt on the next attempt
+    COUNTERS_VERSION = 1
+    RECENT_DAYS = 30
+    
     class Meta:
         verbose_name_plural = "User Quiz Analytics"
     
     def __str__(self):
         return f"Analytics for {self.user.email}"
     
+    @classmethod
+    def record_attempt(cls, attempt, answers=None):
+        """Apply one completed attempt's contribution to its user's analytics atomically.
+
+        ``answers`` are the attempt's ``AttemptAnswer`` rows, read from the
+        database when not given.
+        """
+        with transaction.atomic():
+            analytics, created = cls.objects.select_for_update().get_or_create(user_id=attempt.user_id)
+            if analytics.needs_rebuild:
+                # No running totals yet; the rebuild includes this attempt
+                analytics.update_analytics()
+                return analytics
+            if answers is None:
+                answers = list(attempt.answers.all())
+            analytics._apply_attempt(
+                attempt.quiz.difficulty, attempt.quiz.quiz_type, attempt.total_questions, attempt.score,
+                attempt.passed, attempt.time_taken, attempt.completed_at,
+            )
+            analytics._apply_topics((answer.topic or 'General', answer.is_correct) for answer in answers)
+            analytics.derive_statistics()
+            analytics.save()
+            transaction.on_commit(lambda: analytics_responses.bump(attempt.user_id))
+        return analytics
+
+    @classmethod
+    def rebuild(cls, user_id, stale_only=False):
+        """Rebuild the user's analytics under a row lock; returns ``(analytics, rebuilt)``.
+
+        The lock keeps an attempt recorded concurrently from landing between
+        the rebuild's reads and its save. With ``stale_only`` the row is only
+        rebuilt if it still lacks current running totals once locked.
+        """
+        with transaction.atomic():
+            analytics, created = cls.objects.select_for_update().get_or_create(user_id=user_id)
+            if stale_only and not analytics.needs_rebuild:
+                return analytics, False
+            analytics.update_analytics()
+        return analytics, True
+
+    @property
+    def needs_rebuild(self):
+        return self.counters.get('version') != self.COUNTERS_VERSION
+
     def update_analytics(self):
-        """Update all analytics based on current quiz attempts"""
-        attempts = self.user.quiz_attempts.filter(is_completed=True)
-        
-        # Basic counts
-        self.total_quizzes_taken = attempts.count()
-        self.total_questions_answered = sum(a.total_questions for a in attempts)
-        self.total_correct_answers = sum(a.score for a in attempts)
-        
+        """Rebuild all analytics from the user's completed attempts"""
+        self._reset()
+        attempts = self.user.quiz_attempts.filter(is_completed=True).order_by('completed_at').values_list(
+            'quiz__difficulty', 'quiz__quiz_type', 'total_questions', 'score',
+            'passed', 'time_taken', 'completed_at',
+        )
+        for attempt in attempts.iterator():
+            self._apply_attempt(*attempt)
+        from .answer_facts import topic_breakdown
+        self.topic_performance = topic_breakdown(self.user_id)
+        self.derive_statistics()
+        self.save()
+        transaction.on_commit(lambda: analytics_responses.bump(self.user_id))
+
+    def _reset(self):
+        for field in self._meta.concrete_fields:
+            if field.name not in ('id', 'user', 'updated_at'):
+                setattr(self, field.attname, field.get_default())
+        self.counters = {'version': self.COUNTERS_VERSION}
+
+    def _apply_attempt(self, difficulty, quiz_type, total_questions, score, passed, time_taken, completed_at):
+        """Add one attempt to the running totals; ``derive_statistics`` updates the rest"""
+        counters = self.counters
+        self.total_quizzes_taken += 1
+        self.total_questions_answered += total_questions
+        self.total_correct_answers += score
+        if passed:
+            self.total_passed_quizzes += 1
+        else:
+            self.total_failed_quizzes += 1
+
+        # [quizzes, questions, correct answers] per difficulty and quiz type
+        for group, key in (('difficulty', difficulty), ('quiz_type', quiz_type)):
+            totals = counters.setdefault(group, {}).setdefault(key, [0, 0, 0])
+            totals[0] += 1
+            totals[1] += total_questions
+            totals[2] += score
+
+        if time_taken is not None:
+            timed = counters.setdefault('time', [0, 0])  # [timed attempts, total seconds]
+            timed[0] += 1
+            timed[1] += time_taken
+            if self.fastest_quiz_completion is None or time_taken < self.fastest_quiz_completion:
+                self.fastest_quiz_completion = time_taken
+            if self.slowest_quiz_completion is None or time_taken > self.slowest_quiz_completion:
+                self.slowest_quiz_completion = time_taken
+
+        if completed_at:
+            # [quizzes, questions, correct answers] per day, for the last RECENT_DAYS
+            daily = counters.setdefault('daily', {})
+            totals = daily.setdefault(completed_at.date().isoformat(), [0, 0, 0])
+            totals[0] += 1
+            totals[1] += total_questions
+            totals[2] += score
+            cutoff = (timezone.now() - timedelta(days=self.RECENT_DAYS)).date().isoformat()
+            for day in [day for day in daily if day < cutoff]:
+                del daily[day]
+
+    def _apply_topics(self, results):
+        """Add ``(topic, is_correct)`` pairs to the per-topic totals"""
+        for topic, is_correct in results:
+            stats = self.topic_performance.setdefault(topic, {'correct': 0, 'total': 0})
+            stats['total'] += 1
+            if is_correct:
+                stats['correct'] += 1
+            stats['accuracy'] = (stats['correct'] / stats['total']) * 100
+
+    def derive_statistics(self):
+        """Recompute accuracies, averages and the recent window from the running totals"""
+        counters = self.counters
         if self.total_questions_answered > 0:
             self.overall_accuracy = (self.total_correct_answers / self.total_questions_answered) * 100
-        
-        # Difficulty-based analytics
-        self._update_difficulty_analytics(attempts)
-        
-        # Quiz type analytics
-        self._update_quiz_type_analytics(attempts)
-        
-        # Streak calculations
-        self._update_streaks(attempts)
-        
-        # Time analytics
-        self._update_time_analytics(attempts)
-        
-        # Topic performance
-        self._update_topic_analytics(attempts)
-        
-        # Recent performance (last 30 days)
-        self._update_recent_performance(attempts)
-        
-        self.save()
-    
-    def _update_difficulty_analytics(self, attempts):
-        """Update analytics by difficulty level"""
-        for difficulty in ['easy', 'medium', 'hard']:
-            diff_attempts = attempts.filter(quiz__difficulty=difficulty)
-            count = diff_attempts.count()
-            
-            if count > 0:
-                total_questions = sum(a.total_questions for a in diff_attempts)
-                total_correct = sum(a.score for a in diff_attempts)
-                accuracy = (total_correct / total_questions) * 100 if total_questions > 0 else 0
-                
-                if difficulty == 'easy':
-                    self.easy_quizzes_taken = count
-                    self.easy_accuracy = accuracy
-                elif difficulty == 'medium':
-                    self.medium_quizzes_taken = count
-                    self.medium_accuracy = accuracy
-                elif difficulty == 'hard':
-                    self.hard_quizzes_taken = count
-                    self.hard_accuracy = accuracy
-    
-    def _update_quiz_type_analytics(self, attempts):
-        """Update analytics by quiz type"""
-        for quiz_type in ['multiple_choice', 'true_false', 'fill_in_blank', 'descriptive']:
-            type_attempts = attempts.filter(quiz__quiz_type=quiz_type)
-            count = type_attempts.count()
-            
-            if count > 0:
-                total_questions = sum(a.total_questions for a in type_attempts)
-                total_correct = sum(a.score for a in type_attempts)
-                accuracy = (total_correct / total_questions) * 100 if total_questions > 0 else 0
-                
-                if quiz_type == 'multiple_choice':
-                    self.multiple_choice_accuracy = accuracy
-                elif quiz_type == 'true_false':
-                    self.true_false_accuracy = accuracy
-                elif quiz_type == 'fill_in_blank':
-                    self.fill_in_blank_accuracy = accuracy
-                elif quiz_type == 'descriptive':
-                    self.descriptive_accuracy = accuracy
-    
-    def _update_streaks(self, attempts):
-        """Update streak calculations"""
-        # This is a simplified version - you might want more sophisticated streak logic
-        self.total_passed_quizzes = attempts.filter(passed=True).count()
-        self.total_failed_quizzes = attempts.filter(passed=False).count()
-    
-    def _update_time_analytics(self, attempts):
-        """Update time-based analytics"""
-        timed_attempts = attempts.exclude(time_taken__isnull=True)
-        if timed_attempts.exists():
-            self.average_time_per_question = sum(a.time_taken for a in timed_attempts) / timed_attempts.count()
-            self.fastest_quiz_completion = min(a.time_taken for a in timed_attempts)
-            self.slowest_quiz_completion = max(a.time_taken for a in timed_attempts)
-    
-    def _update_topic_analytics(self, attempts):
-        """Update topic-based performance"""
-        topic_stats = {}
-        for attempt in attempts:
-            if attempt.detailed_results:
-                for result in attempt.detailed_results:
-                    topic = result.get('topic', 'General')
-                    if topic not in topic_stats:
-                        topic_stats[topic] = {'correct': 0, 'total': 0}
-                    
-                    topic_stats[topic]['total'] += 1
-                    if result.get('is_correct', False):
-                        topic_stats[topic]['correct'] += 1
-        
-        # Calculate accuracy for each topic
-        for topic, stats in topic_stats.items():
-            if stats['total'] > 0:
-                stats['accuracy'] = (stats['correct'] / stats['total']) * 100
-        
-        self.topic_performance = topic_stats
-    
-    def _update_recent_performance(self, attempts):
-        """Update recent performance (last 30 days)"""
-        from django.utils import timezone
-        from datetime import timedelta
-        
-        thirty_days_ago = timezone.now() - timedelta(days=30)
-        recent_attempts = attempts.filter(completed_at__gte=thirty_days_ago)
-        
-        self.recent_quizzes_count = recent_attempts.count()
-        if self.recent_quizzes_count > 0:
-            total_questions = sum(a.total_questions for a in recent_attempts)
-            total_correct = sum(a.score for a in recent_attempts)
-            self.recent_accuracy = (total_correct / total_questions) * 100 if total_questions > 0 else 0
 
+        for difficulty, (count, questions, correct) in counters.get('difficulty', {}).items():
+            if difficulty in ('easy', 'medium', 'hard'):
+                setattr(self, f'{difficulty}_quizzes_taken', count)
+                setattr(self, f'{difficulty}_accuracy', (correct / questions) * 100 if questions > 0 else 0)
+
+        for quiz_type, (count, questions, correct) in counters.get('quiz_type', {}).items():
+            if quiz_type in ('multiple_choice', 'true_false', 'fill_in_blank', 'descriptive'):
+                setattr(self, f'{quiz_type}_accuracy', (correct / questions) * 100 if questions > 0 else 0)
+
+        timed_count, timed_total = counters.get('time', [0, 0])
+        if timed_count:
+            self.average_time_per_question = timed_total / timed_count
+
+        cutoff = (timezone.now() - timedelta(days=self.RECENT_DAYS)).date().isoformat()
+        recent = [totals for day, totals in counters.get('daily', {}).items() if day >= cutoff]
+        self.recent_quizzes_count = sum(totals[0] for totals in recent)
+        recent_questions = sum(totals[1] for totals in recent)
+        recent_correct = sum(totals[2] for totals in recent)
+        self.recent_accuracy = (recent_correct / recent_questions) * 100 if recent_questions > 0 else 0.0
+
+
+class ParsedDocument(models.Model):
+    """Extracted text of an uploaded document, keyed by SHA-256 of its bytes"""
+    content_hash = models.CharField(max_length=64)
+    file_type = models.CharField(max_length=10)
+    text = models.TextField(blank=True)
+    byte_size = models.PositiveIntegerField(default=0)
+    # Characters of repeated headers, footers and page numbers stripped from ``text``
+    boilerplate_chars = models.PositiveIntegerField(default=0)
+    hit_count = models.PositiveIntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ['content_hash', 'file_type']
+        indexes = [
+            models.Index(fields=['last_used_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.content_hash[:12]}.{self.file_type} ({len(self.text)} chars)"
+
+
+class GenerationJob(models.Model):
+    """Background quiz generation request tracked for status polling"""
+    KIND_CHOICES = [
+        ('quiz', 'Quiz'),
+        ('room', 'Room Quiz'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='generation_jobs')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default='quiz')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+
+    # Progress reporting for polling clients
+    progress = models.PositiveSmallIntegerField(default=0)  # 0-100
+    message = models.CharField(max_length=255, blank=True)
+
+    # Request parameters and outcome
+    params = models.JSONField(default=dict, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    error_status = models.PositiveSmallIntegerField(null=True, blank=True)  # HTTP status to report
+    quiz = models.ForeignKey(Quiz, on_delete=models.SET_NULL, null=True, blank=True, related_name='generation_jobs')
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} job {self.id} ({self.status})"
+
+    @property
+    def is_finished(self):
+        return self.status in ('succeeded', 'failed')
+
+    def set_progress(self, progress, message=''):
+        """Persist a progress update without touching the rest of the row"""
+        self.progress = progress
+        self.message = message
+        self.save(update_fields=['progress', 'message', 'updated_at'])
+
+    def to_status_dict(self):
+        data = {
+            'job_id': str(self.id),
+            'kind': self.kind,
+            'status': self.status,
+            'progress': self.progress,
+            'message': self.message,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+        }
+        if self.quiz_id:
+            data['quiz_id'] = str(self.quiz_id)
+        if self.status == 'failed':
+            data['error'] = self.error
+        return data
+
+
+class CachedQuizResponse(models.Model):
+    """Validated model output for a prompt, keyed by text hash and generation parameters"""
+    cache_key = models.CharField(max_length=64, unique=True)
+    model_name = models.CharField(max_length=100)
+    prompt_version = models.PositiveIntegerField()
+    quiz_data = models.JSONField()
+    hit_count = models.PositiveIntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+    last_used_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['expires_at']),
+            models.Index(fields=['last_used_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.cache_key[:12]} ({self.model_name} v{self.prompt_version})"
+
+
+class LLMRateLimitState(models.Model):
+    """Token-bucket state shared by every worker calling one model"""
+    model_name = models.CharField(max_length=100, unique=True)
+    # Remaining request/token allowance and when it was last refilled (epoch seconds)
+    request_allowance = models.FloatField(default=0)
+    token_allowance = models.FloatField(default=0)
+    refilled_at = models.FloatField(default=0)
+    # Set after a 429 so every worker backs off together
+    blocked_until = models.FloatField(default=0)
+    # Calls currently in flight: lease id -> expiry (epoch seconds)
+    leases = models.JSONField(default=dict)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.model_name} ({len(self.leases)} in flight)"
+
+
+class DocumentDigest(models.Model):
+    """Condensed, topic-tagged outline of a document's prompt text, reused across generations"""
+    cache_key = models.CharField(max_length=64, unique=True)
+    model_name = models.CharField(max_length=100)
+    prompt_version = models.PositiveIntegerField()
+    digest = models.TextField()
+    source_chars = models.PositiveIntegerField()
+    digest_chars = models.PositiveIntegerField()
+    hit_count = models.PositiveIntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.cache_key[:12]} ({self.source_chars} -> {self.digest_chars} chars)"
+
+
+class ProviderContextHandle(models.Model):
+    """Provider-side cached copy of a document's full text, referenced by handle"""
+    content_hash = models.CharField(max_length=64)
+    model_name = models.CharField(max_length=100)
+    handle = models.CharField(max_length=255, unique=True)
+    source_chars = models.PositiveIntegerField()
+    hit_count = models.PositiveIntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+    last_used_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ['content_hash', 'model_name']
+
+    def __str__(self):
+        return f"{self.handle} ({self.model_name}, {self.source_chars} chars)"
+
+
+class GenerationLease(models.Model):
+    """Claim on an in-flight generation so identical concurrent requests wait for it"""
+    key = models.CharField(max_length=64, unique=True)
+    owner = models.CharField(max_length=32)
+    expires_at = models.DateTimeField(db_index=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.key[:12]} (owner {self.owner[:8]}, until {self.expires_at})"
+
+
+class IdempotencyRecord(models.Model):
+    """First response to a request carrying an Idempotency-Key, replayed for its retries"""
+    # Hash of the user, method, path and client key
+    key = models.CharField(max_length=64, unique=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='idempotency_records')
+    # Hash of the request body, to reject a key reused for a different request
+    fingerprint = models.CharField(max_length=64)
+    # Null while the first request is still being processed
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_data = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        state = self.status_code or 'in progress'
+        return f"{self.key[:12]} ({state})"
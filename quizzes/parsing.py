@@ -0,0 +1,112 @@
+import io
+import logging
+
+import docx
+from PyPDF2 import PdfReader
+from django.conf import settings
+
+from .boilerplate import PAGE_BREAK, strip_boilerplate
+
+logger = logging.getLogger(__name__)
+
+# Text extraction from uploaded documents. Multi-file uploads are parsed in
+# spawned worker processes that import this module without setting Django
+# up, so it must not import models or anything that does (quizzes.utils
+# pulls in the caches and providers).
+
+# Optional imports for PPTX support
+try:
+    from pptx import Presentation
+    PPTX_AVAILABLE = True
+except ImportError:
+    PPTX_AVAILABLE = False
+
+def parse_document(file):
+    ext = file.name.lower().split('.')[-1]
+    if ext == 'pdf':
+        return parse_pdf(file)
+    elif ext == 'docx':
+        return parse_docx(file)
+    elif ext == 'pptx':
+        if not PPTX_AVAILABLE:
+            raise ValueError("PPTX support not available. Please install python-pptx.")
+        return parse_pptx(file)
+    else:
+        raise ValueError("Unsupported file type.")
+
+def parse_file_bytes(name, file_bytes, pdf_char_budget=None):
+    """Parse an upload already read into memory, without repeated page boilerplate.
+
+    Returns ``(text, boilerplate_chars)``, the second being how many
+    characters of running headers, footers and page numbers were removed.
+    Lives in this module, which imports no models, so it can run in a
+    spawned parser process before Django is set up.
+    """
+    file = io.BytesIO(file_bytes)
+    file.name = name
+    if name.lower().endswith('.pdf'):
+        text = parse_pdf(file, pdf_char_budget)
+    else:
+        text = parse_document(file)
+    text, removed = strip_boilerplate(text)
+    if removed:
+        logger.debug("Stripped %s chars of repeated page boilerplate from %s (%s chars left)", removed, name, len(text))
+    return text, removed
+
+def iter_pdf_pages(reader):
+    """Yield the text of each page of a ``PdfReader`` lazily, in page order"""
+    for page in reader.pages:
+        yield page.extract_text() or ""
+
+def extract_pdf_text(file, max_chars=None):
+    """Extract PDF text page by page, stopping once ``max_chars`` is reached.
+
+    Returns ``(text, pages_read, total_pages)``. A falsy ``max_chars`` reads
+    the whole document.
+    """
+    reader = PdfReader(file)
+    total_pages = len(reader.pages)
+    parts = []
+    collected = 0
+    pages_read = 0
+    for page_text in iter_pdf_pages(reader):
+        pages_read += 1
+        if page_text:
+            parts.append(page_text)
+            collected += len(page_text) + 1
+        if max_chars and collected >= max_chars:
+            break
+    # Pages stay separated so repeated headers and footers can be found
+    text = PAGE_BREAK.join(parts)
+    if max_chars:
+        text = text[:max_chars]
+    return text, pages_read, total_pages
+
+def parse_pdf(file, max_chars=None):
+    if max_chars is None:
+        max_chars = getattr(settings, 'PDF_TEXT_CHAR_BUDGET', 0)
+    try:
+        text, pages_read, total_pages = extract_pdf_text(file, max_chars)
+        logger.debug("Read %s of %s PDF pages (%s chars, budget %s)", pages_read, total_pages, len(text), max_chars or 'unlimited')
+        return text.strip()
+    except Exception as e:
+        raise ValueError(f"Error parsing PDF: {str(e)}")
+
+def parse_docx(file):
+    try:
+        doc = docx.Document(file)
+        return "\n".join(p.text for p in doc.paragraphs).strip()
+    except Exception as e:
+        raise ValueError(f"Error parsing DOCX: {str(e)}")
+
+def parse_pptx(file):
+    if not PPTX_AVAILABLE:
+        raise ValueError("PPTX support not available. Please install python-pptx.")
+    try:
+        ppt = Presentation(file)
+        return PAGE_BREAK.join(
+            "\n".join(shape.text for shape in slide.shapes if hasattr(shape, "text"))
+            for slide in ppt.slides
+        ).strip()
+    except Exception as e:
+        raise ValueError(f"Error parsing PPTX: {str(e)}")
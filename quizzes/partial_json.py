@@ -0,0 +1,162 @@
+import json
+import re
+
+# Recovery of quiz questions from model output that is not valid JSON,
+# typically because the response hit the output token limit mid-array.
+
+_QUIZ_ARRAY_RE = re.compile(r'"quiz"\s*:\s*\[')
+_TRAILING_COMMA_RE = re.compile(r',\s*([}\]])')
+
+
+def _object_end(content, start):
+    """Index just past the object opening at ``start``, or None if it never closes.
+
+    Braces inside strings are ignored and ``//`` comments outside strings are
+    skipped, since models sometimes copy them from the prompt's example.
+    """
+    depth = 0
+    in_string = False
+    escaped = False
+    i = start
+    length = len(content)
+    while i < length:
+        ch = content[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == '\\':
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == '/' and content.startswith('//', i):
+            newline = content.find('\n', i)
+            if newline == -1:
+                return None
+            i = newline
+            continue
+        elif ch == '{':
+            depth += 1
+        elif ch == '}':
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return None
+
+
+def _strip_comments(chunk):
+    """Drop ``//`` comments that sit outside strings"""
+    out = []
+    in_string = False
+    escaped = False
+    i = 0
+    while i < len(chunk):
+        ch = chunk[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == '\\':
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == '/' and chunk.startswith('//', i):
+            newline = chunk.find('\n', i)
+            i = len(chunk) if newline == -1 else newline
+            continue
+        out.append(ch)
+        i += 1
+    return ''.join(out)
+
+
+def _load_object(chunk):
+    try:
+        return json.loads(chunk)
+    except json.JSONDecodeError:
+        pass
+    try:
+        return json.loads(_TRAILING_COMMA_RE.sub(r'\1', _strip_comments(chunk)))
+    except json.JSONDecodeError:
+        return None
+
+
+def _scan_array(content, pos):
+    """Parse complete question objects from ``pos`` inside a quiz array.
+
+    Returns ``(questions, next_pos, closed)``; ``next_pos`` is where the first
+    incomplete element starts and ``closed`` is True once ``]`` is reached.
+    """
+    questions = []
+    length = len(content)
+    while pos < length:
+        while pos < length and content[pos] in ' \t\r\n,':
+            pos += 1
+        if pos >= length:
+            break
+        if content[pos] == ']':
+            return questions, pos + 1, True
+        if content[pos] != '{':
+            # Garbage between elements; resume at the next object
+            next_object = content.find('{', pos)
+            if next_object == -1:
+                break
+            pos = next_object
+        end = _object_end(content, pos)
+        if end is None:
+            break
+        obj = _load_object(content[pos:end])
+        if isinstance(obj, dict) and 'question_text' in obj:
+            questions.append(obj)
+        pos = end
+    return questions, pos, False
+
+
+def salvage_quiz_questions(content):
+    """Return every complete question object found in a quiz array.
+
+    Scans the ``quiz`` array one element at a time, so a truncated tail or a
+    single malformed element only loses that element. Objects that are
+    invalid JSON only because of trailing commas or ``//`` comments are
+    repaired.
+    """
+    match = _QUIZ_ARRAY_RE.search(content)
+    if match:
+        pos = match.end()
+    else:
+        pos = content.find('[')
+        if pos == -1:
+            return []
+        pos += 1
+    return _scan_array(content, pos)[0]
+
+
+class QuizStreamParser:
+    """Incrementally yield question objects from streamed model output.
+
+    ``feed`` takes each text chunk as it arrives and returns the questions
+    completed by it; ``text`` holds everything received so far.
+    """
+
+    def __init__(self):
+        self._buffer = ''
+        self._pos = None
+        self.closed = False
+
+    @property
+    def text(self):
+        return self._buffer
+
+    def feed(self, chunk):
+        self._buffer += chunk
+        if self.closed:
+            return []
+        if self._pos is None:
+            match = _QUIZ_ARRAY_RE.search(self._buffer)
+            if not match:
+                return []
+            self._pos = match.end()
+        questions, self._pos, self.closed = _scan_array(self._buffer, self._pos)
+        return questions
@@ -0,0 +1,97 @@
+from django.db import transaction
+from django.db.models import F
+
+from .models import Question, Quiz
+
+# Writing quizzes and their questions with as few round trips as possible.
+# A finished quiz is inserted with its questions in one transaction using
+# bulk_create; a quiz filled while it is being generated buffers questions
+# and writes them in batches. The helpers take the models to write so the
+# legacy core app and the rooms app share them.
+
+
+def create_with_items(model, item_model, items_data, build_item, **fields):
+    """Create ``model(**fields)`` and its items in one transaction; returns ``(parent, items)``.
+
+    ``build_item(parent, data, order)`` returns the unsaved ``item_model``
+    for each entry of ``items_data``; they are written with one ``bulk_create``.
+    """
+    with transaction.atomic():
+        parent = model.objects.create(**fields)
+        items = item_model.objects.bulk_create([
+            build_item(parent, data, order)
+            for order, data in enumerate(items_data)
+        ])
+    return parent, items
+
+
+def build_question(quiz, data, order, difficulty='medium', question_model=Question):
+    """Unsaved question of ``quiz`` from one validated quiz item"""
+    return question_model(
+        quiz=quiz,
+        question_text=data['question_text'],
+        question_type=data['question_type'],
+        options=data.get('options', []),
+        correct_answer=data['correct_answer'],
+        explanation=data.get('explanation', ''),
+        topic=data.get('topic', 'General'),
+        difficulty=data.get('difficulty', difficulty),
+        order=order,
+    )
+
+
+def create_quiz_with_questions(questions_data, quiz_model=Quiz, question_model=Question, **quiz_fields):
+    """Create a quiz and all its questions atomically; returns ``(quiz, questions)``"""
+    difficulty = quiz_fields.get('difficulty', 'medium')
+    return create_with_items(
+        quiz_model, question_model, questions_data,
+        lambda quiz, data, order: build_question(quiz, data, order, difficulty, question_model),
+        total_questions=len(questions_data),
+        **quiz_fields,
+    )
+
+
+class QuestionWriter:
+    """Saves the questions of a quiz that is still being generated.
+
+    ``add`` buffers questions and ``flush`` writes them with one
+    ``bulk_create``. Generation calls ``flush`` once each group of
+    questions that arrived together (a stream chunk, a cached response,
+    a fan-out batch) has been added, so every question reaches readers as
+    soon as its chunk is in, without a write per question. ``finish``
+    writes the rest and the question count in one transaction.
+    ``on_flush(saved_count)`` runs after every write.
+    """
+
+    def __init__(self, quiz, difficulty='medium', on_flush=None):
+        self.quiz = quiz
+        self.difficulty = difficulty
+        self.on_flush = on_flush
+        self.saved = []
+        self._pending = []
+
+    def add(self, data, order):
+        self._pending.append(build_question(self.quiz, data, order, self.difficulty))
+
+    def flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        self.saved.extend(Question.objects.bulk_create(pending))
+        if self.on_flush:
+            self.on_flush(len(self.saved))
+
+    @property
+    def count(self):
+        return len(self.saved) + len(self._pending)
+
+    def finish(self):
+        with transaction.atomic():
+            self.flush()
+            self.quiz.total_questions = len(self.saved)
+            # bulk_create skips Question.save, which normally bumps the version;
+            # F() keeps a concurrent bump from being lost
+            self.quiz.version = F('version') + 1
+            self.quiz.save(update_fields=['total_questions', 'version', 'updated_at'])
+            self.quiz.refresh_from_db(fields=['version'])
+        return self.saved
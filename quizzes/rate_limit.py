@@ -0,0 +1,287 @@
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, connection, transaction
+
+from .models import LLMRateLimitState
+
+logger = logging.getLogger(__name__)
+
+# Admission control for LLM calls shared by every worker process. Limits are
+# token buckets refilled continuously (requests/minute and tokens/minute)
+# plus a cap on calls in flight; state lives in the database so all workers
+# see the same budget, with a local SQLite file as the fallback store.
+
+RETRY_DELAY_RE = re.compile(r'retry_delay\s*\{\s*seconds:\s*(\d+)')
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a call cannot be admitted within the allowed wait"""
+
+
+def _admit(state, now, rpm, tpm, max_in_flight, tokens, lease_id, lease_ttl):
+    """Try to take one call's budget from ``state`` (mutated in place).
+
+    Returns ``(admitted, wait_seconds)``; ``wait_seconds`` estimates when a
+    retry could succeed.
+    """
+    if state['refilled_at']:
+        elapsed = max(0.0, now - state['refilled_at'])
+        state['request_allowance'] = min(rpm, state['request_allowance'] + elapsed * rpm / 60)
+        state['token_allowance'] = min(tpm, state['token_allowance'] + elapsed * tpm / 60)
+    else:
+        state['request_allowance'] = rpm
+        state['token_allowance'] = tpm
+    state['refilled_at'] = now
+    # Leases of calls whose worker died expire instead of blocking forever
+    state['leases'] = {k: v for k, v in state['leases'].items() if v > now}
+
+    # A single call larger than the whole bucket must still be admissible
+    needed_tokens = min(tokens, tpm) if tpm else 0
+    waits = []
+    if state['blocked_until'] > now:
+        waits.append(state['blocked_until'] - now)
+    if rpm and state['request_allowance'] < 1:
+        waits.append((1 - state['request_allowance']) * 60 / rpm)
+    if tpm and state['token_allowance'] < needed_tokens:
+        waits.append((needed_tokens - state['token_allowance']) * 60 / tpm)
+    if max_in_flight and len(state['leases']) >= max_in_flight:
+        # No way to know when a call finishes; poll again shortly
+        waits.append(0.25)
+    if waits:
+        return False, max(waits)
+
+    if rpm:
+        state['request_allowance'] -= 1
+    state['token_allowance'] -= needed_tokens
+    state['leases'][lease_id] = now + lease_ttl
+    return True, 0.0
+
+
+def _empty_state():
+    return {
+        'request_allowance': 0.0,
+        'token_allowance': 0.0,
+        'refilled_at': 0.0,
+        'blocked_until': 0.0,
+        'leases': {},
+    }
+
+
+class DatabaseLimiterStore:
+    """Limiter state in ``LLMRateLimitState``, one locked row per model"""
+    name = 'database'
+
+    def update(self, model_name, fn):
+        for _ in range(2):
+            try:
+                with transaction.atomic():
+                    row, _ = LLMRateLimitState.objects.select_for_update().get_or_create(model_name=model_name)
+                    state = {
+                        'request_allowance': row.request_allowance,
+                        'token_allowance': row.token_allowance,
+                        'refilled_at': row.refilled_at,
+                        'blocked_until': row.blocked_until,
+                        'leases': dict(row.leases or {}),
+                    }
+                    result = fn(state)
+                    row.request_allowance = state['request_allowance']
+                    row.token_allowance = state['token_allowance']
+                    row.refilled_at = state['refilled_at']
+                    row.blocked_until = state['blocked_until']
+                    row.leases = state['leases']
+                    row.save()
+                    return result
+            except IntegrityError:
+                # Another worker created the row first; lock it on the retry
+                continue
+        raise DatabaseError(f"Could not lock rate limit state for {model_name}")
+
+
+class FileLimiterStore:
+    """Limiter state in a local SQLite file, shared by workers on one host"""
+    name = 'file'
+
+    def __init__(self, path):
+        self.path = path
+        self._initialized = False
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        if not self._initialized:
+            with self._lock:
+                conn.execute('CREATE TABLE IF NOT EXISTS llm_rate_limit (model_name TEXT PRIMARY KEY, state TEXT NOT NULL)')
+                self._initialized = True
+        return conn
+
+    def update(self, model_name, fn):
+        conn = self._connect()
+        try:
+            # IMMEDIATE takes the write lock up front so updates serialize
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT state FROM llm_rate_limit WHERE model_name = ?', (model_name,)).fetchone()
+            state = json.loads(row[0]) if row else _empty_state()
+            result = fn(state)
+            conn.execute(
+                'INSERT OR REPLACE INTO llm_rate_limit (model_name, state) VALUES (?, ?)',
+                (model_name, json.dumps(state)),
+            )
+            conn.execute('COMMIT')
+            return result
+        except Exception:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+
+class LLMRateLimiter:
+    """Shared requests/minute, tokens/minute and in-flight limits per model.
+
+    ``acquire`` waits up to ``max_wait`` seconds for budget (0 fails fast)
+    and raises ``RateLimitExceeded`` otherwise. A limit of 0 disables it.
+    """
+
+    def __init__(self, rpm, tpm, max_in_flight, max_wait, lease_ttl, store, fallback_store=None):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_in_flight = max_in_flight
+        self.max_wait = max_wait
+        self.lease_ttl = lease_ttl
+        self.store = store
+        self.fallback_store = fallback_store
+        self._lock = threading.Lock()
+        self.admitted = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+
+    @property
+    def enabled(self):
+        return bool(self.rpm or self.tpm or self.max_in_flight)
+
+    def _update(self, model_name, fn):
+        try:
+            return self.store.update(model_name, fn)
+        except DatabaseError as e:
+            if self.fallback_store is None:
+                raise
+            logger.warning("Rate limit store %s unavailable, using %s: %s", self.store.name, self.fallback_store.name, e)
+            return self.fallback_store.update(model_name, fn)
+
+    def acquire(self, model_name, tokens):
+        """Block until a call may start; returns a lease id to pass to ``release``"""
+        if not self.enabled:
+            return None
+        lease_id = uuid.uuid4().hex
+        started = time.monotonic()
+        deadline = started + self.max_wait
+        while True:
+            admitted, wait = self._update(model_name, lambda state: _admit(
+                state, time.time(), self.rpm, self.tpm, self.max_in_flight, tokens, lease_id, self.lease_ttl
+            ))
+            if admitted:
+                waited = time.monotonic() - started
+                with self._lock:
+                    self.admitted += 1
+                    self.total_wait += waited
+                if waited >= 0.5:
+                    logger.debug("Rate limiter held %s call for %.1fs", model_name, waited)
+                return lease_id
+            remaining = deadline - time.monotonic()
+            if wait > remaining:
+                with self._lock:
+                    self.rejected += 1
+                raise RateLimitExceeded(
+                    f"Rate limit for {model_name} reached; retry in {wait:.0f}s [SERVICE_UNAVAILABLE]"
+                )
+            time.sleep(max(wait, 0.05))
+
+    def release(self, model_name, lease_id):
+        if lease_id is None:
+            return
+
+        def drop(state):
+            state['leases'].pop(lease_id, None)
+
+        try:
+            self._update(model_name, drop)
+        except DatabaseError as e:
+            # The lease expires on its own after lease_ttl
+            logger.warning("Failed to release rate limit lease: %s", e)
+
+    def block(self, model_name, seconds):
+        """Hold every worker's calls to ``model_name`` for ``seconds`` (after a 429)"""
+        if not self.enabled:
+            return
+        until = time.time() + seconds
+
+        def set_block(state):
+            state['blocked_until'] = max(state['blocked_until'], until)
+
+        self._update(model_name, set_block)
+
+    @contextmanager
+    def limit(self, model_name, tokens):
+        lease_id = self.acquire(model_name, tokens)
+        try:
+            yield
+        finally:
+            self.release(model_name, lease_id)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'rpm': self.rpm,
+                'tpm': self.tpm,
+                'max_in_flight': self.max_in_flight,
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'avg_wait_seconds': round(self.total_wait / self.admitted, 3) if self.admitted else 0.0,
+            }
+
+
+def estimate_tokens(prompt, max_output_tokens):
+    """Rough token cost of a call: ~4 characters per prompt token plus the output cap"""
+    return len(prompt) // 4 + max_output_tokens
+
+
+def rate_limit_penalty(error):
+    """Seconds to back off after a provider error, or None if it was not a 429"""
+    message = str(error)
+    if '429' not in message and 'RESOURCE_EXHAUSTED' not in message:
+        return None
+    match = RETRY_DELAY_RE.search(message)
+    return int(match.group(1)) if match else getattr(settings, 'LLM_RATE_LIMIT_DEFAULT_PENALTY', 10)
+
+
+def _build_limiter():
+    file_store = FileLimiterStore(
+        getattr(settings, 'LLM_RATE_LIMIT_FILE', os.path.join(settings.BASE_DIR, 'llm_rate_limit.sqlite3'))
+    )
+    # SQLite ignores select_for_update, so concurrent updates of the shared
+    # row would fail with "database is locked"; the file store serializes them
+    use_file = (getattr(settings, 'LLM_RATE_LIMIT_STORE', 'database') == 'file'
+                or connection.vendor == 'sqlite')
+    return LLMRateLimiter(
+        rpm=getattr(settings, 'LLM_RATE_LIMIT_RPM', 0),
+        tpm=getattr(settings, 'LLM_RATE_LIMIT_TPM', 0),
+        max_in_flight=getattr(settings, 'LLM_MAX_IN_FLIGHT', 0),
+        max_wait=getattr(settings, 'LLM_RATE_LIMIT_MAX_WAIT', 30),
+        lease_ttl=getattr(settings, 'LLM_RATE_LIMIT_LEASE_TTL', 300),
+        store=file_store if use_file else DatabaseLimiterStore(),
+        fallback_store=None if use_file else file_store,
+    )
+
+
+llm_rate_limiter = _build_limiter()
@@ -0,0 +1,186 @@
+import copy
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError
+from django.db.models import F
+from django.utils import timezone
+
+from .models import CachedQuizResponse
+
+logger = logging.getLogger(__name__)
+
+
+class QuizResponseCache:
+    """Two-tier cache of validated quiz generations.
+
+    Keys cover everything that shapes the model output: the exact prompt
+    text, the normalized generation parameters, the model name and the prompt
+    template version. The first tier is an in-process LRU of ``max_entries``
+    items; the second is the ``CachedQuizResponse`` table shared by all
+    workers and pruned to ``db_max_entries`` rows. Entries expire after
+    ``ttl`` seconds; a ``ttl`` of 0 disables the cache.
+    """
+
+    def __init__(self, ttl, max_entries, db_max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.db_max_entries = db_max_entries
+        self._entries = OrderedDict()  # key -> (expires_at monotonic, quiz_data)
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    @staticmethod
+    def make_key(prompt_text, num_questions, difficulty, question_types, model_name, prompt_version):
+        if isinstance(question_types, str):
+            question_types = [question_types]
+        params = {
+            'num_questions': int(num_questions),
+            'difficulty': str(difficulty).strip().lower(),
+            'question_types': sorted({str(t).strip().lower() for t in question_types or []}),
+            'model': model_name,
+            'prompt_version': prompt_version,
+        }
+        digest = hashlib.sha256(prompt_text.encode('utf-8'))
+        digest.update(json.dumps(params, sort_keys=True).encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, key, record_miss=True):
+        """Return a copy of the cached quiz data, or None on a miss.
+
+        Pass ``record_miss=False`` when polling for an entry another request
+        is about to store, so waiting does not count as misses.
+        """
+        if not self.enabled:
+            return None
+
+        quiz_data = self._memory_get(key)
+        if quiz_data is not None:
+            with self._lock:
+                self.memory_hits += 1
+            logger.debug("Quiz response cache hit (memory) for %s", key[:12])
+            return copy.deepcopy(quiz_data)
+
+        try:
+            entry = self._db_get(key)
+        except DatabaseError as e:
+            # The cache must never fail a generation
+            logger.warning("Quiz response cache lookup failed: %s", e)
+            entry = None
+        if entry is not None:
+            quiz_data, expires_at = entry
+            with self._lock:
+                self.db_hits += 1
+            logger.debug("Quiz response cache hit (db) for %s", key[:12])
+            self._memory_set(key, quiz_data, (expires_at - timezone.now()).total_seconds())
+            return copy.deepcopy(quiz_data)
+
+        if record_miss:
+            with self._lock:
+                self.misses += 1
+            logger.debug("Quiz response cache miss for %s", key[:12])
+        return None
+
+    def set(self, key, quiz_data, model_name, prompt_version):
+        if not self.enabled:
+            return
+        quiz_data = copy.deepcopy(quiz_data)
+        try:
+            self._db_set(key, quiz_data, model_name, prompt_version)
+        except DatabaseError as e:
+            logger.warning("Quiz response cache store failed: %s", e)
+        self._memory_set(key, quiz_data, self.ttl)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.memory_hits + self.db_hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'ttl_seconds': self.ttl,
+                'memory_hits': self.memory_hits,
+                'db_hits': self.db_hits,
+                'misses': self.misses,
+                'hit_rate': round((self.memory_hits + self.db_hits) / lookups * 100, 1) if lookups else 0.0,
+                'memory_entries': len(self._entries),
+                'memory_max_entries': self.max_entries,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _memory_get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, quiz_data = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return quiz_data
+
+    def _memory_set(self, key, quiz_data, ttl):
+        if ttl <= 0 or self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.monotonic() + ttl, quiz_data)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _db_get(self, key):
+        now = timezone.now()
+        entry = CachedQuizResponse.objects.filter(cache_key=key, expires_at__gt=now).first()
+        if entry is None:
+            return None
+        CachedQuizResponse.objects.filter(pk=entry.pk).update(
+            hit_count=F('hit_count') + 1,
+            last_used_at=now,
+        )
+        return entry.quiz_data, entry.expires_at
+
+    def _db_set(self, key, quiz_data, model_name, prompt_version):
+        now = timezone.now()
+        expires_at = now + timedelta(seconds=self.ttl)
+        try:
+            _, created = CachedQuizResponse.objects.update_or_create(
+                cache_key=key,
+                defaults={
+                    'model_name': model_name,
+                    'prompt_version': prompt_version,
+                    'quiz_data': quiz_data,
+                    'expires_at': expires_at,
+                    'last_used_at': now,
+                },
+            )
+        except IntegrityError:
+            # Another worker stored the same generation concurrently
+            return
+        if not created:
+            return
+        CachedQuizResponse.objects.filter(expires_at__lte=now).delete()
+        stale = CachedQuizResponse.objects.order_by('-last_used_at').values_list('pk', flat=True)[self.db_max_entries:]
+        stale_ids = list(stale)
+        if stale_ids:
+            CachedQuizResponse.objects.filter(pk__in=stale_ids).delete()
+
+
+quiz_response_cache = QuizResponseCache(
+    ttl=getattr(settings, 'QUIZ_RESPONSE_CACHE_TTL', 7 * 24 * 3600),
+    max_entries=getattr(settings, 'QUIZ_RESPONSE_CACHE_MAX_ENTRIES', 256),
+    db_max_entries=getattr(settings, 'QUIZ_RESPONSE_CACHE_DB_MAX_ENTRIES', 2000),
+)
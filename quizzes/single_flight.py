@@ -0,0 +1,141 @@
+import logging
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, transaction
+from django.utils import timezone
+
+from .models import GenerationLease
+
+logger = logging.getLogger(__name__)
+
+# Coalescing of identical concurrent generations across all workers. The
+# first request for a key takes a lease row and calls the model; identical
+# requests arriving meanwhile wait until the leader's result shows up in the
+# shared response cache instead of making their own upstream call. A
+# follower waits in the thread that runs it, which for background jobs is
+# one of the few generation workers, so the wait is kept short.
+
+
+class SingleFlight:
+    """Run one computation per key at a time across processes.
+
+    Leases expire after ``lease_ttl`` seconds so a crashed leader cannot
+    stall followers; followers give up waiting after ``max_wait`` seconds
+    and compute on their own. A ``max_wait`` of 0 disables coalescing.
+    """
+
+    def __init__(self, lease_ttl, max_wait, poll_interval):
+        self.lease_ttl = lease_ttl
+        self.max_wait = max_wait
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self.led = 0
+        self.joined = 0
+        self.gave_up = 0
+        self.total_wait = 0.0
+
+    @property
+    def enabled(self):
+        return self.max_wait > 0
+
+    def run(self, key, compute, lookup):
+        """Return ``(result, led)`` for ``key``.
+
+        ``compute()`` produces the result and must publish it where
+        ``lookup()`` finds it (returning None until then). ``led`` is False
+        when the result came from another request's computation.
+        """
+        started = time.monotonic()
+        deadline = started + self.max_wait
+        while True:
+            try:
+                owner = self._acquire(key)
+            except DatabaseError as e:
+                # Coalescing is an optimization; never fail a generation over it
+                logger.warning("Generation lease unavailable, generating directly: %s", e)
+                return compute(), True
+            if owner is not None:
+                with self._lock:
+                    self.led += 1
+                try:
+                    return compute(), True
+                finally:
+                    self._release(key, owner)
+
+            logger.debug("Identical generation in flight for %s, waiting for its result", key[:12])
+            result = self._wait(key, lookup, deadline)
+            if result is not None:
+                waited = time.monotonic() - started
+                with self._lock:
+                    self.joined += 1
+                    self.total_wait += waited
+                logger.debug("Reused in-flight generation for %s after %.1fs", key[:12], waited)
+                return result, False
+            if time.monotonic() >= deadline:
+                break
+            # The leader finished without a result (it failed); try to lead
+
+        with self._lock:
+            self.gave_up += 1
+        logger.warning("Gave up waiting for generation %s after %ss", key[:12], self.max_wait)
+        return compute(), True
+
+    def _wait(self, key, lookup, deadline):
+        """Poll for the leader's result until its lease is gone or the deadline passes"""
+        while time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            result = lookup()
+            if result is not None:
+                return result
+            try:
+                if not GenerationLease.objects.filter(key=key, expires_at__gt=timezone.now()).exists():
+                    # Released between polls; the result may have just landed
+                    return lookup()
+            except DatabaseError:
+                return None
+        return None
+
+    def _acquire(self, key):
+        """Take the lease for ``key``; returns the owner token or None if held by someone else"""
+        owner = uuid.uuid4().hex
+        now = timezone.now()
+        expires_at = now + timedelta(seconds=self.lease_ttl)
+        try:
+            with transaction.atomic():
+                GenerationLease.objects.create(key=key, owner=owner, expires_at=expires_at)
+            return owner
+        except IntegrityError:
+            pass
+        # Take over a lease whose holder died without releasing it
+        taken = GenerationLease.objects.filter(key=key, expires_at__lte=now).update(
+            owner=owner, expires_at=expires_at,
+        )
+        return owner if taken else None
+
+    def _release(self, key, owner):
+        try:
+            GenerationLease.objects.filter(key=key, owner=owner).delete()
+        except DatabaseError as e:
+            # It expires on its own after lease_ttl
+            logger.warning("Failed to release generation lease: %s", e)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'led': self.led,
+                'joined': self.joined,
+                'gave_up': self.gave_up,
+                'avg_wait_seconds': round(self.total_wait / self.joined, 3) if self.joined else 0.0,
+            }
+
+
+generation_flights = SingleFlight(
+    lease_ttl=getattr(settings, 'GENERATION_COALESCE_LEASE_TTL', 300),
+    max_wait=getattr(settings, 'GENERATION_COALESCE_MAX_WAIT', 30),
+    poll_interval=getattr(settings, 'GENERATION_COALESCE_POLL_SECONDS', 0.5),
+)
@@ -0,0 +1,112 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+
+from .analytics_cache import AnalyticsResponseCache
+from .digest import document_digests
+from .grading import MatcherCache, compile_matcher
+from .llm import StubProvider
+from .models import Question
+from .utils import generate_quiz_with_gemini
+
+
+class CountingStubProvider(StubProvider):
+    """Stub provider that counts every model call"""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def generate(self, *args, **kwargs):
+        self.calls += 1
+        return super().generate(*args, **kwargs)
+
+    def generate_stream(self, *args, **kwargs):
+        self.calls += 1
+        return super().generate_stream(*args, **kwargs)
+
+
+def long_document(paragraphs=40):
+    return "\n\n".join(
+        f"Section {i}. The mitochondrion number {i} produces ATP through cellular respiration, "
+        f"while chloroplast {i} captures light energy during photosynthesis in plant cell {i}."
+        for i in range(paragraphs)
+    )
+
+
+class DocumentDigestTests(TestCase):
+    def setUp(self):
+        document_digests.clear()
+        self.provider = CountingStubProvider()
+        patcher = mock.patch('quizzes.utils.get_provider', return_value=self.provider)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def generate(self, text):
+        return generate_quiz_with_gemini(text, num_questions=5, use_cache=False)
+
+    def test_first_generation_makes_one_provider_call(self):
+        text = long_document()
+        with mock.patch.object(document_digests, 'schedule') as schedule:
+            self.generate(text)
+        self.assertTrue(document_digests.applies_to(text))
+        self.assertEqual(self.provider.calls, 1)
+        schedule.assert_not_called()
+
+    def test_repeated_document_schedules_digest(self):
+        text = long_document()
+        with mock.patch.object(document_digests, 'schedule') as schedule:
+            self.generate(text)
+            self.generate(text)
+        self.assertEqual(self.provider.calls, 2)
+        schedule.assert_called_once()
+
+
+class FuzzyGradingTests(SimpleTestCase):
+    def setUp(self):
+        self.matcher = compile_matcher('fill_in_blank', 'photosynthesis', fuzzy_threshold=0.85)
+
+    def test_close_typo_is_accepted(self):
+        self.assertTrue(self.matcher.matches('Photosynthesiss'))
+        self.assertTrue(self.matcher.matches('photosynthsis'))
+
+    def test_near_miss_below_threshold_is_rejected(self):
+        self.assertFalse(self.matcher.matches('chemosynthesis'))
+        self.assertFalse(self.matcher.matches('photosystem'))
+
+    def test_threshold_of_one_requires_exact_match(self):
+        matcher = compile_matcher('fill_in_blank', 'photosynthesis', fuzzy_threshold=1)
+        self.assertTrue(matcher.matches(' Photosynthesis. '))
+        self.assertFalse(matcher.matches('photosynthesiss'))
+
+
+class MatcherCacheTests(SimpleTestCase):
+    def test_edited_question_is_recompiled(self):
+        cache = MatcherCache(max_entries=8)
+        question = Question(pk=1, question_type='fill_in_blank', options=[], correct_answer='mitosis')
+        matcher = cache.get(question, question.correct_answer)
+        self.assertIs(cache.get(question, question.correct_answer), matcher)
+
+        question.correct_answer = 'meiosis'
+        self.assertTrue(cache.get(question, question.correct_answer).matches('meiosis'))
+        self.assertEqual(cache.stats()['compiled'], 2)
+
+
+class AnalyticsResponseCacheTests(TestCase):
+    def setUp(self):
+        self.cache = AnalyticsResponseCache(ttl=60)
+
+    def test_response_is_served_at_the_version_it_was_built(self):
+        response, version = self.cache.get(1)
+        self.assertIsNone(response)
+        self.assertIsNotNone(version)
+        self.cache.set(1, {'overview': {}}, version)
+        self.assertEqual(self.cache.get(1), ({'overview': {}}, version))
+
+    def test_bump_during_build_leaves_response_stale(self):
+        _, version = self.cache.get(1)
+        self.cache.bump(1)
+        self.cache.set(1, {'overview': {}}, version)
+        response, current = self.cache.get(1)
+        self.assertIsNone(response)
+        self.assertNotEqual(current, version)
@@ -1,63 +1,51 @@
 import json
 import re
-from PyPDF2 import PdfReader
-import docx
+from concurrent.futures import ThreadPoolExecutor
 from django.conf import settings
+from django.db import connection
 import requests
-import google.generativeai as genai
-
-# Optional imports for PPTX support
-try:
-    from pptx import Presentation
-    PPTX_AVAILABLE = True
-except ImportError:
-    PPTX_AVAILABLE = False
-
-def parse_document(file):
-    ext = file.name.lower().split('.')[-1]
-    if ext == 'pdf':
-        return parse_pdf(file)
-    elif ext == 'docx':
-        return parse_docx(file)
-    elif ext == 'pptx':
-        if not PPTX_AVAILABLE:
-            raise ValueError("PPTX support not available. Please install python-pptx.")
-        return parse_pptx(file)
-    else:
-        raise ValueError("Unsupported file type.")
+from .chunking import select_relevant_text
+from .response_cache import quiz_response_cache
+from .digest import document_digests
+from .llm import CONTEXT_PLACEHOLDER, ContextCachedProvider, get_fallback_provider, get_provider
+from .context_cache import context_handles
+from .single_flight import generation_flights
+from .circuit_breaker import CircuitOpenError, call_with_breaker, hedged_call, select_provider
+from .partial_json import salvage_quiz_questions, QuizStreamParser
+from .rate_limit import RateLimitExceeded
 
-def parse_pdf(file):
-    try:
-        reader = PdfReader(file)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text()
-        return text.strip()
-    except Exception as e:
-        raise ValueError(f"Error parsing PDF: {str(e)}")
+# Characters of document text sent to the model
+MAX_PROMPT_CHARS = 15000
 
-def parse_docx(file):
-    try:
-        doc = docx.Document(file)
-        return "\n".join(p.text for p in doc.paragraphs).strip()
-    except Exception as e:
-        raise ValueError(f"Error parsing DOCX: {str(e)}")
+# Bump whenever create_quiz_prompt changes so cached responses are not reused
+QUIZ_PROMPT_VERSION = 2
 
-def parse_pptx(file):
-    if not PPTX_AVAILABLE:
-        raise ValueError("PPTX support not available. Please install python-pptx.")
-    try:
-        ppt = Presentation(file)
-        return "\n".join(
-            shape.text
-            for slide in ppt.slides
-            for shape in slide.shapes
-            if hasattr(shape, "text")
-        ).strip()
-    except Exception as e:
-        raise ValueError(f"Error parsing PPTX: {str(e)}")
+QUESTION_TYPES = ['multiple_choice', 'true_false', 'fill_in_blank', 'descriptive']
+
+# Field list for prompts that do not spell out the full JSON example
+QUIZ_FIELDS_DESCRIPTION = (
+    "Each item must include: 'question_text' (string), "
+    "'question_type' (one of multiple_choice, true_false, fill_in_blank, descriptive), "
+    "'options' (array, empty for non-multiple-choice), 'correct_answer' (string), "
+    "'explanation' (string), 'topic' (string), 'difficulty' (easy|medium|hard)."
+)
+
+def select_prompt_text(documents, budget=MAX_PROMPT_CHARS):
+    """Pick the most informative cleaned sections of ``documents`` for the prompt.
 
-def generate_quiz_with_gemini(text, num_questions=5, difficulty='medium', question_types=['multiple_choice'], topic='', document_text=''):
+    ``documents`` is a single text or a list of per-file texts; each file gets
+    a fair share of the budget.
+    """
+    if isinstance(documents, str):
+        documents = [documents]
+    return select_relevant_text(documents, budget, normalize=clean_text)
+
+def generate_quiz_with_gemini(text, num_questions=5, difficulty='medium', question_types=['multiple_choice'], topic='', document_text='', use_cache=True, on_question=None, on_batch=None):
+    # ``text`` may be one document or a list of per-file texts; pass
+    # ``use_cache=False`` to skip the response cache and get fresh questions.
+    # ``on_question(question, index)`` is called for each final question as
+    # soon as it is available; single-batch requests stream the model output.
+    # ``on_batch()`` follows each group of questions that arrived together
     # Handle both single quiz_type and list of question_types for backward compatibility
     if isinstance(question_types, str):
         quiz_type = question_types
@@ -65,60 +53,139 @@ def generate_quiz_with_gemini(text, num_questions=5, difficulty='medium', questi
         quiz_type = question_types[0]
     else:
         quiz_type = 'mixed'  # Use mixed when multiple types are selected
-    
-    max_retries = 3
+
+    print(f"DEBUG: Selecting relevant text...")
+    cleaned_text = select_prompt_text(text)
+    original_length = len(text) if isinstance(text, str) else sum(len(t) for t in text)
+    print(f"DEBUG: Original text length: {original_length}, selected length: {len(cleaned_text)}")
+
+    provider = get_provider()
+    print(f"DEBUG: Using LLM provider {provider.name} ({provider.model_name})")
+    cache_key = quiz_response_cache.make_key(
+        cleaned_text, num_questions, difficulty, question_types, provider.model_name, QUIZ_PROMPT_VERSION
+    )
+    if use_cache:
+        cached_quiz = quiz_response_cache.get(cache_key)
+        if cached_quiz is None and quiz_response_cache.enabled and generation_flights.enabled:
+            # Identical requests already generating in any worker share one
+            # model call; each caller still builds its own Quiz from the result
+            cached_quiz, led = generation_flights.run(
+                cache_key,
+                lambda: _generate_quiz(
+                    text, cleaned_text, original_length, provider, cache_key,
+                    num_questions, difficulty, question_types, quiz_type, on_question, on_batch,
+                ),
+                lambda: quiz_response_cache.get(cache_key, record_miss=False),
+            )
+            if led:
+                return cached_quiz
+        if cached_quiz is not None:
+            if on_question:
+                for index, question in enumerate(cached_quiz['quiz']):
+                    on_question(question, index)
+                if on_batch:
+                    on_batch()
+            return cached_quiz
+
+    return _generate_quiz(
+        text, cleaned_text, original_length, provider, cache_key,
+        num_questions, difficulty, question_types, quiz_type, on_question, on_batch,
+    )
+
+def _generate_quiz(text, cleaned_text, original_length, provider, cache_key, num_questions, difficulty, question_types, quiz_type, on_question, on_batch=None):
+    """Generate a quiz with the model and store it under ``cache_key``"""
+    # Documents far beyond the prompt budget are uploaded once as a provider
+    # cached context; prompts then reference it instead of carrying text
+    prompt_text = cleaned_text
+    if context_handles.applies_to(provider, original_length):
+        texts = [text] if isinstance(text, str) else text
+        full_text = "\n\n".join(clean_text(t, max_chars=None) for t in texts)
+        handle = context_handles.get_or_create(provider, full_text)
+        if handle:
+            provider = ContextCachedProvider(provider, handle, cleaned_text, on_missing=context_handles.invalidate)
+            prompt_text = CONTEXT_PLACEHOLDER
+
+    # Follow-up generations from the same document prompt from its cached
+    # digest; earlier ones use the full text while the digest is built
+    if prompt_text is cleaned_text and document_digests.applies_to(cleaned_text):
+        digest = document_digests.get_or_schedule(provider, cleaned_text)
+        if digest:
+            print(f"DEBUG: Generating from document digest ({len(digest)} of {len(cleaned_text)} chars)")
+            prompt_text = digest
+
+    types_list = question_types if isinstance(question_types, list) else None
+    fanout_min = getattr(settings, 'QUIZ_FANOUT_MIN_QUESTIONS', 20)
+    if fanout_min and num_questions >= fanout_min:
+        validated_quiz = generate_quiz_fanout(
+            provider, prompt_text, num_questions, difficulty, quiz_type, types_list
+        )
+        if on_question:
+            for index, question in enumerate(validated_quiz['quiz']):
+                on_question(question, index)
+            if on_batch:
+                on_batch()
+    elif on_question:
+        validated_quiz = stream_quiz(
+            provider, prompt_text, num_questions, difficulty, quiz_type, types_list, on_question,
+            minimal_text=select_prompt_text(text, 6000), on_batch=on_batch,
+        )
+    else:
+        validated_quiz = request_quiz(
+            provider, prompt_text, num_questions, difficulty, quiz_type, types_list,
+            minimal_text=select_prompt_text(text, 6000),
+        )
+    # A fresh generation still refreshes the cache for later requests
+    quiz_response_cache.set(cache_key, validated_quiz, provider.model_name, QUIZ_PROMPT_VERSION)
+    return validated_quiz
+
+def request_quiz(provider, prompt_text, num_questions, difficulty, quiz_type, question_types_list=None, minimal_text=None, max_retries=3, top_up=True, exclude_questions=None):
+    """One prompt to the model with retries; returns validated quiz data.
+
+    When the response yields fewer questions than asked for (usually a
+    truncated answer), only the missing count is requested again.
+    """
     retry_count = 0
     attempted_minimal_prompt = False
-    
+    if minimal_text is None:
+        minimal_text = prompt_text[:6000]
+    # A slow or failing primary model is hedged with the fallback model
+    fallback = fallback_provider_for(provider)
+    schema = quiz_response_schema(num_questions, difficulty, quiz_type, question_types_list)
+
+    def accept(content):
+        print(f"DEBUG: Response content length: {len(content)}")
+        print(f"DEBUG: Response preview: {content[:200]}...")
+        return validate_quiz_data(extract_json_from_response(content), num_questions, quiz_type)
+
     while retry_count < max_retries:
         try:
             print(f"DEBUG: Attempt {retry_count + 1} of {max_retries}")
-            print(f"DEBUG: Checking Gemini API key...")
-            if not settings.GOOGLE_GEMINI_API_KEY:
-                raise ValueError("Google Gemini API key not configured in environment")
-            print(f"DEBUG: API key found: {settings.GOOGLE_GEMINI_API_KEY[:10]}...")
-            
-            # Configure Gemini
-            genai.configure(api_key=settings.GOOGLE_GEMINI_API_KEY)
-
-            print(f"DEBUG: Cleaning text...")
-            cleaned_text = clean_text(text)
-            print(f"DEBUG: Original text length: {len(text)}, cleaned length: {len(cleaned_text)}")
-            if len(cleaned_text) > 15000:
-                cleaned_text = cleaned_text[:15000] + "..."
-                print(f"DEBUG: Text truncated to 15000 characters")
-
             print(f"DEBUG: Creating prompt...")
-            prompt = create_quiz_prompt(cleaned_text, num_questions, difficulty, quiz_type, question_types if isinstance(question_types, list) else None)
-            print(f"DEBUG: Prompt length: {len(prompt)}")
-
-            print(f"DEBUG: Initializing Gemini model...")
-            model = genai.GenerativeModel('gemini-2.5-pro')
-            print(f"DEBUG: Model initialized successfully")
-
-            print(f"DEBUG: Generating content with Gemini...")
-            response = model.generate_content(
-                prompt,
-                generation_config=genai.types.GenerationConfig(
-                    temperature=0.5,
-                    max_output_tokens=4096,
-                )
-            )
-            print(f"DEBUG: Gemini response received")
-
-            content = response.text
-            print(f"DEBUG: Response content length: {len(content)}")
-            print(f"DEBUG: Response preview: {content[:200]}...")
+            prompts = {
+                mode: create_quiz_prompt(prompt_text, num_questions, difficulty, quiz_type, question_types_list, exclude_questions, structured=mode)
+                for mode in {structured_mode(p) for p in (provider, fallback) if p is not None}
+            }
+            print(f"DEBUG: Prompt length: {len(prompts[structured_mode(provider)])}")
 
-            print(f"DEBUG: Extracting JSON from response...")
-            quiz_data = extract_json_from_response(content)
-            print(f"DEBUG: JSON extracted successfully")
-
-            print(f"DEBUG: Validating quiz data...")
-            validated_quiz = validate_quiz_data(quiz_data, num_questions, quiz_type)
+            print(f"DEBUG: Generating content with {provider.name}...")
+            validated_quiz = hedged_call(
+                provider, fallback,
+                lambda p: p.generate(
+                    prompts[structured_mode(p)], temperature=0.5, max_output_tokens=4096,
+                    response_schema=schema if structured_mode(p) else None,
+                ),
+                accept,
+            )
             print(f"DEBUG: Quiz data validated successfully")
+            if top_up and len(validated_quiz['quiz']) < num_questions:
+                validated_quiz = top_up_quiz(
+                    provider, validated_quiz, prompt_text, num_questions, difficulty, quiz_type, question_types_list
+                )
             return validated_quiz
             
+        except (RateLimitExceeded, CircuitOpenError):
+            # Waiting longer than the limiter or breaker allows would defeat them
+            raise
         except Exception as e:
             retry_count += 1
             print(f"DEBUG: Error in generate_quiz_with_openai (attempt {retry_count}): {str(e)}")
@@ -130,23 +197,17 @@ def generate_quiz_with_gemini(text, num_questions=5, difficulty='medium', questi
                     attempted_minimal_prompt = True
                     minimal_prompt = (
                         "Return ONLY valid JSON with key 'quiz' as an array of exactly "
-                        f"{num_questions} items. Each item must include: 'question_text' (string), "
-                        "'question_type' (one of multiple_choice, true_false, fill_in_blank, descriptive), "
-                        "'options' (array, empty for non-multiple-choice), 'correct_answer' (string), "
-                        "'explanation' (string), 'topic' (string), 'difficulty' (easy|medium|hard).\n\n"
-                        "Base the questions on this content:\n" + clean_text(text)[:6000]
+                        f"{num_questions} items. {QUIZ_FIELDS_DESCRIPTION}\n\n"
+                        "Base the questions on this content:\n" + minimal_text
                     )
-                    model = genai.GenerativeModel('gemini-2.5-pro')
-                    response = model.generate_content(
-                        minimal_prompt,
-                        generation_config=genai.types.GenerationConfig(
-                            temperature=0.3,
-                            max_output_tokens=2048,
-                        )
+                    validated_quiz = hedged_call(
+                        provider, fallback,
+                        lambda p: p.generate(
+                            minimal_prompt, temperature=0.3, max_output_tokens=2048,
+                            response_schema=schema if structured_mode(p) else None,
+                        ),
+                        accept,
                     )
-                    content = response.text
-                    quiz_data = extract_json_from_response(content)
-                    validated_quiz = validate_quiz_data(quiz_data, num_questions, quiz_type)
                     print("DEBUG: Minimal prompt succeeded")
                     return validated_quiz
                 except Exception as me:
@@ -179,7 +240,244 @@ def generate_quiz_with_gemini(text, num_questions=5, difficulty='medium', questi
     print(f"DEBUG: All attempts failed, no fallback available")
     raise Exception("Failed to generate quiz with Google Gemini after all retry attempts. Please try again later. [SERVICE_UNAVAILABLE]")
 
-def create_quiz_prompt(text, num_questions, difficulty, quiz_type, question_types_list=None):
+def validate_question(question, quiz_type):
+    """Validate one streamed question; returns None if it is unusable"""
+    try:
+        return validate_quiz_data({'quiz': [question]}, 1, quiz_type)['quiz'][0]
+    except ValueError:
+        return None
+
+def stream_quiz(provider, prompt_text, num_questions, difficulty, quiz_type, question_types_list, on_question, minimal_text=None, on_batch=None):
+    """Stream the model output and hand each question to ``on_question`` once complete.
+
+    ``on_batch()`` is called after every chunk that completed a question,
+    so callers can write a chunk's questions together. A stream that breaks
+    after some questions is topped up for the missing count; one that
+    produced nothing falls back to ``request_quiz`` with its usual retries.
+    """
+    emitted = []
+    seen = set()
+
+    def end_batch(emitted_before):
+        if on_batch and len(emitted) > emitted_before:
+            on_batch()
+
+    def emit(question):
+        fingerprint = _question_fingerprint(question)
+        if fingerprint in seen or len(emitted) >= num_questions:
+            return
+        seen.add(fingerprint)
+        emitted.append(question)
+        on_question(question, len(emitted) - 1)
+
+    parser = QuizStreamParser()
+
+    def consume(stream_provider):
+        print(f"DEBUG: Streaming content with {stream_provider.name} ({stream_provider.model_name})...")
+        structured = structured_mode(stream_provider)
+        prompt = create_quiz_prompt(prompt_text, num_questions, difficulty, quiz_type, question_types_list, structured=structured)
+        schema = quiz_response_schema(num_questions, difficulty, quiz_type, question_types_list) if structured else None
+        for chunk in stream_provider.generate_stream(prompt, temperature=0.5, max_output_tokens=4096, response_schema=schema):
+            emitted_before = len(emitted)
+            for raw in parser.feed(chunk):
+                question = validate_question(raw, quiz_type)
+                if question:
+                    emit(question)
+            end_batch(emitted_before)
+
+    try:
+        # A stream cannot be raced question by question, so an open circuit
+        # switches it to the fallback model up front instead
+        call_with_breaker(select_provider(provider, fallback_provider_for(provider)), consume)
+        if not emitted:
+            # Complete output that did not look like a streamed quiz array
+            for question in validate_quiz_data(extract_json_from_response(parser.text), num_questions, quiz_type)['quiz']:
+                emit(question)
+            end_batch(0)
+    except (RateLimitExceeded, CircuitOpenError):
+        raise
+    except Exception as e:
+        print(f"DEBUG: Streaming stopped after {len(emitted)} question(s): {e}")
+        if 'Content blocked' in str(e) or 'safety' in str(e).lower():
+            raise
+
+    if not emitted:
+        fallback = request_quiz(
+            provider, prompt_text, num_questions, difficulty, quiz_type, question_types_list,
+            minimal_text=minimal_text,
+        )
+        for question in fallback['quiz']:
+            emit(question)
+        end_batch(0)
+    elif len(emitted) < num_questions:
+        topped_up = top_up_quiz(
+            provider, {'quiz': list(emitted)}, prompt_text, num_questions, difficulty, quiz_type, question_types_list
+        )
+        emitted_before = len(emitted)
+        for question in topped_up['quiz'][len(emitted):]:
+            emit(question)
+        end_batch(emitted_before)
+    print(f"DEBUG: Streamed {len(emitted)} of {num_questions} questions")
+    return {'quiz': list(emitted)}
+
+def top_up_quiz(provider, quiz_data, prompt_text, num_questions, difficulty, quiz_type, question_types_list=None):
+    """Request just the questions missing from ``quiz_data``; keep the partial quiz on failure"""
+    missing = num_questions - len(quiz_data['quiz'])
+    print(f"DEBUG: Topping up {missing} missing question(s)")
+    try:
+        extra = request_quiz(
+            provider, prompt_text, missing, difficulty, quiz_type, question_types_list,
+            max_retries=1, top_up=False,
+            exclude_questions=[q['question_text'] for q in quiz_data['quiz']],
+        )
+    except Exception as e:
+        print(f"DEBUG: Top-up failed, keeping {len(quiz_data['quiz'])} question(s): {e}")
+        return quiz_data
+    return merge_quiz_batches([quiz_data, extra], num_questions)
+
+def split_question_counts(num_questions, per_request):
+    """Spread ``num_questions`` as evenly as possible over batches of at most ``per_request``"""
+    batches = max(1, -(-num_questions // per_request))
+    base, extra = divmod(num_questions, batches)
+    return [base + (1 if i < extra else 0) for i in range(batches)]
+
+def chunk_prompt_text(prompt_text, parts):
+    """Split selected prompt text into ``parts`` contiguous chunks of whole sections"""
+    sections = [s for s in prompt_text.split('\n\n') if s.strip()] or [prompt_text]
+    if len(sections) < parts:
+        # Too few sections to give every batch its own; batches share them round-robin
+        return [sections[i % len(sections)] for i in range(parts)]
+    target = sum(len(s) for s in sections) / parts
+    chunks = []
+    current = []
+    size = 0
+    for index, section in enumerate(sections):
+        current.append(section)
+        size += len(section)
+        sections_left = len(sections) - index - 1
+        parts_left = parts - len(chunks) - 1
+        # Close the chunk at its share of the text, or when every remaining
+        # chunk needs one of the remaining sections
+        if parts_left and (size >= target or sections_left == parts_left):
+            chunks.append(current)
+            current = []
+            size = 0
+    chunks.append(current)
+    return ['\n\n'.join(c) for c in chunks]
+
+def _question_fingerprint(question):
+    return ' '.join(re.sub(r'[^\w\s]', ' ', question['question_text'].lower()).split())
+
+def merge_quiz_batches(batches, num_questions):
+    """Concatenate batch results in order, dropping duplicate questions"""
+    merged = []
+    seen = set()
+    for batch in batches:
+        for question in batch.get('quiz', []):
+            fingerprint = _question_fingerprint(question)
+            if fingerprint in seen:
+                continue
+            seen.add(fingerprint)
+            merged.append(question)
+    return {'quiz': merged[:num_questions]}
+
+def _request_batch(*args):
+    try:
+        return request_quiz(*args)
+    finally:
+        # Fan-out threads may touch the database (rate limiter); release their connection
+        connection.close()
+
+def generate_quiz_fanout(provider, prompt_text, num_questions, difficulty, quiz_type, question_types_list=None):
+    """Generate a large quiz as concurrent smaller requests over different chunks.
+
+    Each batch asks for at most QUIZ_FANOUT_BATCH_SIZE questions about its own
+    slice of the document, so responses stay well inside the output token
+    limit and latency tracks the slowest batch. Failed batches are dropped as
+    long as at least one succeeds.
+    """
+    counts = split_question_counts(num_questions, getattr(settings, 'QUIZ_FANOUT_BATCH_SIZE', 10))
+    if prompt_text == CONTEXT_PLACEHOLDER:
+        # Every batch sees the whole cached document; steer each to its own part
+        chunks = [
+            f"{CONTEXT_PLACEHOLDER}\nWrite these questions about part {i + 1} of {len(counts)} of the material."
+            for i in range(len(counts))
+        ]
+    else:
+        chunks = chunk_prompt_text(prompt_text, len(counts))
+    workers = min(len(counts), getattr(settings, 'QUIZ_FANOUT_CONCURRENCY', 4))
+    print(f"DEBUG: Fanning out {num_questions} questions as {counts} over {workers} worker(s)")
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='quiz-fanout') as pool:
+        futures = [
+            pool.submit(_request_batch, provider, chunk, count, difficulty, quiz_type, question_types_list)
+            for chunk, count in zip(chunks, counts)
+        ]
+        batches = []
+        errors = []
+        for index, future in enumerate(futures):
+            try:
+                batches.append(future.result())
+            except Exception as e:
+                print(f"DEBUG: Fan-out batch {index + 1} failed: {e}")
+                errors.append(e)
+
+    if not batches:
+        raise errors[0]
+    merged = merge_quiz_batches(batches, num_questions)
+    print(f"DEBUG: Merged {len(merged['quiz'])} of {num_questions} questions from {len(batches)} batch(es)")
+    return merged
+
+def fallback_provider_for(provider):
+    """The hedging fallback for ``provider``; it gets inline text when the primary uses a cached context"""
+    fallback = get_fallback_provider()
+    if fallback is not None and isinstance(provider, ContextCachedProvider):
+        # Cached contexts belong to one model
+        return ContextCachedProvider(fallback, None, provider.inline_text)
+    return fallback
+
+def structured_mode(provider):
+    """Whether calls to ``provider`` use schema-constrained output (LLM_STRUCTURED_OUTPUT)"""
+    return bool(
+        provider is not None
+        and provider.supports_response_schema
+        and getattr(settings, 'LLM_STRUCTURED_OUTPUT', True)
+    )
+
+def quiz_response_schema(num_questions, difficulty, quiz_type, question_types_list=None):
+    """Response schema matching the question dicts ``validate_quiz_data`` produces.
+
+    Uses the OpenAPI subset Gemini's ``response_schema`` accepts, with the
+    question types and difficulty narrowed to what was requested.
+    """
+    if quiz_type == 'mixed':
+        types = [t for t in question_types_list or [] if t in QUESTION_TYPES] or QUESTION_TYPES
+    else:
+        types = [quiz_type] if quiz_type in QUESTION_TYPES else QUESTION_TYPES
+    question = {
+        'type': 'object',
+        'properties': {
+            'question_text': {'type': 'string'},
+            'question_type': {'type': 'string', 'format': 'enum', 'enum': types},
+            'options': {'type': 'array', 'items': {'type': 'string'}},
+            'correct_answer': {'type': 'string'},
+            'explanation': {'type': 'string'},
+            'topic': {'type': 'string'},
+            'difficulty': {'type': 'string', 'format': 'enum', 'enum': [difficulty]},
+        },
+        'required': ['question_text', 'question_type', 'options', 'correct_answer', 'explanation', 'topic', 'difficulty'],
+    }
+    return {
+        'type': 'object',
+        'properties': {
+            'quiz': {'type': 'array', 'items': question, 'min_items': num_questions, 'max_items': num_questions},
+        },
+        'required': ['quiz'],
+    }
+
+def create_quiz_prompt(text, num_questions, difficulty, quiz_type, question_types_list=None, exclude_questions=None, structured=False):
+        # ``structured`` prompts leave the output format to the response
+        # schema and only name the fields
         diff_map = {
                 'easy': 'basic understanding questions suitable for beginners',
                 'medium': 'conceptual questions requiring moderate understanding',
@@ -206,6 +504,21 @@ def create_quiz_prompt(text, num_questions, difficulty, quiz_type, question_type
         else:
             quiz_type_description = type_map.get(quiz_type, type_map['mixed'])
 
+        if structured:
+            return _with_exclusions(f"""
+You are an educational AI assistant helping to create practice questions for students. Based on the provided educational material, create exactly {num_questions} {diff_map[difficulty]} questions of type {quiz_type_description}.
+
+IMPORTANT:
+- For fill-in-the-blank, use ___ in the question text for the blank, and provide the correct answer in the 'correct_answer' field.
+- For mixed type, distribute question types evenly across the requested types.
+- Respond with a JSON object whose 'quiz' array holds the questions. {QUIZ_FIELDS_DESCRIPTION}
+
+Educational material to base questions on:
+{text}
+
+Remember: Create questions that are educational, clear, and appropriate for academic learning.
+""", exclude_questions)
+
         prompt = f"""
 You are an educational AI assistant helping to create practice questions for students. Based on the provided educational material, create exactly {num_questions} {diff_map[difficulty]} questions of type {quiz_type_description}.
 
@@ -233,49 +546,92 @@ Educational material to base questions on:
 
 Remember: Create questions that are educational, clear, and appropriate for academic learning.
 """
+        return _with_exclusions(prompt, exclude_questions)
 
-        return prompt
+def _with_exclusions(prompt, exclude_questions):
+    if exclude_questions:
+        prompt += "\nThese questions already exist; do not repeat them:\n" + "\n".join(f"- {q}" for q in exclude_questions) + "\n"
+    return prompt
+
+# Typographic characters PDFs commonly emit, folded to their ASCII forms
+_TYPOGRAPHIC_FOLDS = (
+    ('\u2018', "'"), ('\u2019', "'"), ('\u201a', "'"), ('\u2032', "'"),
+    ('\u201c', '"'), ('\u201d', '"'), ('\u201e', '"'), ('\u2033', '"'),
+    ('\u2010', '-'), ('\u2011', '-'), ('\u2012', '-'), ('\u2013', '-'), ('\u2014', '-'), ('\u2212', '-'),
+    ('\u2026', '.'),
+)
+_KEEP_PUNCTUATION = '.,?!;:-()"\'&=+*/<>[]'
+# ASCII input goes through str.translate's fast path; anything else keeps
+# Unicode letters and digits via the equivalent character-class regex
+_ASCII_CLEAN_TABLE = str.maketrans('', '', ''.join(
+    chr(c) for c in range(128)
+    if not (chr(c).isalnum() or chr(c).isspace() or chr(c) == '_' or chr(c) in _KEEP_PUNCTUATION)
+))
+_DISALLOWED_CHARS_RE = re.compile(r'[^\w\s' + re.escape(_KEEP_PUNCTUATION) + r']+')
+_REPEATED_PUNCTUATION_RE = re.compile(r'([!?.])\1+')
+MIN_LINE_CHARS = 15
+
+def _is_noise_line(line):
+    """Short lines are headers, page numbers and bullets unless they close a sentence"""
+    if len(line) >= MIN_LINE_CHARS:
+        return False
+    return not (line[-1] in '.!?:;' or line[0].islower())
+
+def clean_text(text, max_chars=MAX_PROMPT_CHARS):
+    """Normalize extracted document text for prompting in linear time.
+
+    Unwanted characters are removed in a single pass, short noise lines are
+    dropped before line breaks are collapsed, and the result is cut at the
+    last sentence boundary that fits in ``max_chars`` (pass ``None`` to keep
+    everything).
+    """
+    if text.isascii():
+        text = text.translate(_ASCII_CLEAN_TABLE)
+    else:
+        for typographic, ascii_char in _TYPOGRAPHIC_FOLDS:
+            text = text.replace(typographic, ascii_char)
+        text = _DISALLOWED_CHARS_RE.sub('', text)
 
-def clean_text(text):
-    # Remove multiple whitespaces, keep punctuation
-    text = re.sub(r'\s+', ' ', text)
-    
-    # Remove potentially problematic characters but keep educational content
-    text = re.sub(r'[^\w\s\.\,\?\!\;\:\-\(\)\"\'\&\=\+\-\*\/\<\>\[\]]', '', text)
-    
     # Remove very short lines that might contain noise
-    lines = [line.strip() for line in text.split('\n') if len(line.strip()) > 15]
-    
-    # Join lines and clean up
-    cleaned = ' '.join(lines).strip()
-    
+    lines = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line and not _is_noise_line(line):
+            lines.append(line)
+
+    # Join lines and collapse whitespace runs
+    cleaned = ' '.join(' '.join(lines).split())
+
     # Remove excessive punctuation
-    cleaned = re.sub(r'[!]{2,}', '!', cleaned)
-    cleaned = re.sub(r'[?]{2,}', '?', cleaned)
-    cleaned = re.sub(r'[.]{2,}', '.', cleaned)
-    
-    # Ensure the text is not too long
-    if len(cleaned) > 15000:
-        # Try to find a good breaking point
-        sentences = cleaned.split('.')
-        truncated = ''
-        for sentence in sentences:
-            if len(truncated + sentence + '.') <= 15000:
-                truncated += sentence + '.'
-            else:
-                break
-        cleaned = truncated.strip()
-    
+    cleaned = _REPEATED_PUNCTUATION_RE.sub(r'\1', cleaned)
+
+    # Ensure the text is not too long, breaking after the last full sentence
+    if max_chars is not None and len(cleaned) > max_chars:
+        cut = cleaned.rfind('.', 0, max_chars)
+        if cut <= 0:
+            cut = cleaned.rfind(' ', 0, max_chars)
+        cleaned = cleaned[:cut + 1 if cut > 0 else max_chars].strip()
+
     return cleaned
 
 def extract_json_from_response(content):
     try:
         return json.loads(content)
     except json.JSONDecodeError:
-        match = re.search(r'\{[\s\S]*\}', content, re.DOTALL)
-        if match:
-            return json.loads(match.group(0))
-        raise ValueError("No valid JSON found in Gemini response")
+        pass
+    # Prose or code fences around the object: decode from the first brace
+    start = content.find('{')
+    if start != -1:
+        try:
+            return json.JSONDecoder().raw_decode(content, start)[0]
+        except json.JSONDecodeError:
+            pass
+    # Truncated or lightly malformed: keep every complete question
+    questions = salvage_quiz_questions(content)
+    if questions:
+        print(f"DEBUG: Salvaged {len(questions)} complete question(s) from malformed response")
+        return {'quiz': questions}
+    raise ValueError("No valid JSON found in Gemini response")
 
 def validate_quiz_data(quiz_data, expected_questions, quiz_type):
     if not isinstance(quiz_data, dict) or 'quiz' not in quiz_data:
@@ -1,19 +1,35 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
-from .models import Quiz, Question, QuizAttempt
-from .utils import parse_document, generate_quiz_with_gemini
+from .models import Quiz, Question, QuizAttempt, GenerationJob, ParsedDocument, CachedQuizResponse
 from .models import UserQuizAnalytics
-from django.db import models
+from .jobs import create_job, submit_job, refresh_job_status, run_quiz_generation, describe_generation_error
+from .document_cache import parsed_text_cache
+from .response_cache import quiz_response_cache
+from .rate_limit import llm_rate_limiter
+from .circuit_breaker import breaker_stats
+from .digest import document_digests
+from .context_cache import context_handles
+from .single_flight import generation_flights
+from .idempotency import idempotent
+from .answer_key import answer_keys
+from .grading import question_matchers
+from .analytics_cache import analytics_responses
+from . import answer_facts
+from .models import AttemptAnswer
+from django.db import models, transaction
+from django.db.models.functions import Length
 from django.conf import settings
 import os
 
 class QuizGenerateView(APIView):
     permission_classes = [IsAuthenticated]
 
+    # A retried upload replays the first job instead of queueing another generation
+    @idempotent
     def post(self, request):
         try:
             print(f"DEBUG: Starting quiz generation")
@@ -43,105 +59,134 @@ class QuizGenerateView(APIView):
             time_limit = request.data.get('time_limit')
             if time_limit:
                 time_limit = int(time_limit)
+            # Opt out of the response cache to get a new set of questions
+            fresh = str(request.data.get('fresh', '')).lower() in ('1', 'true', 'yes')
             
             print(f"DEBUG: Quiz parameters - title: {title}, num_questions: {num_questions}, difficulty: {difficulty}, quiz_type: {quiz_type}, time_limit: {time_limit}")
 
-            # Save files to media for later download/reference and parse
-            combined_text_parts = []
+            # Save files to media for later download/reference; parsing happens in the job
+            uploads = []
             saved_file_urls = []
             for f in files:
                 # Save to media/quiz_uploads/<quiz_id>/incoming
                 upload_dir = os.path.join(settings.MEDIA_ROOT, 'quiz_uploads', 'incoming')
                 os.makedirs(upload_dir, exist_ok=True)
                 save_path = os.path.join(upload_dir, f.name)
-                # Read bytes once
+                # Read bytes once; the upload is closed when the request ends
                 file_bytes = f.read()
                 with open(save_path, 'wb+') as destination:
                     destination.write(file_bytes)
                 saved_file_urls.append(os.path.join(settings.MEDIA_URL, 'quiz_uploads', 'incoming', f.name))
+                uploads.append((f.name, file_bytes))
+
+            job = create_job(request.user, 'quiz', {
+                'title': title,
+                'num_questions': num_questions,
+                'difficulty': difficulty,
+                'quiz_type': quiz_type,
+                'time_limit': time_limit,
+                'documents': saved_file_urls,
+                'fresh': fresh,
+            })
+            submit_job(job, run_quiz_generation, uploads)
+            print(f"DEBUG: Queued generation job {job.id}")
 
-                # Reset pointer for parsing
-                try:
-                    f.seek(0)
-                except Exception:
-                    pass
-                parsed = parse_document(f)
-                print(f"DEBUG: Parsed text length for {f.name}: {len(parsed)}")
-                if parsed:
-                    combined_text_parts.append(parsed)
-            text = "\n\n".join(combined_text_parts)
-            print(f"DEBUG: Combined parsed text length: {len(text)} from {len(files)} file(s)")
-            if len(text.strip()) < 100:
-                return Response({'error': 'Document content too short'}, status=status.HTTP_400_BAD_REQUEST)
-
-            quiz_data = generate_quiz_with_gemini(text, num_questions, difficulty, quiz_type)
-            if not quiz_data or not isinstance(quiz_data, dict) or 'quiz' not in quiz_data:
-                print(f"DEBUG: Invalid quiz_data returned: {quiz_data}")
-                return Response({'error': 'AI service returned no usable content. Please try again later.'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
-            print(f"DEBUG: Quiz data generated successfully: {len(quiz_data.get('quiz', []))} questions")
-
-            quiz = Quiz.objects.create(
-                user=request.user,
-                title=title,
-                difficulty=difficulty,
-                quiz_type=quiz_type,
-                time_limit=time_limit,
-                total_questions=len(quiz_data['quiz']),
-                source_document=files[0].name if len(files) == 1 else ', '.join([f.name for f in files[:3]]) + ("..." if len(files) > 3 else "")
-            )
-            print(f"DEBUG: Quiz created with ID: {quiz.id}")
-
-            created_questions = []
-            for i, q in enumerate(quiz_data['quiz']):
-                question = Question.objects.create(
-                    quiz=quiz,
-                    question_text=q['question_text'],
-                    question_type=q['question_type'],
-                    options=q['options'],
-                    correct_answer=q['correct_answer'],
-                    explanation=q.get('explanation', ''),
-                    topic=q.get('topic', 'General'),
-                    difficulty=q.get('difficulty', difficulty),
-                    order=i
-                )
-                created_questions.append(question)
-            print(f"DEBUG: Created {len(created_questions)} questions")
+            response_data = job.to_status_dict()
+            response_data['status_url'] = f"/api/quiz/generate/jobs/{job.id}/"
+            response_data['result_url'] = f"/api/quiz/generate/jobs/{job.id}/result/"
+            return Response(response_data, status=status.HTTP_202_ACCEPTED)
+
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            error_message, error_status = describe_generation_error(e)
+            return Response({'error': error_message}, status=error_status)
 
-            output_questions = [
+
+class GenerationJobStatusView(APIView):
+    """Job status; with ``?after=N`` also the quiz questions saved from index N on.
+
+    Clients poll with the returned ``next_after`` to show questions as they
+    are generated. Questions are read back from the database, so this works
+    whichever worker runs the job, and every poll returns immediately.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, job_id):
+        job = refresh_job_status(get_object_or_404(GenerationJob, id=job_id, user=request.user))
+        data = job.to_status_dict()
+        if 'after' in request.query_params and job.kind == 'quiz':
+            try:
+                after = max(int(request.query_params['after']), 0)
+            except ValueError:
+                return Response({'error': 'after must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+            questions = Question.objects.filter(quiz_id=job.quiz_id, order__gte=after).order_by('order') if job.quiz_id else []
+            data['questions'] = [
                 {
+                    "index": q.order,
                     "question_id": str(q.id),
                     "question_text": q.question_text,
                     "question_type": q.question_type,
                     "options": q.options,
                     "topic": q.topic,
-                    "difficulty": q.difficulty
+                    "difficulty": q.difficulty,
                 }
-                for q in created_questions
+                for q in questions
             ]
+            data['next_after'] = data['questions'][-1]['index'] + 1 if data['questions'] else after
+        return Response(data, status=status.HTTP_200_OK)
 
-            response_data = {
-                "quiz_id": str(quiz.id),
-                "title": quiz.title,
-                "questions": output_questions,
-                "documents": saved_file_urls
-            }
-            print(f"DEBUG: Returning response: {response_data}")
-            return Response(response_data, status=status.HTTP_201_CREATED)
 
-        except Exception as e:
-            import traceback
-            traceback.print_exc()
-            error_message = 'Failed to generate quiz. '
-            if 'Content blocked' in str(e):
-                error_message += 'The content was flagged by safety filters.'
-            elif 'SERVICE_UNAVAILABLE' in str(e) or 'No content in Gemini response' in str(e):
-                error_message += 'AI service temporarily unavailable.'
-                return Response({'error': error_message}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
-            elif 'No text content' in str(e):
-                error_message += 'AI service returned empty response.'
-            else:
-                error_message += 'Please try again later.'
-            return Response({'error': error_message}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+class GenerationJobResultView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, job_id):
+        job = refresh_job_status(get_object_or_404(GenerationJob, id=job_id, user=request.user))
+        if job.status == 'succeeded':
+            return Response(job.result, status=status.HTTP_200_OK)
+        if job.status == 'failed':
+            return Response({'error': job.error}, status=job.error_status or status.HTTP_500_INTERNAL_SERVER_ERROR)
+        # Still queued or running
+        return Response(job.to_status_dict(), status=status.HTTP_202_ACCEPTED)
+
+
+class CacheStatsView(APIView):
+    """Hit/miss counters for the generation caches (staff only)"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        db_stats = ParsedDocument.objects.aggregate(
+            entries=models.Count('id'),
+            total_hits=models.Sum('hit_count'),
+            boilerplate_chars=models.Sum('boilerplate_chars'),
+            text_chars=models.Sum(Length('text')),
+        )
+        response_db_stats = CachedQuizResponse.objects.aggregate(
+            entries=models.Count('id'),
+            total_hits=models.Sum('hit_count'),
+        )
+        return Response({
+            "parsed_text": {
+                "process": parsed_text_cache.stats(),
+                "db_entries": db_stats['entries'],
+                "db_total_hits": db_stats['total_hits'] or 0,
+                "db_boilerplate_chars_removed": db_stats['boilerplate_chars'] or 0,
+                "db_text_chars": db_stats['text_chars'] or 0,
+            },
+            "llm_rate_limiter": llm_rate_limiter.stats(),
+            "circuit_breakers": breaker_stats(),
+            "document_digests": document_digests.stats(),
+            "provider_contexts": context_handles.stats(),
+            "generation_coalescing": generation_flights.stats(),
+            "answer_keys": answer_keys.stats(),
+            "question_matchers": question_matchers.stats(),
+            "analytics_responses": analytics_responses.stats(),
+            "quiz_responses": {
+                "process": quiz_response_cache.stats(),
+                "db_entries": response_db_stats['entries'],
+                "db_total_hits": response_db_stats['total_hits'] or 0,
+            },
+        }, status=status.HTTP_200_OK)
 
 
 class QuizTakeView(APIView):
@@ -173,11 +218,13 @@ class QuizTakeView(APIView):
         }
         return Response(quiz_data, status=status.HTTP_200_OK)
 
+    # A retried submission replays the first result instead of recording another attempt
+    @idempotent
     def post(self, request, quiz_id):
         try:
             print(f"DEBUG: Starting quiz submission for quiz_id: {quiz_id}")
             quiz = get_object_or_404(Quiz, id=quiz_id)
-            questions = Question.objects.filter(quiz=quiz).order_by('order')
+            answer_key = answer_keys.get(quiz)
 
             user_answers = request.data.get("answers", {})
             if not user_answers or not isinstance(user_answers, dict):
@@ -187,62 +234,55 @@ class QuizTakeView(APIView):
             if not answered_questions:
                 return Response({"error": "Please answer at least one question before submitting."}, status=status.HTTP_400_BAD_REQUEST)
 
-            correct_count = 0
-            question_results = []
-            total_questions = questions.count()
-
-            # Process each question and create detailed results
-            for question in questions:
-                qid_str = str(question.id)
-                user_answer = user_answers.get(qid_str, None)
-                is_correct = False
-                
-                if user_answer is not None:
-                    if question.question_type in ['fill_in_blank', 'true_false']:
-                        is_correct = user_answer.strip().lower() == question.correct_answer.strip().lower()
-                    else:
-                        is_correct = user_answer == question.correct_answer
-                
-                if is_correct:
-                    correct_count += 1
-
-                # Create detailed question result
-                question_result = {
+            total_questions = len(answer_key)
+            correct_count, graded = answer_key.grade(user_answers)
+            question_results = [
+                {
                     "question_id": qid_str,
                     "is_correct": is_correct,
                     "points_earned": 1 if is_correct else 0,
                     "max_points": 1
                 }
-                question_results.append(question_result)
+                for qid_str, is_correct in graded
+            ]
 
             percentage = (correct_count / total_questions) * 100 if total_questions else 0.0
             passed = percentage >= 70  # Using 70% as pass threshold
 
-            # Create the quiz attempt with enhanced data
-            attempt = QuizAttempt.objects.create(
-                user=request.user,
-                quiz=quiz,
-                score=correct_count,
-                total_questions=total_questions,
-                percentage=percentage,
-                passed=passed,
-                pass_threshold=70.0,
-                is_completed=True,
-                completed_at=timezone.now(),
-                user_answers=user_answers,
-                question_results=question_results
-            )
+            # Optional {question_id: milliseconds} reported by the client
+            answer_times = request.data.get("answer_times")
+            if not isinstance(answer_times, dict):
+                answer_times = None
 
-            # Generate detailed results for question-by-question review
-            detailed_results = attempt.generate_detailed_results()
+            with transaction.atomic():
+                # Create the quiz attempt with enhanced data
+                attempt = QuizAttempt.objects.create(
+                    user=request.user,
+                    quiz=quiz,
+                    score=correct_count,
+                    total_questions=total_questions,
+                    percentage=percentage,
+                    passed=passed,
+                    pass_threshold=70.0,
+                    is_completed=True,
+                    completed_at=timezone.now(),
+                    user_answers=user_answers,
+                    question_results=question_results
+                )
+                # One fact row per graded answer, aggregated by the analytics view
+                answers = AttemptAnswer.objects.bulk_create(answer_facts.build_answers(attempt, answer_key, graded, answer_times))
+
+                # Update quiz statistics
+                quiz.total_attempts += 1
+                quiz.average_score = ((quiz.average_score * (quiz.total_attempts - 1)) + percentage) / quiz.total_attempts
+                quiz.save(update_fields=['total_attempts', 'average_score'])
 
-            # Update quiz statistics
-            quiz.total_attempts += 1
-            quiz.average_score = ((quiz.average_score * (quiz.total_attempts - 1)) + percentage) / quiz.total_attempts
-            quiz.save(update_fields=['total_attempts', 'average_score'])
+                # Counted in the user's analytics in the same transaction, so an
+                # attempt is never saved without its contribution (or vice versa)
+                UserQuizAnalytics.record_attempt(attempt, answers)
 
-            # Update user analytics
-            self._update_user_analytics(request.user)
+            # Generate detailed results for question-by-question review
+            detailed_results = attempt.generate_detailed_results()
 
             response_data = {
                 "attempt_id": str(attempt.id),
@@ -268,14 +308,6 @@ class QuizTakeView(APIView):
             traceback.print_exc()
             return Response({"error": f"Internal server error: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    def _update_user_analytics(self, user):
-        """Update user quiz analytics"""
-        try:
-            analytics, created = UserQuizAnalytics.objects.get_or_create(user=user)
-            analytics.update_analytics()
-        except Exception as e:
-            print(f"Error updating user analytics: {e}")
-
     def _get_performance_level(self, percentage):
         """Get performance level based on percentage"""
         if percentage >= 90:
@@ -384,7 +416,8 @@ class AttemptDetailView(APIView):
     def get(self, request, attempt_id):
         attempt = get_object_or_404(QuizAttempt, id=attempt_id, user=request.user)
         quiz = attempt.quiz
-        questions = Question.objects.filter(quiz=quiz).order_by('order')
+        answer_key = answer_keys.get(quiz)
+        results = {r.get('question_id'): r.get('is_correct') for r in attempt.question_results}
         return Response({
             "attempt": {
                 "attempt_id": str(attempt.id),
@@ -400,16 +433,16 @@ class AttemptDetailView(APIView):
             },
             "questions": [
                 {
-                    "question_id": str(q.id),
+                    "question_id": q.question_id,
                     "question_text": q.question_text,
                     "question_type": q.question_type,
-                    "options": q.options,
+                    "options": list(q.options),
                     "correct_answer": q.correct_answer,
                     "explanation": q.explanation,
-                    "user_answer": attempt.user_answers.get(str(q.id), ''),
-                    "is_correct": next((r.get('is_correct') for r in attempt.question_results if r.get('question_id') == str(q.id)), False),
+                    "user_answer": attempt.user_answers.get(q.question_id, ''),
+                    "is_correct": results.get(q.question_id) or False,
                 }
-                for q in questions
+                for q in answer_key
             ],
             "documents": ([
                 os.path.join(settings.MEDIA_URL, 'quiz_uploads', 'incoming', quiz.source_document)
@@ -443,10 +476,23 @@ class QuizAnalyticsView(APIView):
     def get(self, request):
         """Get comprehensive quiz analytics for the user"""
         try:
+            # Cached until the user completes another attempt. The version is
+            # read before any of the queries below, so an attempt recorded
+            # while this response is built leaves it stale, never current
+            response_data, version = analytics_responses.get(request.user.pk)
+            if response_data is not None:
+                return Response(response_data, status=status.HTTP_200_OK)
+
             # Get or create user analytics
             analytics, created = UserQuizAnalytics.objects.get_or_create(user=request.user)
-            if not created:
-                analytics.update_analytics()
+            rebuilt = False
+            if analytics.needs_rebuild:
+                # The rebuild bumps the version, so this response is stored
+                # stale and the next request builds it again from the new totals
+                analytics, rebuilt = UserQuizAnalytics.rebuild(request.user.pk, stale_only=True)
+            if not rebuilt:
+                # Totals are kept current per attempt; only the 30-day window moves with time
+                analytics.derive_statistics()
             
             # Get recent quiz attempts for trend analysis
             recent_attempts = QuizAttempt.objects.filter(
@@ -458,13 +504,13 @@ class QuizAnalyticsView(APIView):
             trend = self._calculate_trend(recent_attempts)
             
             # Get topic performance breakdown
-            topic_breakdown = self._get_topic_breakdown(request.user)
+            topic_breakdown = self._get_topic_breakdown(analytics)
             
             # Get difficulty performance breakdown
-            difficulty_breakdown = self._get_difficulty_breakdown(request.user)
+            difficulty_breakdown = self._get_difficulty_breakdown(analytics)
             
             # Get quiz type performance breakdown
-            quiz_type_breakdown = self._get_quiz_type_breakdown(request.user)
+            quiz_type_breakdown = self._get_quiz_type_breakdown(analytics)
             
             response_data = {
                 "overview": {
@@ -476,26 +522,8 @@ class QuizAnalyticsView(APIView):
                     "total_failed_quizzes": analytics.total_failed_quizzes,
                     "pass_rate": round((analytics.total_passed_quizzes / analytics.total_quizzes_taken * 100) if analytics.total_quizzes_taken > 0 else 0, 1)
                 },
-                "performance_by_difficulty": {
-                    "easy": {
-                        "quizzes_taken": analytics.easy_quizzes_taken,
-                        "accuracy": round(analytics.easy_accuracy, 1)
-                    },
-                    "medium": {
-                        "quizzes_taken": analytics.medium_quizzes_taken,
-                        "accuracy": round(analytics.medium_accuracy, 1)
-                    },
-                    "hard": {
-                        "quizzes_taken": analytics.hard_quizzes_taken,
-                        "accuracy": round(analytics.hard_accuracy, 1)
-                    }
-                },
-                "performance_by_type": {
-                    "multiple_choice": round(analytics.multiple_choice_accuracy, 1),
-                    "true_false": round(analytics.true_false_accuracy, 1),
-                    "fill_in_blank": round(analytics.fill_in_blank_accuracy, 1),
-                    "descriptive": round(analytics.descriptive_accuracy, 1)
-                },
+                "performance_by_difficulty": difficulty_breakdown,
+                "performance_by_type": quiz_type_breakdown,
                 "time_analytics": {
                     "average_time_per_question": round(analytics.average_time_per_question, 1),
                     "fastest_quiz_completion": analytics.fastest_quiz_completion,
@@ -508,12 +536,15 @@ class QuizAnalyticsView(APIView):
                 "trend": trend,
                 "topic_breakdown": topic_breakdown,
                 "difficulty_breakdown": difficulty_breakdown,
+                "question_difficulty_breakdown": self._get_question_difficulty_breakdown(request.user),
                 "quiz_type_breakdown": quiz_type_breakdown,
+                "weak_areas": answer_facts.weak_topics(request.user.pk),
                 "streaks": {
                     "current_streak": analytics.current_streak,
                     "longest_streak": analytics.longest_streak
                 }
             }
+            analytics_responses.set(request.user.pk, response_data, version)
             
             return Response(response_data, status=status.HTTP_200_OK)
             
@@ -544,14 +575,22 @@ class QuizAnalyticsView(APIView):
         else:
             return "stable"
 
-    def _get_topic_breakdown(self, user):
+    def _get_topic_breakdown(self, analytics):
         """Get performance breakdown by topic"""
-        analytics = UserQuizAnalytics.objects.get(user=user)
         return analytics.topic_performance
 
-    def _get_difficulty_breakdown(self, user):
+    def _get_question_difficulty_breakdown(self, user):
+        """Get answer accuracy by the difficulty of each question"""
+        return {
+            difficulty: {
+                "answered": stats["total"],
+                "accuracy": round(stats["accuracy"], 1)
+            }
+            for difficulty, stats in answer_facts.difficulty_breakdown(user.pk).items()
+        }
+
+    def _get_difficulty_breakdown(self, analytics):
         """Get performance breakdown by difficulty"""
-        analytics = UserQuizAnalytics.objects.get(user=user)
         return {
             "easy": {
                 "quizzes_taken": analytics.easy_quizzes_taken,
@@ -567,9 +606,8 @@ class QuizAnalyticsView(APIView):
             }
         }
 
-    def _get_quiz_type_breakdown(self, user):
+    def _get_quiz_type_breakdown(self, analytics):
         """Get performance breakdown by quiz type"""
-        analytics = UserQuizAnalytics.objects.get(user=user)
         return {
             "multiple_choice": round(analytics.multiple_choice_accuracy, 1),
             "true_false": round(analytics.true_false_accuracy, 1),
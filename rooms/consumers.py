@@ -2,6 +2,7 @@ import json
 from channels.generic.websocket import AsyncWebsocketConsumer
 from asgiref.sync import sync_to_async
 from .models import Room, RoomParticipant, RoomQuestion, ParticipantAnswer
+from quizzes.grading import question_matchers
 from django.contrib.auth.models import User
 from django.utils import timezone
 import asyncio
@@ -174,23 +175,17 @@ class RoomConsumer(AsyncWebsocketConsumer):
             participant = RoomParticipant.objects.get(room=room, user=self.user)
             question = RoomQuestion.objects.get(id=question_id, room=room)
             
-            # Check if answer is correct
-            is_correct = False
+            # Check if answer is correct; for fill in the blank, answer_index is the text answer
+            is_correct = question_matchers.get(question, question.correct_answers).matches(answer_index)
             points_earned = 0
             
-            if question.question_type == 'multiple_choice':
-                correct_answer = question.correct_answer
-                if answer_index is not None and answer_index == correct_answer:
-                    is_correct = True
-                    # Calculate points based on time (faster = more points)
-                    base_points = question.points
-                    time_bonus = max(0, (question.time_limit - time_taken) / question.time_limit * 0.5)
-                    points_earned = int(base_points * (1 + time_bonus))
-            elif question.question_type == 'fill_blank':
-                # For fill in the blank, answer_index would be the text answer
-                if str(answer_index).strip().lower() == question.correct_answer.strip().lower():
-                    is_correct = True
-                    points_earned = question.points
+            if is_correct and question.question_type == 'multiple_choice':
+                # Calculate points based on time (faster = more points)
+                base_points = question.points
+                time_bonus = max(0, (question.time_limit - time_taken) / question.time_limit * 0.5)
+                points_earned = int(base_points * (1 + time_bonus))
+            elif is_correct:
+                points_earned = question.points
             
             # Save the answer
             ParticipantAnswer.objects.update_or_create(
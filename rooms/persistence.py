@@ -0,0 +1,36 @@
+from quizzes.persistence import create_with_items
+
+from .models import Room, RoomQuestion
+
+# Room counterparts of quizzes.persistence: a room's questions are written
+# with one bulk_create, together with the room when it is created.
+
+
+def build_room_question(room, data, order):
+    """Unsaved ``RoomQuestion`` of ``room`` from validated ``RoomQuestion`` fields"""
+    return RoomQuestion(room=room, **{**data, 'order': order})
+
+
+def room_question_fields(item, points=1):
+    """``RoomQuestion`` fields for one generated quiz item"""
+    return {
+        'question_text': item['question_text'],
+        'question_type': item['question_type'],
+        'options': item.get('options', []),
+        'correct_answers': [item['correct_answer']],
+        'explanation': item.get('explanation', ''),
+        'points': points,
+    }
+
+
+def create_room_with_questions(questions_data, **room_fields):
+    """Create a room and all its questions atomically; returns ``(room, questions)``"""
+    return create_with_items(Room, RoomQuestion, questions_data, build_room_question, **room_fields)
+
+
+def create_room_questions(room, questions_data, start=0):
+    """Add ``questions_data`` to ``room`` in one write, numbered from ``start``"""
+    return RoomQuestion.objects.bulk_create([
+        build_room_question(room, data, start + index)
+        for index, data in enumerate(questions_data)
+    ])
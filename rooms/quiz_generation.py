@@ -3,12 +3,16 @@ from rest_framework import status, generics, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from quizzes.utils import parse_document, generate_quiz_with_gemini
+from django.shortcuts import get_object_or_404
+from quizzes.models import GenerationJob
+from quizzes.jobs import create_job, submit_job, refresh_job_status, GenerationError
+from quizzes.utils import generate_quiz_with_gemini
+from quizzes.document_cache import parse_document_bytes
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def generate_room_quiz(request):
-    """Generate quiz questions for room creation without saving to database"""
+    """Queue quiz question generation for room creation without saving to database"""
     try:
         print("DEBUG: Starting room quiz generation")
         print(f"DEBUG: Request data: {request.data}")
@@ -27,63 +31,106 @@ def generate_room_quiz(request):
         num_questions = int(request.data.get('num_questions', 5))
         difficulty = request.data.get('difficulty', 'medium')
         question_types = request.data.getlist('question_types') or ['multiple_choice']  # Get multiple types
+        fresh = str(request.data.get('fresh', '')).lower() in ('1', 'true', 'yes')
         
         print(f"DEBUG: Parameters - num_questions: {num_questions}, difficulty: {difficulty}, question_types: {question_types}")
         
-        # Parse document
-        parsed_text = parse_document(file)
-        print(f"DEBUG: Parsed text length: {len(parsed_text)} from {file.name}")
-        
-        if len(parsed_text.strip()) < 100:
-            return Response({'error': 'Document content too short to generate meaningful questions'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Generate quiz using AI with multiple question types
-        quiz_data = generate_quiz_with_gemini(parsed_text, num_questions, difficulty, question_types)
-        
-        if not quiz_data or not isinstance(quiz_data, dict) or 'quiz' not in quiz_data:
-            print(f"DEBUG: Invalid quiz_data returned: {quiz_data}")
-            return Response({'error': 'AI service returned no usable content. Please try again later.'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
-        
-        print(f"DEBUG: Quiz data generated successfully: {len(quiz_data.get('quiz', []))} questions")
-        
-        # Format questions for frontend editing
-        formatted_questions = []
-        for i, q in enumerate(quiz_data['quiz']):
-            formatted_question = {
-                'question_text': q.get('question_text', ''),
-                'question_type': q.get('question_type', 'multiple_choice'),
-                'options': q.get('options', []),
-                'correct_answer': q.get('correct_answer', ''),
-                'explanation': q.get('explanation', ''),
-                'points': 1,  # Default points
-                'time_limit': None,  # Will be set by room settings
-                'order': i
-            }
-            
-            # Ensure correct_answer is in the right format based on question type
-            if formatted_question['question_type'] == 'multiple_choice':
-                # Find the index of the correct answer
-                correct_text = formatted_question['correct_answer']
-                if correct_text in formatted_question['options']:
-                    formatted_question['correct_answer'] = formatted_question['options'].index(correct_text)
-                else:
-                    formatted_question['correct_answer'] = 0  # Default to first option
-            elif formatted_question['question_type'] == 'true_false':
-                formatted_question['options'] = ['True', 'False']
-                if str(formatted_question['correct_answer']).lower() in ['true', '1']:
-                    formatted_question['correct_answer'] = 0
-                else:
-                    formatted_question['correct_answer'] = 1
-            
-            formatted_questions.append(formatted_question)
-        
-        return Response({
-            'quiz': formatted_questions,
-            'message': f'Successfully generated {len(formatted_questions)} questions from {file.name}'
-        }, status=status.HTTP_200_OK)
+        # Parsing and generation run in the background; the client polls the job
+        job = create_job(request.user, 'room', {
+            'file_name': file.name,
+            'num_questions': num_questions,
+            'difficulty': difficulty,
+            'question_types': question_types,
+            'fresh': fresh,
+        })
+        submit_job(job, run_room_quiz_generation, file.read(), describe_error=describe_room_generation_error)
+        print(f"DEBUG: Queued room generation job {job.id}")
+
+        response_data = job.to_status_dict()
+        response_data['status_url'] = f"/api/rooms/generate-quiz/{job.id}/"
+        return Response(response_data, status=status.HTTP_202_ACCEPTED)
         
     except Exception as e:
         print(f"DEBUG: Error in room quiz generation: {str(e)}")
         return Response({
             'error': f'Failed to generate quiz: {str(e)}'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def room_quiz_job_status(request, job_id):
+    """Poll a room quiz generation job; includes the questions once finished"""
+    job = refresh_job_status(get_object_or_404(GenerationJob, id=job_id, user=request.user, kind='room'))
+    data = job.to_status_dict()
+    if job.status == 'succeeded':
+        data.update(job.result)
+    return Response(data, status=status.HTTP_200_OK)
+
+
+def describe_room_generation_error(e):
+    if isinstance(e, GenerationError):
+        return str(e), e.status_code
+    return f'Failed to generate quiz: {str(e)}', status.HTTP_500_INTERNAL_SERVER_ERROR
+
+
+def run_room_quiz_generation(job, file_bytes):
+    """Background job body: parse the document and format questions for editing"""
+    params = job.params
+    file_name = params['file_name']
+
+    job.set_progress(10, 'Parsing document')
+    parsed_text = parse_document_bytes(file_name, file_bytes)
+    print(f"DEBUG: Parsed text length: {len(parsed_text)} from {file_name}")
+    
+    if len(parsed_text.strip()) < 100:
+        raise GenerationError('Document content too short to generate meaningful questions')
+    
+    # Generate quiz using AI with multiple question types
+    job.set_progress(30, 'Generating questions')
+    quiz_data = generate_quiz_with_gemini(
+        parsed_text, params['num_questions'], params['difficulty'], params['question_types'],
+        use_cache=not params.get('fresh', False),
+    )
+    
+    if not quiz_data or not isinstance(quiz_data, dict) or 'quiz' not in quiz_data:
+        print(f"DEBUG: Invalid quiz_data returned: {quiz_data}")
+        raise GenerationError('AI service returned no usable content. Please try again later.', status.HTTP_503_SERVICE_UNAVAILABLE)
+    
+    print(f"DEBUG: Quiz data generated successfully: {len(quiz_data.get('quiz', []))} questions")
+    
+    # Format questions for frontend editing
+    formatted_questions = []
+    for i, q in enumerate(quiz_data['quiz']):
+        formatted_question = {
+            'question_text': q.get('question_text', ''),
+            'question_type': q.get('question_type', 'multiple_choice'),
+            'options': q.get('options', []),
+            'correct_answer': q.get('correct_answer', ''),
+            'explanation': q.get('explanation', ''),
+            'points': 1,  # Default points
+            'time_limit': None,  # Will be set by room settings
+            'order': i
+        }
+        
+        # Ensure correct_answer is in the right format based on question type
+        if formatted_question['question_type'] == 'multiple_choice':
+            # Find the index of the correct answer
+            correct_text = formatted_question['correct_answer']
+            if correct_text in formatted_question['options']:
+                formatted_question['correct_answer'] = formatted_question['options'].index(correct_text)
+            else:
+                formatted_question['correct_answer'] = 0  # Default to first option
+        elif formatted_question['question_type'] == 'true_false':
+            formatted_question['options'] = ['True', 'False']
+            if str(formatted_question['correct_answer']).lower() in ['true', '1']:
+                formatted_question['correct_answer'] = 0
+            else:
+                formatted_question['correct_answer'] = 1
+        
+        formatted_questions.append(formatted_question)
+    
+    return {
+        'quiz': formatted_questions,
+        'message': f'Successfully generated {len(formatted_questions)} questions from {file_name}'
+    }
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import Room, RoomQuestion, RoomParticipant, ParticipantAnswer
+from .persistence import create_room_with_questions
 from django.contrib.auth.models import User
 
 class RoomQuestionSerializer(serializers.ModelSerializer):
@@ -103,11 +104,8 @@ class CreateRoomSerializer(serializers.ModelSerializer):
         
         print(f"DEBUG: Final validated_data for Room creation: {validated_data}")
         
-        room = Room.objects.create(**validated_data)
-        
-        for i, question_data in enumerate(questions_data):
-            question_data['order'] = i
-            RoomQuestion.objects.create(room=room, **question_data)
+        # The room and all its questions are written together, in one transaction
+        room, _ = create_room_with_questions(questions_data, **validated_data)
         
         return room
 
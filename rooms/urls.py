@@ -11,11 +11,12 @@ from .views import (
     remove_participant,
     make_spectator,
 )
-from .quiz_generation import generate_room_quiz
+from .quiz_generation import generate_room_quiz, room_quiz_job_status
 
 urlpatterns = [
     path('create/', CreateRoomView.as_view(), name='create-room'),
     path('generate-quiz/', generate_room_quiz, name='generate-room-quiz'),
+    path('generate-quiz/<uuid:job_id>/', room_quiz_job_status, name='room-quiz-job-status'),
     path('join/', join_room, name='join-room'),
     path('my-rooms/', get_user_rooms, name='get-user-rooms'),
     path('<str:room_code>/', get_room_details, name='get-room-details'),
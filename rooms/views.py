@@ -11,6 +11,9 @@ from .serializers import (
     RoomQuestionSerializer, ParticipantAnswerSerializer
 )
 from quizzes.utils import generate_quiz_with_gemini
+from quizzes.idempotency import idempotent
+from quizzes.grading import question_matchers
+from .persistence import create_room_questions, room_question_fields
 import random
 
 class CreateRoomView(generics.CreateAPIView):
@@ -56,17 +59,7 @@ class CreateRoomView(generics.CreateAPIView):
             )
             
             if quiz_data and 'quiz' in quiz_data:
-                for i, question_data in enumerate(quiz_data['quiz']):
-                    RoomQuestion.objects.create(
-                        room=room,
-                        question_text=question_data['question_text'],
-                        question_type=question_data['question_type'],
-                        options=question_data.get('options', []),
-                        correct_answer=question_data['correct_answer'],
-                        explanation=question_data.get('explanation', ''),
-                        points=1,
-                        order=i
-                    )
+                create_room_questions(room, [room_question_fields(item) for item in quiz_data['quiz']])
         except Exception as e:
             # If AI generation fails, create a placeholder question
             RoomQuestion.objects.create(
@@ -74,7 +67,7 @@ class CreateRoomView(generics.CreateAPIView):
                 question_text="AI generation failed. Please add questions manually.",
                 question_type="multiple_choice",
                 options=["Option 1", "Option 2", "Option 3", "Option 4"],
-                correct_answer="Option 1",
+                correct_answers=["Option 1"],
                 explanation="Please edit this question.",
                 points=1,
                 order=0
@@ -197,6 +190,7 @@ def start_room(request, room_code):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent
 def submit_answer(request, room_code):
     try:
         room = Room.objects.get(room_code=room_code)
@@ -215,16 +209,8 @@ def submit_answer(request, room_code):
             }, status=status.HTTP_400_BAD_REQUEST)
         
         # Calculate if answer is correct
-        is_correct = False
-        points_earned = 0
-        
-        # Simplified correctness check
-        submitted_answers = set(ans.strip().lower() for ans in answer)
-        correct_answers = set(ans.strip().lower() for ans in question.correct_answers)
-        
-        if submitted_answers == correct_answers:
-            is_correct = True
-            points_earned = question.points
+        is_correct = question_matchers.get(question, question.correct_answers).matches(answer)
+        points_earned = question.points if is_correct else 0
         
         # Save answer
         participant_answer = ParticipantAnswer.objects.create(